@@ -0,0 +1,56 @@
+import os
+import random
+import time
+
+from mock_api import MockState, start_mock_server
+
+# Name -> id lookups against synthetic 10k-entry /acl/users and /acl/roles lists:
+# the old download-and-scan per lookup versus the in-memory AclIndex.
+
+ENTRIES = int(os.getenv('BENCH_ACL_ENTRIES', '10000'))
+LOOKUPS = int(os.getenv('BENCH_ACL_LOOKUPS', '50'))
+POLLS = int(os.getenv('BENCH_ACL_POLLS', '20'))
+
+
+def scan_lookup(api_client, url, key, name):
+    for entry in api_client.get(url).json().get(key, []):
+        if entry['name'] == name:
+            return entry['id']
+    raise Exception(f"{name} not found")
+
+
+def measure(label, server, func):
+    requests_before = server.state.requests
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<36} http_calls={server.state.requests - requests_before:5d}  wall-clock={elapsed * 1000:9.1f} ms")
+
+
+def main():
+    state = MockState()
+    state.seed_acl(ENTRIES)
+    server = start_mock_server(state=state)
+    os.environ['REDIS_CLOUD_API_URL'] = server.base_url
+    os.environ.setdefault('REDIS_CLOUD_RATE_LIMIT', '0')
+    os.environ.setdefault('REDIS_CLOUD_METADATA_CACHE', '')
+    from redis_cloud_creator import acl_index, api_client
+
+    rng = random.Random(3)
+    names = [f"seed-user-{rng.randrange(ENTRIES)}" for _ in range(LOOKUPS)]
+    print(f"{ENTRIES} users and roles, {LOOKUPS} user lookups, {POLLS} unchanged role-list polls")
+    try:
+        measure("scan: lookups", server,
+                lambda: [scan_lookup(api_client, acl_index.API_URL_ACL_USERS, 'users', name) for name in names])
+        index = acl_index.AclIndex(acl_index.API_URL_ACL_USERS, 'users')
+        measure("index: lookups (incl. initial load)", server, lambda: [index.get(name)['id'] for name in names])
+        measure("scan: role-list polls", server,
+                lambda: [api_client.get(acl_index.API_URL_ACL_ROLES).json() for _ in range(POLLS)])
+        roles = acl_index.AclIndex(acl_index.API_URL_ACL_ROLES, 'roles')
+        measure("index: role-list polls (ETag)", server, lambda: [roles.refresh() for _ in range(POLLS)])
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import contextlib
+import io
+import os
+import threading
+import time
+
+from mock_api import MockState, start_mock_server
+
+# Request coalescing against the mock API, each case with the feature off and on:
+#   concurrent waiters on one pending subscription (single-flight GETs),
+#   concurrent PUTs of different fields to one database (merged into one task),
+#   provisioning with the default user disabled in the create payload rather than by a later PUT.
+
+WAITERS = int(os.getenv('BENCH_COALESCE_WAITERS', '20'))
+PUTS = int(os.getenv('BENCH_COALESCE_PUTS', '4'))
+STACKS = int(os.getenv('BENCH_COALESCE_STACKS', '10'))
+TASK_DELAY = float(os.getenv('BENCH_TASK_DELAY', '0.2'))
+TRANSITION_DELAY = float(os.getenv('BENCH_TRANSITION_DELAY', '0.5'))
+LATENCY = float(os.getenv('BENCH_LATENCY', '0.02'))
+
+
+def main():
+    state = MockState(task_delay=TASK_DELAY, transition_delay=TRANSITION_DELAY, latency=LATENCY)
+    server = start_mock_server(state=state)
+    os.environ['REDIS_CLOUD_API_URL'] = server.base_url
+    os.environ.setdefault('REDIS_CLOUD_RATE_LIMIT', '0')
+    os.environ.setdefault('REDIS_CLOUD_METADATA_CACHE', '')
+    os.environ.setdefault('REDIS_CLOUD_POLL_INITIAL', str(TASK_DELAY / 4))
+    os.environ.setdefault('REDIS_CLOUD_POLL_CAP', str(TASK_DELAY))
+    from redis_cloud_creator import coalesce, events, polling, provision_engine, state_cache
+    from redis_cloud_creator import main as provisioning
+
+    # The same spacing for every case, so the adaptive strategy learning from one doesn't flatter the next
+    polling.set_strategy(polling.FixedInterval(TASK_DELAY / 4))
+
+    def new_database():
+        subscription = provisioning.create_fixed_subscription(provisioning.PLAN_ID, provisioning.PAYMENT_METHOD_ID)
+        subscription_id = state.tasks[subscription["taskId"]]["response"]["resourceId"]
+        database = provisioning.create_database(subscription_id)
+        return subscription_id, state.tasks[database["taskId"]]["response"]["resourceId"]
+
+    def concurrently(count, func):
+        threads = [threading.Thread(target=func, args=(i,)) for i in range(count)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+    print(f"task delay {TASK_DELAY}s, transition delay {TRANSITION_DELAY}s, latency {LATENCY * 1000:.0f} ms")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            rows = []
+            for enabled in (False, True):
+                coalesce.COALESCE_GETS = enabled
+                subscription_id, _ = new_database()
+                state_cache.get_cache().invalidate_all()
+                requests_before = state.requests
+                elapsed = concurrently(WAITERS, lambda i: provisioning.wait_for_subscription_active(subscription_id))
+                rows.append(f"{WAITERS} waiters, single-flight {'on ' if enabled else 'off'}  "
+                            f"GETs={state.requests - requests_before:5d}  wall-clock={elapsed:6.2f} s")
+
+            fields = [{"dataEvictionPolicy": "volatile-lru"}, {"enableDefaultUser": False}, {"replication": False},
+                      {"alerts": []}, {"enableTls": True}, {"dataPersistence": "none"}]
+            for window in (0, coalesce.PUT_MERGE_WINDOW):
+                coalesce.get_put_merger().window = window
+                subscription_id, database_id = new_database()
+                tasks_before = len(state.tasks)
+
+                def update(i):
+                    response = provisioning.update_database(subscription_id, database_id, fields[i % len(fields)])
+                    provisioning.check_task_status(response['links'][0]['href'])
+
+                elapsed = concurrently(PUTS, update)
+                rows.append(f"{PUTS} concurrent PUTs, window {window * 1000:3.0f} ms  "
+                            f"tasks={len(state.tasks) - tasks_before:5d}  wall-clock={elapsed:6.2f} s")
+
+            for on_create in (False, True):
+                provisioning.DISABLE_DEFAULT_USER_ON_CREATE = on_create
+                stacks = [{"subscription_name": f"bench-{on_create}-{i}", "database_name": f"bench-{i}",
+                           "role_name": f"bench-role-{on_create}-{i}", "user_name": f"bench-user-{on_create}-{i}"}
+                          for i in range(STACKS)]
+                requests_before, tasks_before = state.requests, len(state.tasks)
+                started = time.perf_counter()
+                results = provision_engine.provision_many(stacks, concurrency=STACKS)
+                elapsed = time.perf_counter() - started
+                rows.append(f"{STACKS} stacks, default user off {'at create  ' if on_create else 'by PUT     '}"
+                            f"requests={state.requests - requests_before:5d}  "
+                            f"tasks={len(state.tasks) - tasks_before:4d}  wall-clock={elapsed:6.2f} s  "
+                            f"ok={sum(result['status'] == 'ok' for result in results)}")
+            events.flush()
+        for row in rows:
+            print(row)
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
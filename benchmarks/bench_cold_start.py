@@ -0,0 +1,64 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from mock_api import start_mock_server
+
+# Cold start of short read-only invocations, as CI runs them thousands of times:
+# total import time reported by `python -X importtime` and process wall-clock,
+# median of several runs. The script-style baseline imports the provisioning
+# modules (and requests) the way destroy.py always has before its first GET.
+
+RUNS = int(os.getenv('BENCH_COLD_RUNS', '7'))
+
+COMMANDS = [
+    ("script: import destroy + list",
+     ['-c', 'from redis_cloud_creator import destroy; destroy.list_subscriptions()'], {}),
+    ("cli --help", ['-m', 'redis_cloud_creator.cli', '--help'], {}),
+    ("cli list (requests transport)", ['-m', 'redis_cloud_creator.cli', 'list'],
+     {'REDIS_CLOUD_HTTP_TRANSPORT': 'requests'}),
+    ("cli list", ['-m', 'redis_cloud_creator.cli', 'list'], {}),
+    ("cli status", ['-m', 'redis_cloud_creator.cli', 'status', '1000'], {}),
+]
+
+
+def import_time_us(stderr):
+    # Sum of the cumulative times of top-level imports (nested ones are indented)
+    total = 0
+    for line in stderr.splitlines():
+        if line.startswith('import time:') and not line.startswith('import time: self'):
+            _, cumulative, name = line.split('|')
+            if not name.startswith('  '):
+                total += int(cumulative)
+    return total
+
+
+def measure(label, argv, env, cwd):
+    imports = []
+    walls = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime'] + argv, env=env, cwd=cwd,
+                                capture_output=True, text=True)
+        walls.append(time.perf_counter() - started)
+        imports.append(import_time_us(result.stderr))
+    print(f"{label:<32} imports={statistics.median(imports) / 1000:7.1f} ms  "
+          f"wall-clock={statistics.median(walls) * 1000:7.1f} ms")
+
+
+def main():
+    server = start_mock_server()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, REDIS_CLOUD_API_URL=server.base_url, REDIS_CLOUD_RATE_LIMIT='0', PYTHONPATH=root)
+    print(f"median of {RUNS} runs")
+    try:
+        for label, argv, extra in COMMANDS:
+            measure(label, argv, dict(env, **extra), root)
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import contextlib
+import io
+import os
+import time
+
+from mock_api import MockState, start_mock_server
+
+# Provisioning throughput with 1, 2 and 4 API keys against a mock API that
+# enforces its request quota per key, as the real API does. Each key gets its own
+# client-side bucket at that quota; stacks are sharded across the keys.
+
+STACKS = int(os.getenv('BENCH_CREDENTIAL_STACKS', '16'))
+KEYS = [int(keys) for keys in os.getenv('BENCH_CREDENTIAL_KEYS', '1,2,4').split(',')]
+RATE_LIMIT = int(os.getenv('BENCH_RATE_LIMIT', '10'))
+TASK_DELAY = float(os.getenv('BENCH_TASK_DELAY', '0.2'))
+
+
+def main():
+    state = MockState(task_delay=TASK_DELAY, rate_limit=RATE_LIMIT)
+    server = start_mock_server(state=state)
+    os.environ['REDIS_CLOUD_API_URL'] = server.base_url
+    os.environ.setdefault('REDIS_CLOUD_METADATA_CACHE', '')
+    os.environ.setdefault('REDIS_CLOUD_POLL_INITIAL', str(TASK_DELAY / 4))
+    os.environ.setdefault('REDIS_CLOUD_POLL_CAP', str(TASK_DELAY))
+    from redis_cloud_creator import credentials, events, provision_engine
+
+    print(f"{STACKS} stacks, {RATE_LIMIT} req/s per key, task delay {TASK_DELAY}s")
+    try:
+        for keys in KEYS:
+            pool = [credentials.Credential(f"bench-{keys}-{i}", f"key-{keys}-{i}", "secret", rate_limit=RATE_LIMIT)
+                    for i in range(keys)]
+            stacks = [{"subscription_name": f"bench-{keys}-{i}", "database_name": f"bench-{keys}-{i}",
+                       "role_name": f"bench-role-{keys}-{i}", "user_name": f"bench-user-{keys}-{i}"}
+                      for i in range(STACKS)]
+            throttled_before = state.rate_limited
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = provision_engine.provision_many(stacks, concurrency=STACKS,
+                                                          scheduler=credentials.Scheduler(pool))
+                events.flush()
+            elapsed = time.perf_counter() - started
+            succeeded = sum(result["status"] == "ok" for result in results)
+            per_key = " ".join(f"{credential.assigned}/{credential.requests}" for credential in pool)
+            print(f"keys={keys}  ok={succeeded:3d}  wall-clock={elapsed:6.2f} s  "
+                  f"throughput={succeeded / elapsed:5.2f} stacks/s  429s={state.rate_limited - throttled_before:3d}  "
+                  f"stacks/requests per key: {per_key}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
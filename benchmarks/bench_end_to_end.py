@@ -0,0 +1,93 @@
+import contextlib
+import io
+import os
+import time
+
+from mock_api import MockState, start_mock_server
+
+# Provisioning and teardown throughput/latency at 1, 10 and 100 concurrent stacks
+# against the mock API, with task and state-transition delays scaled down from the
+# real API's minutes to fractions of a second. Polling intervals are scaled to match.
+
+LEVELS = [int(level) for level in os.getenv('BENCH_STACKS', '1,10,100').split(',')]
+TASK_DELAY = float(os.getenv('BENCH_TASK_DELAY', '0.2'))
+TRANSITION_DELAY = float(os.getenv('BENCH_TRANSITION_DELAY', '0.1'))
+FAILURE_RATE = float(os.getenv('BENCH_FAILURE_RATE', '0'))
+RATE_LIMIT = int(os.getenv('BENCH_RATE_LIMIT', '0'))
+LATENCY = float(os.getenv('BENCH_LATENCY', '0'))
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def report(label, count, elapsed, results, requests):
+    succeeded = [result for result in results if result["status"] == "ok"]
+    latencies = [result["elapsed"] for result in succeeded]
+    print(f"{label:<10} stacks={count:4d}  ok={len(succeeded):4d}  wall-clock={elapsed:7.2f} s  "
+          f"throughput={len(succeeded) / elapsed:6.2f} stacks/s  p50={percentile(latencies, 0.5):6.2f} s  "
+          f"p95={percentile(latencies, 0.95):6.2f} s  requests={requests:6d}")
+    failed = [result for result in results if result["status"] != "ok"]
+    if failed:
+        print(f"{'':<10} {len(failed)} failed, e.g. {failed[0]['error']}")
+
+
+def run_level(server, count):
+    from redis_cloud_creator import destroy, events, provision_engine
+
+    state = server.state
+    specs = [{
+        "subscription_name": f"bench-{count}-{i}",
+        "database_name": f"bench-{count}-{i}",
+        "role_name": f"bench-role-{count}-{i}",
+        "user_name": f"bench-user-{count}-{i}"
+    } for i in range(count)]
+
+    requests_before = state.requests
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = provision_engine.provision_many(specs, concurrency=count)
+        events.flush()
+    report("provision", count, time.perf_counter() - started, results, state.requests - requests_before)
+
+    stacks = [{
+        "subscription_id": result["output"]["subscription_id"],
+        "database_ids": [database["database_id"] for database in result["output"]["databases"]],
+        "users": [user["user"] for user in result["output"]["users"]],
+        "roles": [spec["role_name"]]
+    } for spec, result in zip(specs, results) if result["status"] == "ok"]
+
+    requests_before = state.requests
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = destroy.teardown_many(stacks, concurrency=count)
+        events.flush()
+    report("teardown", len(stacks), time.perf_counter() - started, results, state.requests - requests_before)
+
+
+def main():
+    state = MockState(task_delay=TASK_DELAY, transition_delay=TRANSITION_DELAY, failure_rate=FAILURE_RATE,
+                      rate_limit=RATE_LIMIT, latency=LATENCY, seed=7)
+    server = start_mock_server(state=state)
+    os.environ['REDIS_CLOUD_API_URL'] = server.base_url
+    # The client bucket uses the same quota the mock enforces (none by default)
+    os.environ.setdefault('REDIS_CLOUD_RATE_LIMIT', str(RATE_LIMIT))
+    os.environ.setdefault('REDIS_CLOUD_METADATA_CACHE', '')
+    os.environ.setdefault('REDIS_CLOUD_POLL_INITIAL', str(TASK_DELAY / 4))
+    os.environ.setdefault('REDIS_CLOUD_POLL_CAP', str(TASK_DELAY))
+    print(f"task delay {TASK_DELAY}s, transition delay {TRANSITION_DELAY}s, failure rate {FAILURE_RATE}, "
+          f"rate limit {RATE_LIMIT or 'none'} req/s, against {server.base_url}")
+    try:
+        for count in LEVELS:
+            run_level(server, count)
+        print(f"429 responses: {state.rate_limited}  failed tasks: {state.failed_tasks}  "
+              f"connections: {state.connections}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import contextlib
+import io
+import os
+import time
+
+import requests
+
+from mock_api import start_mock_server
+
+# Compares one provisioning + teardown run using a fresh connection per call
+# (the old bare requests.get/post behaviour) against the shared pooled session.
+
+RUNS = int(os.getenv('BENCH_RUNS', '20'))
+
+
+def unpooled_request(method, url, **kwargs):
+    from redis_cloud_creator import api_client
+    headers = {
+        'x-api-key': api_client.API_KEY,
+        'x-api-secret-key': api_client.API_SECRET_KEY
+    }
+    headers.update(kwargs.pop('headers', {}))
+    return requests.request(method, url, headers=headers, **kwargs)
+
+
+def provision_and_destroy(main, destroy):
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        main.main()
+    output = out.getvalue()
+    if 'Error:' in output:
+        raise Exception(output[output.index('Error:'):])
+    credentials = __import__('json').loads(output[output.rindex('{\n'):])
+    destroy.subscription_id = credentials['subscription_id']
+    destroy.database_id = credentials['database_id']
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        destroy.main()
+    output = out.getvalue()
+    if 'Error:' in output:
+        raise Exception(output[output.index('Error:'):])
+
+
+def run(label, server, pooled):
+    from redis_cloud_creator import api_client, destroy, main
+
+    api_client.close_session()
+    original_request = api_client.request
+    if not pooled:
+        api_client.request = unpooled_request
+    state = server.state
+    connections, request_count = state.connections, state.requests
+    started = time.perf_counter()
+    try:
+        for _ in range(RUNS):
+            provision_and_destroy(main, destroy)
+    finally:
+        api_client.request = original_request
+    elapsed = time.perf_counter() - started
+    requests_per_run = (state.requests - request_count) / RUNS
+    connections_per_run = (state.connections - connections) / RUNS
+    print(f"{label:<10} requests/run={requests_per_run:6.1f}  connections/run={connections_per_run:6.1f}  "
+          f"wall-clock/run={elapsed / RUNS * 1000:7.2f} ms")
+
+
+def main():
+    server = start_mock_server()
+    os.environ['REDIS_CLOUD_API_URL'] = server.base_url
+    os.environ.setdefault('REDIS_CLOUD_RATE_LIMIT', '0')
+    os.environ.setdefault('REDIS_CLOUD_METADATA_CACHE', '')
+    try:
+        print(f"{RUNS} provision + teardown runs against {server.base_url}")
+        run("unpooled", server, pooled=False)
+        run("pooled", server, pooled=True)
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_api import MockState, start_mock_server
+
+# Startup metadata fetches (payment methods, ACL user and role lists) of N
+# processes launched together, as parallel CI jobs would be: without the shared
+# metadata cache, with a cold one and with a warm one.
+
+PROCESSES = int(os.getenv('BENCH_METADATA_PROCESSES', '8'))
+ENTRIES = int(os.getenv('BENCH_METADATA_ENTRIES', '5000'))
+LATENCY = float(os.getenv('BENCH_LATENCY', '0.05'))
+
+STARTUP = """
+from redis_cloud_creator import acl_index, main
+main.get_payment_methods()
+acl_index.users().entries()
+acl_index.roles().entries()
+"""
+
+
+def run_processes(label, server, cache_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, REDIS_CLOUD_API_URL=server.base_url, REDIS_CLOUD_RATE_LIMIT='0',
+               REDIS_CLOUD_METADATA_CACHE=cache_path, PYTHONPATH=root)
+    requests_before = server.state.requests
+    started = time.perf_counter()
+    processes = [subprocess.Popen([sys.executable, '-c', STARTUP], env=env, cwd=root) for _ in range(PROCESSES)]
+    failed = sum(process.wait() != 0 for process in processes)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<20} http_calls={server.state.requests - requests_before:4d}  "
+          f"wall-clock={elapsed * 1000:8.1f} ms  failed={failed}")
+
+
+def main():
+    state = MockState(latency=LATENCY)
+    state.seed_acl(ENTRIES)
+    server = start_mock_server(state=state)
+    print(f"{PROCESSES} processes, {ENTRIES} users and roles, {LATENCY * 1000:.0f} ms latency")
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metadata.sqlite3')
+            run_processes("no cache", server, '')
+            run_processes("cold shared cache", server, path)
+            run_processes("warm shared cache", server, path)
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
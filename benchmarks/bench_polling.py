@@ -0,0 +1,79 @@
+import random
+
+from redis_cloud_creator import polling
+
+# Simulated-clock comparison of polling strategies. Each wait has a hidden
+# completion time drawn per resource type; we count GETs and measure how long
+# after completion the poller noticed. 3% of answers carry Retry-After: 15.
+
+WAITS_PER_KIND = 300
+RETRY_AFTER_RATE = 0.03
+
+KINDS = {
+    'acl task': lambda rng: rng.uniform(0.5, 4),
+    'task': lambda rng: rng.uniform(2, 20),
+    'subscription': lambda rng: rng.lognormvariate(5.2, 0.3),
+    'database': lambda rng: rng.uniform(30, 90),
+}
+
+
+class SimClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class SimResponse:
+    def __init__(self, rng):
+        self.status_code = 200
+        self.headers = {}
+        if rng.random() < RETRY_AFTER_RATE:
+            self.headers['Retry-After'] = '15'
+
+
+def simulate(strategy, seed=7):
+    rng = random.Random(seed)
+    clock = SimClock()
+    results = {}
+    for kind, draw in KINDS.items():
+        requests_made, lateness = 0, 0.0
+        for _ in range(WAITS_PER_KIND):
+            completes_at = clock.time() + draw(rng)
+            poller = polling.Poller(kind, strategy, sleep=clock.sleep, clock=clock.time)
+            poller.start()
+            while True:
+                requests_made += 1
+                if clock.time() >= completes_at:
+                    lateness += clock.time() - completes_at
+                    poller.done()
+                    break
+                poller.sleep(SimResponse(rng))
+        results[kind] = (requests_made / WAITS_PER_KIND, lateness / WAITS_PER_KIND)
+    return results
+
+
+def main():
+    strategies = {
+        'fixed 10s/5s (old)': None,
+        'fixed 5s': polling.FixedInterval(5),
+        'exponential': polling.ExponentialBackoff(rng=random.Random(1)),
+        'adaptive': polling.AdaptiveBackoff(rng=random.Random(1)),
+    }
+    print(f"{WAITS_PER_KIND} simulated waits per resource type")
+    print(f"{'':<20}" + "".join(f"{kind:>24}" for kind in KINDS))
+    print(f"{'strategy':<20}" + "{:>12}{:>12}".format('GETs', 'late s') * len(KINDS))
+    for label, strategy in strategies.items():
+        if strategy is None:
+            results = {kind: simulate(polling.FixedInterval(5 if 'task' in kind else 10))[kind] for kind in KINDS}
+        else:
+            results = simulate(strategy)
+        print(f"{label:<20}" + "".join(f"{gets:>12.1f}{late:>12.2f}" for gets, late in results.values()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import json
+import os
+import tempfile
+import time
+
+import yaml
+
+# Load + validate + compile time for a generated spec with thousands of
+# subscriptions, in each supported file format.
+
+SUBSCRIPTIONS = int(os.getenv('BENCH_SPEC_SUBSCRIPTIONS', '2000'))
+DATABASES = int(os.getenv('BENCH_SPEC_DATABASES', '3'))
+
+
+def generate():
+    return {
+        "defaults": {"plan_id": 21113, "payment_method_id": 25346},
+        "subscriptions": [{
+            "name": f"bench-{i}",
+            "databases": [{"name": f"bench-{i}-db-{j}", "settings": {"dataEvictionPolicy": "allkeys-lfu"}}
+                          for j in range(DATABASES)],
+            "roles": [{"name": f"bench-{i}-role"}],
+            "users": [{"name": f"bench-{i}-user", "role": f"bench-{i}-role", "password": "Secret@99"}]
+        } for i in range(SUBSCRIPTIONS)]
+    }
+
+
+def write_toml(data, f):
+    # Just enough TOML for the generated shape (the stdlib only reads TOML)
+    f.write(f"[defaults]\nplan_id = {data['defaults']['plan_id']}\n"
+            f"payment_method_id = {data['defaults']['payment_method_id']}\n")
+    for subscription in data["subscriptions"]:
+        f.write(f"\n[[subscriptions]]\nname = {json.dumps(subscription['name'])}\n")
+        for role in subscription["roles"]:
+            f.write(f"[[subscriptions.roles]]\nname = {json.dumps(role['name'])}\n")
+        for user in subscription["users"]:
+            f.write(f"[[subscriptions.users]]\nname = {json.dumps(user['name'])}\nrole = {json.dumps(user['role'])}\n"
+                    f"password = {json.dumps(user['password'])}\n")
+        for database in subscription["databases"]:
+            f.write(f"[[subscriptions.databases]]\nname = {json.dumps(database['name'])}\n"
+                    f"[subscriptions.databases.settings]\n"
+                    f"dataEvictionPolicy = {json.dumps(database['settings']['dataEvictionPolicy'])}\n")
+
+
+def main():
+    from redis_cloud_creator import spec
+    from redis_cloud_creator import main as provisioning
+
+    data = generate()
+    writers = {
+        '.json': lambda f: json.dump(data, f),
+        '.toml': lambda f: write_toml(data, f),
+        '.yaml': lambda f: yaml.dump(data, f, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper))
+    }
+    print(f"{SUBSCRIPTIONS} subscriptions x {DATABASES} databases")
+    started = time.perf_counter()
+    spec.compile_spec(data, database_settings=provisioning.DATABASE_SETTINGS)
+    print(f"{'validate+compile only':<24} {(time.perf_counter() - started) * 1000:8.1f} ms")
+    with tempfile.TemporaryDirectory() as directory:
+        for extension, write in writers.items():
+            path = os.path.join(directory, f"spec{extension}")
+            with open(path, 'w') as f:
+                write(f)
+            started = time.perf_counter()
+            plan = spec.load(path, database_settings=provisioning.DATABASE_SETTINGS)
+            elapsed = time.perf_counter() - started
+            print(f"{'load ' + extension:<24} {elapsed * 1000:8.1f} ms  {plan.counts()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import contextlib
+import io
+import os
+import threading
+import time
+
+from mock_api import MockState, start_mock_server
+
+# Upstream GETs spent by many concurrent waiters (threads standing in for CI jobs)
+# on the same freshly created subscription and database: each polling on its own
+# versus all asking one status daemon. Both modes use the same poll spacing.
+
+WAITERS = [int(waiters) for waiters in os.getenv('BENCH_STATUS_WAITERS', '1,10,100').split(',')]
+TRANSITION_DELAY = float(os.getenv('BENCH_TRANSITION_DELAY', '1'))
+INTERVAL = float(os.getenv('BENCH_STATUS_INTERVAL', '0.1'))
+
+
+def main():
+    state = MockState(transition_delay=TRANSITION_DELAY)
+    server = start_mock_server(state=state)
+    os.environ['REDIS_CLOUD_API_URL'] = server.base_url
+    os.environ.setdefault('REDIS_CLOUD_RATE_LIMIT', '0')
+    os.environ.setdefault('REDIS_CLOUD_METADATA_CACHE', '')
+    os.environ.setdefault('REDIS_CLOUD_POLL_STRATEGY', 'fixed')
+    from redis_cloud_creator import events, polling, state_cache, status_daemon
+    from redis_cloud_creator import main as provisioning
+
+    polling.set_strategy(polling.FixedInterval(INTERVAL))
+    daemon_server = status_daemon.start_status_server(
+        port=0, status=status_daemon.StatusDaemon(interval=INTERVAL))
+
+    def round_trip(waiters, daemon_url):
+        subscription = provisioning.create_fixed_subscription(provisioning.PLAN_ID, provisioning.PAYMENT_METHOD_ID)
+        subscription_id = state.tasks[subscription["taskId"]]["response"]["resourceId"]
+        database = provisioning.create_database(subscription_id)
+        database_id = state.tasks[database["taskId"]]["response"]["resourceId"]
+        state_cache.get_cache().invalidate_all()
+        status_daemon.DAEMON_URL = daemon_url
+
+        def wait():
+            provisioning.wait_for_database_ready(subscription_id, database_id)
+            provisioning.wait_for_subscription_active(subscription_id)
+
+        requests_before = state.requests
+        started = time.perf_counter()
+        threads = [threading.Thread(target=wait) for _ in range(waiters)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            events.flush()
+        return state.requests - requests_before, time.perf_counter() - started
+
+    print(f"transition delay {TRANSITION_DELAY}s, poll interval {INTERVAL}s")
+    try:
+        for waiters in WAITERS:
+            for label, daemon_url in (("each polls", None), ("status daemon", daemon_server.url)):
+                upstream, elapsed = round_trip(waiters, daemon_url)
+                print(f"waiters={waiters:4d}  {label:<14} upstream GETs={upstream:5d}  wall-clock={elapsed:6.2f} s")
+    finally:
+        daemon_server.shutdown()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
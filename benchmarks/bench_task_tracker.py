@@ -0,0 +1,78 @@
+import os
+import random
+import threading
+import time
+
+from mock_api import MockState, start_mock_server
+
+# 50 tasks in flight with completion times spread over 5-30 poll intervals.
+# Compares one blocking loop per task (the old check_task_status) against
+# the shared TaskTracker. Intervals are scaled down so the run takes seconds.
+
+TASKS = int(os.getenv('BENCH_TASKS', '50'))
+POLL_INTERVAL = float(os.getenv('BENCH_POLL_INTERVAL', '0.05'))
+
+
+def start_tasks(api_client, count):
+    urls = []
+    for i in range(count):
+        response = api_client.post(f'{api_client.API_BASE_URL}/acl/roles', json={"name": f"bench-role-{i}"})
+        urls.append(response.json()['links'][0]['href'])
+    return urls
+
+
+def per_task_loop(api_client, task_url):
+    while True:
+        status = api_client.get(task_url).json().get('status')
+        if status == 'processing-completed':
+            return
+        time.sleep(POLL_INTERVAL)
+
+
+def run(label, server, wait_all):
+    from redis_cloud_creator import api_client
+    urls = start_tasks(api_client, TASKS)
+    before = server.state.requests
+    started = time.perf_counter()
+    wait_all(api_client, urls)
+    elapsed = time.perf_counter() - started
+    calls = server.state.requests - before
+    print(f"{label:<16} http_calls={calls:5d}  wall-clock={elapsed:6.2f} s")
+    return calls
+
+
+def wait_with_loops(api_client, urls):
+    threads = [threading.Thread(target=per_task_loop, args=(api_client, url)) for url in urls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def wait_with_tracker(api_client, urls):
+    from redis_cloud_creator import task_tracker
+    tracker = task_tracker.TaskTracker(poll_interval=POLL_INTERVAL, verbose=False)
+    futures = [tracker.register(url) for url in urls]
+    for future in futures:
+        future.result()
+
+
+def main():
+    rng = random.Random(42)
+    state = MockState(task_delay=lambda: rng.uniform(5, 30) * POLL_INTERVAL)
+    server = start_mock_server(state=state)
+    os.environ['REDIS_CLOUD_API_URL'] = server.base_url
+    os.environ.setdefault('REDIS_CLOUD_RATE_LIMIT', '0')
+    os.environ.setdefault('REDIS_CLOUD_METADATA_CACHE', '')
+    try:
+        print(f"{TASKS} tasks in flight, poll interval {POLL_INTERVAL}s")
+        loops = run("per-task loops", server, wait_with_loops)
+        rng.seed(42)
+        tracked = run("task tracker", server, wait_with_tracker)
+        print(f"saved {loops - tracked} HTTP calls ({(1 - tracked / loops) * 100:.1f}%)")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import os
+import time
+
+from mock_redis import start_mock_redis
+
+# The post-provision verification stage against a local mock Redis endpoint:
+# an endpoint that is ready, one that refuses connections for a while after
+# "active" and one whose ACL user has the wrong password.
+
+OPS = int(os.getenv('BENCH_VERIFY_OPS', '1000'))
+ACCEPT_AFTER = float(os.getenv('BENCH_VERIFY_ACCEPT_AFTER', '1'))
+LATENCY = float(os.getenv('BENCH_LATENCY', '0'))
+
+
+def run(label, server, password, ops=OPS):
+    from redis_cloud_creator import verify
+
+    started = time.perf_counter()
+    result = verify.verify_database(server.endpoint, 'bench-user', password, tls=False, ops=ops, timeout=30)
+    elapsed = time.perf_counter() - started
+    latency = result.get("latency_ms", {})
+    probe = "  ".join(f"{kind} p50={summary['p50']:.3f} ms p99={summary['p99']:.3f} ms"
+                      for kind, summary in latency.items())
+    print(f"{label:<22} ok={result['ok']!s:<5} attempts={result.get('connect_attempts', '-')!s:>3}  "
+          f"wall-clock={elapsed * 1000:8.1f} ms  {probe or result.get('error')}")
+
+
+def main():
+    os.environ.setdefault('REDIS_CLOUD_POLL_INITIAL', '0.1')
+    os.environ.setdefault('REDIS_CLOUD_POLL_CAP', '0.5')
+    users = {'bench-user': 'Secret@99'}
+    print(f"{OPS} SET/GET pairs, {LATENCY * 1000:.1f} ms added latency")
+    ready = start_mock_redis(users=users, latency=LATENCY)
+    run("ready endpoint", ready, 'Secret@99')
+    run("wrong password", ready, 'not-the-password')
+    ready.shutdown()
+
+    late = start_mock_redis(users=users, latency=LATENCY, accept_after=ACCEPT_AFTER)
+    run(f"ready after {ACCEPT_AFTER:g}s", late, 'Secret@99', ops=10)
+    late.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+
+from mock_api import MockState, start_mock_server
+
+# Time until a test environment holds usable credentials: provisioning a stack on
+# demand versus claiming one from a warm pool (password rotation included),
+# with the API's task and state-transition delays scaled down as in bench_end_to_end.
+
+CLAIMS = int(os.getenv('BENCH_POOL_CLAIMS', '5'))
+TASK_DELAY = float(os.getenv('BENCH_TASK_DELAY', '0.2'))
+TRANSITION_DELAY = float(os.getenv('BENCH_TRANSITION_DELAY', '0.1'))
+
+
+def main():
+    state = MockState(task_delay=TASK_DELAY, transition_delay=TRANSITION_DELAY)
+    server = start_mock_server(state=state)
+    os.environ['REDIS_CLOUD_API_URL'] = server.base_url
+    os.environ.setdefault('REDIS_CLOUD_RATE_LIMIT', '0')
+    os.environ.setdefault('REDIS_CLOUD_METADATA_CACHE', '')
+    os.environ.setdefault('REDIS_CLOUD_POLL_INITIAL', str(TASK_DELAY / 4))
+    os.environ.setdefault('REDIS_CLOUD_POLL_CAP', str(TASK_DELAY))
+    from redis_cloud_creator import events, provision_engine, warm_pool
+
+    print(f"task delay {TASK_DELAY}s, transition delay {TRANSITION_DELAY}s, {CLAIMS} hand-outs each")
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            pool = warm_pool.WarmPool(path=os.path.join(directory, 'pool.sqlite3'), size=CLAIMS)
+            on_demand = []
+            claimed = []
+            with contextlib.redirect_stdout(io.StringIO()):
+                for i in range(CLAIMS):
+                    started = time.perf_counter()
+                    provision_engine.provision_many([warm_pool.member_stack(pool.template, f"bench{i}")])
+                    on_demand.append(time.perf_counter() - started)
+                pool.refill()
+                for _ in range(CLAIMS):
+                    started = time.perf_counter()
+                    pool.claim()
+                    claimed.append(time.perf_counter() - started)
+                events.flush()
+            for label, samples in (("provision on demand", on_demand), ("claim from warm pool", claimed)):
+                print(f"{label:<22} median={statistics.median(samples) * 1000:8.1f} ms  "
+                      f"max={max(samples) * 1000:8.1f} ms")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_api import MockState, start_mock_server
+
+# Throughput of the durable work queue with 1, 2 and 4 worker processes against the
+# mock API, then a crash round: one of two workers is killed mid-job and its lease
+# left to expire. Every round checks that each job created exactly one subscription.
+
+JOBS = int(os.getenv('BENCH_QUEUE_JOBS', '8'))
+WORKERS = [int(workers) for workers in os.getenv('BENCH_QUEUE_WORKERS', '1,2,4').split(',')]
+TASK_DELAY = float(os.getenv('BENCH_TASK_DELAY', '0.2'))
+LEASE = float(os.getenv('BENCH_QUEUE_LEASE', '1'))
+
+
+def write_spec(directory, prefix):
+    data = {
+        "defaults": {"plan_id": 21113, "payment_method_id": 25346},
+        "subscriptions": [{
+            "name": f"{prefix}-{i}",
+            "databases": [{"name": f"{prefix}-db-{i}"}],
+            "roles": [{"name": f"{prefix}-role-{i}"}],
+            "users": [{"name": f"{prefix}-user-{i}", "role": f"{prefix}-role-{i}",
+                       "password_env": "BENCH_USER_PASSWORD"}]
+        } for i in range(JOBS)]
+    }
+    path = os.path.join(directory, f"{prefix}.json")
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    return path
+
+
+def main():
+    state = MockState(task_delay=TASK_DELAY)
+    server = start_mock_server(state=state)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, REDIS_CLOUD_API_URL=server.base_url, REDIS_CLOUD_RATE_LIMIT='0',
+               REDIS_CLOUD_METADATA_CACHE='', REDIS_CLOUD_POLL_INITIAL=str(TASK_DELAY / 4),
+               REDIS_CLOUD_POLL_CAP=str(TASK_DELAY), REDIS_CLOUD_QUEUE_LEASE=str(LEASE),
+               REDIS_CLOUD_QUEUE_RETRY_DELAY='0', BENCH_USER_PASSWORD='Bench@123')
+    os.environ.update(env)
+    from redis_cloud_creator import work_queue
+
+    def start_workers(queue_path, count):
+        return [subprocess.Popen([sys.executable, '-m', 'redis_cloud_creator.work_queue', '--queue', queue_path,
+                                  'worker', '--until-empty', '--interval', '0.05'], cwd=root, env=env,
+                                 stdout=subprocess.DEVNULL)
+                for _ in range(count)]
+
+    def report(label, queue, prefix, elapsed):
+        jobs = queue.jobs()
+        created = sum(subscription["name"].startswith(f"{prefix}-") for subscription in state.subscriptions.values())
+        done = sum(job["state"] == "done" for job in jobs)
+        retried = sum(job["attempts"] > 1 for job in jobs)
+        print(f"{label:<24} done={done}/{len(jobs)}  subscriptions created={created:3d}  retried={retried}  "
+              f"wall-clock={elapsed:6.2f} s  throughput={done / elapsed:5.2f} jobs/s")
+
+    print(f"{JOBS} provision jobs, task delay {TASK_DELAY}s, lease {LEASE}s")
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for workers in WORKERS:
+                prefix = f"bench-{workers}w"
+                queue = work_queue.WorkQueue(path=os.path.join(directory, f"{prefix}.sqlite3"))
+                for name, payload in work_queue.provision_payloads(write_spec(directory, prefix)):
+                    queue.enqueue('provision', name, payload)
+                started = time.perf_counter()
+                for process in start_workers(queue.path, workers):
+                    process.wait()
+                report(f"workers={workers}", queue, prefix, time.perf_counter() - started)
+
+            prefix = "bench-crash"
+            queue = work_queue.WorkQueue(path=os.path.join(directory, f"{prefix}.sqlite3"))
+            for name, payload in work_queue.provision_payloads(write_spec(directory, prefix)):
+                queue.enqueue('provision', name, payload)
+            started = time.perf_counter()
+            victim, survivor = start_workers(queue.path, 2)
+            # Killed once it is inside a job: its stack is half-provisioned and its lease still held
+            while not any(job["owner"] and job["owner"].endswith(f":{victim.pid}") for job in queue.jobs('running')):
+                time.sleep(0.01)
+            time.sleep(TASK_DELAY * 2)
+            victim.send_signal(signal.SIGKILL)
+            victim.wait()
+            survivor.wait()
+            report("workers=2, one killed", queue, prefix, time.perf_counter() - started)
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
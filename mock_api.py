@@ -0,0 +1,445 @@
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the subset of the Redis Cloud API used by main.py and destroy.py.
+# Every mutating call is accepted with 202 and a task link; tasks complete after task_delay seconds.
+# Optional knobs simulate the slow parts of the real API:
+#   transition_delay  seconds a subscription/database stays 'pending' after its task completes
+#   failure_rate      fraction of mutating calls whose task ends in processing-error
+#   rate_limit        requests per second (per API key) before answering 429 with Retry-After
+#   latency           seconds added to every response
+#   public_endpoint   host:port handed out as every database's publicEndpoint (e.g. a mock_redis server)
+#   max_databases     maximumDatabases of every plan
+#   busy_conflicts    answer 409 to database creates/deletes while the subscription is pending
+# task_delay and transition_delay may also be callables returning a fresh delay per task.
+
+
+class MockState:
+    def __init__(self, task_delay=0, transition_delay=0, failure_rate=0, rate_limit=0, latency=0, seed=None,
+                 public_endpoint=None, max_databases=100, busy_conflicts=False):
+        self.task_delay = task_delay
+        self.transition_delay = transition_delay
+        self.failure_rate = failure_rate
+        self.rate_limit = rate_limit
+        self.latency = latency
+        self.public_endpoint = public_endpoint
+        self.max_databases = max_databases
+        self.busy_conflicts = busy_conflicts
+        self.conflicts = 0
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1000)
+        self.subscriptions = {}
+        self.databases = {}
+        self.roles = {}
+        self.users = {}
+        self.tasks = {}
+        self.payment_methods = [
+            {"id": 25346, "type": "Visa", "creditCardEndsWith": 4242}
+        ]
+        self.transitions = {}
+        # x-api-key -> (window start, calls in window)
+        self.windows = {}
+        self.requests_by_key = {}
+        self.connections = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.failed_tasks = 0
+
+    def next_id(self):
+        return next(self.ids)
+
+    def _delay(self, delay):
+        return delay() if callable(delay) else delay
+
+    def add_task(self, command_type, resource_id, error=None):
+        task_id = f"task-{self.next_id()}"
+        task = {
+            "taskId": task_id,
+            "commandType": command_type,
+            "status": "processing-completed",
+            "response": {"resourceId": resource_id},
+            "completes_at": time.monotonic() + self._delay(self.task_delay)
+        }
+        if error is not None:
+            task["status"] = "processing-error"
+            task["response"] = {"error": {"type": "MOCK_FAILURE", "status": "400 BAD_REQUEST",
+                                          "description": error}}
+            self.failed_tasks += 1
+        self.tasks[task_id] = task
+        return task_id
+
+    def start_transition(self, key, task_id):
+        # The resource reads as pending until its task is done plus transition_delay
+        completes_at = self.tasks[task_id]["completes_at"] + self._delay(self.transition_delay)
+        self.transitions[key] = max(self.transitions.get(key, 0), completes_at)
+
+    def render_resource(self, key, resource):
+        if time.monotonic() < self.transitions.get(key, 0):
+            return dict(resource, status="pending")
+        return resource
+
+    def busy(self, sid):
+        # A change is still being applied to the subscription: the API won't queue another one
+        if self.busy_conflicts and time.monotonic() < self.transitions.get(('subscription', sid), 0):
+            self.conflicts += 1
+            return True
+        return False
+
+    def should_fail(self):
+        return self.failure_rate and self.rng.random() < self.failure_rate
+
+    def take_token(self, key=None):
+        # Fixed one-second window per key; returns None when allowed, else the seconds until it resets
+        if not self.rate_limit:
+            return None
+        now = time.monotonic()
+        window_start, count = self.windows.get(key, (0, 0))
+        if now - window_start >= 1:
+            window_start, count = now, 0
+        if count >= self.rate_limit:
+            self.rate_limited += 1
+            return window_start + 1 - now
+        self.windows[key] = (window_start, count + 1)
+        return None
+
+    def seed_acl(self, count, prefix='seed'):
+        # Synthetic ACL users and roles, for exercising large list payloads
+        for i in range(count):
+            rid, uid = self.next_id(), self.next_id()
+            self.roles[rid] = {"id": rid, "name": f"{prefix}-role-{i}", "redisRules": [],
+                               "users": [{"id": uid, "name": f"{prefix}-user-{i}"}], "status": "active"}
+            self.users[uid] = {"id": uid, "name": f"{prefix}-user-{i}", "role": f"{prefix}-role-{i}",
+                               "status": "active"}
+
+    def render_task(self, task):
+        task = dict(task)
+        if time.monotonic() < task.pop("completes_at"):
+            task["status"] = "processing-in-progress"
+            task["response"] = {}
+        return task
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    routes = [
+        ('GET', r'/payment-methods', 'list_payment_methods'),
+        ('GET', r'/fixed/plans/(?P<pid>\d+)', 'get_plan'),
+        ('GET', r'/tasks', 'list_tasks'),
+        ('GET', r'/tasks/(?P<task_id>[^/]+)', 'get_task'),
+        ('GET', r'/fixed/subscriptions', 'list_subscriptions'),
+        ('POST', r'/fixed/subscriptions', 'create_subscription'),
+        ('GET', r'/fixed/subscriptions/(?P<sid>\d+)', 'get_subscription'),
+        ('DELETE', r'/fixed/subscriptions/(?P<sid>\d+)', 'delete_subscription'),
+        ('GET', r'/fixed/subscriptions/(?P<sid>\d+)/databases', 'list_databases'),
+        ('POST', r'/fixed/subscriptions/(?P<sid>\d+)/databases', 'create_database'),
+        ('GET', r'/fixed/subscriptions/(?P<sid>\d+)/databases/(?P<did>\d+)', 'get_database'),
+        ('PUT', r'/fixed/subscriptions/(?P<sid>\d+)/databases/(?P<did>\d+)', 'update_database'),
+        ('DELETE', r'/fixed/subscriptions/(?P<sid>\d+)/databases/(?P<did>\d+)', 'delete_database'),
+        ('GET', r'/acl/roles', 'list_roles'),
+        ('POST', r'/acl/roles', 'create_role'),
+        ('PUT', r'/acl/roles/(?P<rid>\d+)', 'update_role'),
+        ('DELETE', r'/acl/roles/(?P<rid>\d+)', 'delete_role'),
+        ('GET', r'/acl/users', 'list_users'),
+        ('POST', r'/acl/users', 'create_user'),
+        ('PUT', r'/acl/users/(?P<uid>\d+)', 'update_user'),
+        ('DELETE', r'/acl/users/(?P<uid>\d+)', 'delete_user'),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def dispatch(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+        path = self.path.split('?', 1)[0]
+        prefix = self.server.prefix
+        if path.startswith(prefix):
+            path = path[len(prefix):]
+
+        if self.state.latency:
+            time.sleep(self.state._delay(self.state.latency))
+        headers = {}
+        with self.state.lock:
+            self.state.requests += 1
+            key = self.headers.get('x-api-key')
+            self.state.requests_by_key[key] = self.state.requests_by_key.get(key, 0) + 1
+            reset = self.state.take_token(key)
+            if self.state.rate_limit:
+                headers['X-RateLimit-Limit'] = str(self.state.rate_limit)
+                headers['X-RateLimit-Remaining'] = str(self.state.rate_limit - self.state.windows[key][1])
+            if reset is not None:
+                headers['Retry-After'] = str(math.ceil(reset))
+                headers['X-RateLimit-Reset'] = f"{reset:.3f}"
+                self.send_json(429, {"error": "Too many requests"}, headers=headers)
+                return
+            for route_method, pattern, name in self.routes:
+                match = re.fullmatch(pattern, path)
+                if match and route_method == method:
+                    if method != 'GET' and self.state.should_fail():
+                        # Accepted, but the task fails and nothing changes
+                        task_id = self.state.add_task(f"{name}Request", None, f"Simulated failure of {name}")
+                        status, payload = self.task_accepted(task_id)
+                    else:
+                        status, payload = getattr(self, name)(body, **match.groupdict())
+                    break
+            else:
+                status, payload = 404, {"error": f"No route for {method} {path}"}
+        self.send_json(status, payload, etag=method == 'GET' and status == 200, headers=headers)
+
+    def send_json(self, status, payload, etag=False, headers=None):
+        data = json.dumps(payload).encode()
+        headers = dict(headers or {}, **{'Content-Type': 'application/json'})
+        if etag:
+            headers['ETag'] = '"' + hashlib.sha1(data).hexdigest() + '"'
+            if self.headers.get('If-None-Match') == headers['ETag']:
+                status, data = 304, b''
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def accepted(self, command_type, resource_id, transitions=()):
+        task_id = self.state.add_task(command_type, resource_id)
+        for key in transitions:
+            self.state.start_transition(key, task_id)
+        return self.task_accepted(task_id)
+
+    def task_accepted(self, task_id):
+        return 202, {
+            "taskId": task_id,
+            "commandType": self.state.tasks[task_id]["commandType"],
+            "status": "received",
+            "links": [{"href": f"{self.server.base_url}/tasks/{task_id}", "rel": "task", "type": "GET"}]
+        }
+
+    def list_payment_methods(self, body):
+        return 200, {"paymentMethods": self.state.payment_methods}
+
+    def get_plan(self, body, pid):
+        return 200, {"id": int(pid), "name": f"Mock plan {pid}", "maximumDatabases": self.state.max_databases}
+
+    def list_tasks(self, body):
+        return 200, [self.state.render_task(task) for task in self.state.tasks.values()]
+
+    def get_task(self, body, task_id):
+        task = self.state.tasks.get(task_id)
+        if task is None:
+            return 404, {"error": f"Task {task_id} not found"}
+        return 200, self.state.render_task(task)
+
+    def list_subscriptions(self, body):
+        return 200, {"subscriptions": [self.state.render_resource(('subscription', sid), subscription)
+                                       for sid, subscription in self.state.subscriptions.items()]}
+
+    def create_subscription(self, body):
+        if body.get("paymentMethodId") not in [method["id"] for method in self.state.payment_methods]:
+            return 400, {"error": f"Payment method {body.get('paymentMethodId')} not found"}
+        sid = self.state.next_id()
+        self.state.subscriptions[sid] = {
+            "id": sid,
+            "name": body.get("name"),
+            "planId": body.get("planId"),
+            "paymentMethodId": body.get("paymentMethodId"),
+            "status": "active"
+        }
+        return self.accepted("createFixedSubscriptionRequest", sid, [('subscription', sid)])
+
+    def get_subscription(self, body, sid):
+        subscription = self.state.subscriptions.get(int(sid))
+        if subscription is None:
+            return 404, {"error": f"Subscription {sid} not found"}
+        return 200, self.state.render_resource(('subscription', int(sid)), subscription)
+
+    def delete_subscription(self, body, sid):
+        if self.state.subscriptions.pop(int(sid), None) is None:
+            return 404, {"error": f"Subscription {sid} not found"}
+        return self.accepted("deleteFixedSubscriptionRequest", int(sid))
+
+    def list_databases(self, body, sid):
+        databases = [self.state.render_resource(('database', key), db)
+                     for key, db in self.state.databases.items() if key[0] == int(sid)]
+        return 200, {"subscription": {"subscriptionId": int(sid), "numberOfDatabases": len(databases),
+                                      "databases": databases}}
+
+    def create_database(self, body, sid):
+        if int(sid) not in self.state.subscriptions:
+            return 404, {"error": f"Subscription {sid} not found"}
+        if self.state.busy(int(sid)):
+            return 409, {"error": f"Subscription {sid} is busy"}
+        did = self.state.next_id()
+        database = dict(body)
+        database.update({
+            "databaseId": did,
+            "status": "active",
+            "publicEndpoint": self.state.public_endpoint or f"redis-{did}.localhost:{10000 + did % 50000}",
+            "enableDefaultUser": body.get("enableDefaultUser", True)
+        })
+        database.pop("password", None)
+        self.state.databases[(int(sid), did)] = database
+        return self.accepted("createFixedDatabaseRequest", did,
+                             [('database', (int(sid), did)), ('subscription', int(sid))])
+
+    def get_database(self, body, sid, did):
+        database = self.state.databases.get((int(sid), int(did)))
+        if database is None:
+            return 404, {"error": f"Database {did} not found"}
+        return 200, self.state.render_resource(('database', (int(sid), int(did))), database)
+
+    def update_database(self, body, sid, did):
+        database = self.state.databases.get((int(sid), int(did)))
+        if database is None:
+            return 404, {"error": f"Database {did} not found"}
+        database.update({k: v for k, v in body.items() if k != "password"})
+        return self.accepted("updateFixedDatabaseRequest", int(did), [('subscription', int(sid))])
+
+    def delete_database(self, body, sid, did):
+        if (int(sid), int(did)) in self.state.databases and self.state.busy(int(sid)):
+            return 409, {"error": f"Subscription {sid} is busy"}
+        if self.state.databases.pop((int(sid), int(did)), None) is None:
+            return 404, {"error": f"Database {did} not found"}
+        return self.accepted("deleteFixedDatabaseRequest", int(did), [('subscription', int(sid))])
+
+    def list_roles(self, body):
+        return 200, {"roles": list(self.state.roles.values())}
+
+    def create_role(self, body):
+        rid = self.state.next_id()
+        self.state.roles[rid] = {
+            "id": rid,
+            "name": body.get("name"),
+            "redisRules": body.get("redisRules", []),
+            "users": [],
+            "status": "active"
+        }
+        return self.accepted("aclRoleCreateRequest", rid)
+
+    def update_role(self, body, rid):
+        role = self.state.roles.get(int(rid))
+        if role is None:
+            return 404, {"error": f"Role {rid} not found"}
+        role.update({k: v for k, v in body.items() if k in ("name", "redisRules")})
+        return self.accepted("aclRoleUpdateRequest", int(rid))
+
+    def delete_role(self, body, rid):
+        if self.state.roles.pop(int(rid), None) is None:
+            return 404, {"error": f"Role {rid} not found"}
+        return self.accepted("aclRoleDeleteRequest", int(rid))
+
+    def list_users(self, body):
+        return 200, {"users": list(self.state.users.values())}
+
+    def create_user(self, body):
+        uid = self.state.next_id()
+        user = {"id": uid, "name": body.get("name"), "role": body.get("role"), "status": "active"}
+        self.state.users[uid] = user
+        for role in self.state.roles.values():
+            if role["name"] == user["role"]:
+                role["users"].append({"id": uid, "name": user["name"]})
+        return self.accepted("aclUserCreateRequest", uid)
+
+    def update_user(self, body, uid):
+        user = self.state.users.get(int(uid))
+        if user is None:
+            return 404, {"error": f"User {uid} not found"}
+        if "role" in body and body["role"] != user["role"]:
+            for role in self.state.roles.values():
+                role["users"] = [u for u in role["users"] if u["id"] != int(uid)]
+                if role["name"] == body["role"]:
+                    role["users"].append({"id": int(uid), "name": user["name"]})
+            user["role"] = body["role"]
+        return self.accepted("aclUserUpdateRequest", int(uid))
+
+    def delete_user(self, body, uid):
+        user = self.state.users.pop(int(uid), None)
+        if user is None:
+            return 404, {"error": f"User {uid} not found"}
+        for role in self.state.roles.values():
+            role["users"] = [u for u in role["users"] if u["id"] != int(uid)]
+        return self.accepted("aclUserDeleteRequest", int(uid))
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, state=None, prefix='/v1'):
+        super().__init__(address, MockHandler)
+        self.state = state or MockState()
+        self.prefix = prefix
+        self.base_url = f"http://{self.server_address[0]}:{self.server_address[1]}{prefix}"
+
+    def verify_request(self, request, client_address):
+        # Called once per accepted TCP connection
+        with self.state.lock:
+            self.state.connections += 1
+        return True
+
+
+def start_mock_server(host='127.0.0.1', port=0, state=None):
+    server = MockServer((host, port), state)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock Redis Cloud API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--task-delay', type=float, default=0, help="Seconds until a task completes")
+    parser.add_argument('--transition-delay', type=float, default=0,
+                        help="Seconds a subscription/database stays pending after its task completes")
+    parser.add_argument('--failure-rate', type=float, default=0,
+                        help="Fraction of mutating calls whose task fails (0-1)")
+    parser.add_argument('--rate-limit', type=int, default=0, help="Requests per second before answering 429")
+    parser.add_argument('--latency', type=float, default=0, help="Seconds added to every response")
+    parser.add_argument('--seed', type=int, help="Seed for the failure injection")
+    parser.add_argument('--public-endpoint', help="host:port to hand out as every database's publicEndpoint")
+    parser.add_argument('--max-databases', type=int, default=100, help="maximumDatabases of every plan")
+    parser.add_argument('--busy-conflicts', action='store_true',
+                        help="Answer 409 to database changes while the subscription is pending")
+    args = parser.parse_args()
+
+    state = MockState(task_delay=args.task_delay, transition_delay=args.transition_delay,
+                      failure_rate=args.failure_rate, rate_limit=args.rate_limit, latency=args.latency,
+                      seed=args.seed, public_endpoint=args.public_endpoint, max_databases=args.max_databases,
+                      busy_conflicts=args.busy_conflicts)
+    server = MockServer((args.host, args.port), state)
+    print(f"Mock Redis Cloud API listening on {server.base_url}")
+    print(f"Use it with: REDIS_CLOUD_API_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import socketserver
+import threading
+import time
+
+# Local stand-in for a Redis Cloud database endpoint, enough for verify.py:
+# AUTH (ACL user + password), PING, SET, GET and DEL over RESP.
+# Optional knobs simulate a freshly provisioned database:
+#   accept_after  seconds during which connections are closed straight away
+#   latency       seconds added to every reply
+# Pass an ssl.SSLContext (with a server certificate loaded) to serve TLS.
+
+
+class MockRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, users=None, accept_after=0, latency=0, ssl_context=None):
+        super().__init__(address, MockRedisHandler)
+        self.users = dict(users or {})
+        self.accept_after = accept_after
+        self.latency = latency
+        self.ssl_context = ssl_context
+        self.started = time.monotonic()
+        self.data = {}
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.refused = 0
+
+    @property
+    def endpoint(self):
+        host, port = self.server_address[:2]
+        return f"{host}:{port}"
+
+    def get_request(self):
+        sock, address = super().get_request()
+        if self.ssl_context is not None:
+            sock = self.ssl_context.wrap_socket(sock, server_side=True)
+        return sock, address
+
+
+class MockRedisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        with server.lock:
+            if time.monotonic() - server.started < server.accept_after:
+                server.refused += 1
+                return
+            server.connections += 1
+        authenticated = not server.users
+        while True:
+            command = self.read_command()
+            if command is None:
+                return
+            if server.latency:
+                time.sleep(server.latency)
+            name = command[0].upper() if command else b''
+            if name == b'AUTH':
+                user, password = (command[1], command[2]) if len(command) == 3 else (b'default', command[-1])
+                if server.users.get(user.decode()) == password.decode():
+                    authenticated = True
+                    self.reply(b"+OK\r\n")
+                else:
+                    self.reply(b"-WRONGPASS invalid username-password pair or user is disabled.\r\n")
+            elif not authenticated:
+                self.reply(b"-NOAUTH Authentication required.\r\n")
+            elif name == b'PING':
+                self.reply(b"+PONG\r\n")
+            elif name == b'SET' and len(command) == 3:
+                with server.lock:
+                    server.data[command[1]] = command[2]
+                self.reply(b"+OK\r\n")
+            elif name == b'GET' and len(command) == 2:
+                with server.lock:
+                    value = server.data.get(command[1])
+                self.reply(b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value))
+            elif name == b'DEL':
+                with server.lock:
+                    removed = sum(server.data.pop(key, None) is not None for key in command[1:])
+                self.reply(b":%d\r\n" % removed)
+            else:
+                self.reply(b"-ERR unknown command or wrong number of arguments\r\n")
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line.startswith(b'*'):
+            return None
+        command = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            command.append(self.rfile.read(length + 2)[:-2])
+        return command
+
+    def reply(self, payload):
+        self.wfile.write(payload)
+
+
+def start_mock_redis(host='127.0.0.1', port=0, **kwargs):
+    server = MockRedisServer((host, port), **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock Redis endpoint for verify.py")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6380)
+    parser.add_argument('--user', action='append', default=[], help="name:password, may be repeated")
+    parser.add_argument('--accept-after', type=float, default=0,
+                        help="Seconds during which connections are closed straight away")
+    parser.add_argument('--latency', type=float, default=0, help="Seconds added to every reply")
+    args = parser.parse_args()
+
+    users = dict(user.split(':', 1) for user in args.user)
+    server = MockRedisServer((args.host, args.port), users=users, accept_after=args.accept_after,
+                             latency=args.latency)
+    print(f"Mock Redis endpoint listening on {server.endpoint}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,3 @@
+# Provision and tear down Redis Cloud Essentials subscriptions, databases and ACL users.
+# Deliberately empty: importing the package must stay free, so `redis-cloud status`
+# and `list` load only the modules they use (see cli.py).
@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+
+from . import api_client, credentials, events, metadata_cache
+
+# name -> entry index over /acl/users and /acl/roles, built from one list call.
+# Lookups are answered from memory; the list is only re-fetched when the index
+# is stale or a name is missing, and then revalidated with If-None-Match so an
+# unchanged list costs a 304 instead of the full payload. Lists are also kept in
+# the shared metadata cache, so the next process (or a parallel one) starts from
+# them instead of re-listing.
+
+API_URL_ACL_ROLES = f'{api_client.API_BASE_URL}/acl/roles'
+API_URL_ACL_USERS = f'{api_client.API_BASE_URL}/acl/users'
+
+ACL_INDEX_TTL = float(os.getenv('REDIS_CLOUD_ACL_INDEX_TTL', '300'))
+# A missing name triggers at most one re-fetch per this many seconds
+MISSING_REFRESH_INTERVAL = 2
+
+
+class AclIndex:
+    def __init__(self, url, key, ttl=ACL_INDEX_TTL):
+        self.url = url
+        self.key = key
+        self.ttl = ttl
+        self.by_name = {}
+        self.etag = None
+        self.fetched = None
+        self.list_calls = 0
+        self.not_modified = 0
+        self.shared_hits = 0
+        self._lock = threading.RLock()
+
+    @property
+    def cache_key(self):
+        return f"acl {self.key}"
+
+    def refresh(self):
+        # Returns the response so callers can react to 429s and other errors
+        with self._lock:
+            headers = {'If-None-Match': self.etag} if self.etag else {}
+            response = api_client.get(self.url, headers=headers)
+            self.list_calls += 1
+            if response.status_code == 304:
+                self.not_modified += 1
+                self.fetched = time.monotonic()
+                metadata_cache.get_cache().touch(self.cache_key)
+            elif response.status_code == 200:
+                entries = response.json().get(self.key, [])
+                self.load(entries, response.headers.get('ETag'))
+                metadata_cache.get_cache().put(self.cache_key, entries, self.etag)
+            return response
+
+    def load(self, entries, etag=None):
+        with self._lock:
+            self.by_name = {entry['name']: entry for entry in entries}
+            self.etag = etag
+            self.fetched = time.monotonic()
+
+    def _load_shared(self, cache):
+        # Adopts the shared copy; True if it is fresh enough to skip the API altogether
+        entry = cache.peek(self.cache_key)
+        if entry is None:
+            return False
+        entries, etag, age = entry
+        if age <= self.ttl:
+            self.load(entries, etag)
+            self.fetched = time.monotonic() - age
+            self.shared_hits += 1
+            return True
+        if self.fetched is None:
+            # Too old to trust, but its ETag still turns an unchanged re-list into a 304
+            self.load(entries, etag)
+            self.fetched = None
+        return False
+
+    def _ensure_fresh(self):
+        if self.fetched is not None and time.monotonic() - self.fetched <= self.ttl:
+            return
+        cache = metadata_cache.get_cache()
+        if self._load_shared(cache):
+            return
+        with cache.locked():
+            # Another process may have re-listed while we waited for the lock
+            if self._load_shared(cache):
+                return
+            response = self.refresh()
+            if response.status_code not in (200, 304):
+                events.api_error(f"Failed to get {self.key}", response)
+                response.raise_for_status()
+
+    def get(self, name):
+        with self._lock:
+            self._ensure_fresh()
+            entry = self.by_name.get(name)
+            if entry is None and time.monotonic() - self.fetched > MISSING_REFRESH_INTERVAL:
+                self.refresh()
+                entry = self.by_name.get(name)
+            return entry
+
+    def peek(self, name):
+        with self._lock:
+            return self.by_name.get(name)
+
+    def entries(self):
+        with self._lock:
+            self._ensure_fresh()
+            return list(self.by_name.values())
+
+    def invalidate(self):
+        # Our own creations only get an ID once their task completes; re-list on next lookup
+        with self._lock:
+            self.fetched = None
+            metadata_cache.get_cache().invalidate(self.cache_key)
+
+    def put(self, entry):
+        with self._lock:
+            self.by_name[entry['name']] = entry
+            self.etag = None
+            metadata_cache.get_cache().invalidate(self.cache_key)
+
+    def remove_id(self, entry_id):
+        # Keep the index in step with our own deletions without re-listing
+        with self._lock:
+            for name, entry in list(self.by_name.items()):
+                if str(entry.get('id')) == str(entry_id):
+                    del self.by_name[name]
+            self.etag = None
+            metadata_cache.get_cache().invalidate(self.cache_key)
+
+
+# (credential name, key) -> index: each API key may belong to a different account
+_indexes = {}
+_index_lock = threading.Lock()
+
+
+def _index(url, key):
+    credential = credentials.current()
+    with _index_lock:
+        index = _indexes.get((credential.name, key))
+        if index is None:
+            index = _indexes[(credential.name, key)] = AclIndex(url, key)
+        return index
+
+
+def users():
+    return _index(API_URL_ACL_USERS, 'users')
+
+
+def roles():
+    return _index(API_URL_ACL_ROLES, 'roles')
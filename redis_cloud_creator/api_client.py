@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from . import coalesce, credentials, metrics, rate_limiter
+
+# Load environment variables
+load_dotenv()
+
+# 'requests' (default) or 'stdlib': cli.py's read-only commands use the http.client
+# transport (stdlib_http.py) so a one-off lookup doesn't pay for importing requests.
+# Either one is only imported when the first session is created.
+HTTP_TRANSPORT = os.getenv('REDIS_CLOUD_HTTP_TRANSPORT', 'requests')
+
+API_BASE_URL = os.getenv('REDIS_CLOUD_API_URL', 'https://api.redislabs.com/v1').rstrip('/')
+API_KEY = os.getenv('REDIS_CLOUD_API_KEY', 'hardcoded-api-key')
+API_SECRET_KEY = os.getenv('REDIS_CLOUD_API_SECRET_KEY', 'hardcoded-api-secret-key')
+
+# Connection pool and timeout settings
+POOL_CONNECTIONS = int(os.getenv('REDIS_CLOUD_POOL_CONNECTIONS', '4'))
+POOL_MAXSIZE = int(os.getenv('REDIS_CLOUD_POOL_MAXSIZE', '16'))
+CONNECT_TIMEOUT = float(os.getenv('REDIS_CLOUD_CONNECT_TIMEOUT', '10'))
+READ_TIMEOUT = float(os.getenv('REDIS_CLOUD_READ_TIMEOUT', '60'))
+
+_session_lock = threading.Lock()
+
+
+def create_session(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, transport=None,
+                   api_key=None, secret_key=None):
+    if (transport or HTTP_TRANSPORT) == 'stdlib':
+        from . import stdlib_http
+        session = stdlib_http.Session()
+    else:
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+    session.headers.update({
+        'x-api-key': api_key or API_KEY,
+        'x-api-secret-key': secret_key or API_SECRET_KEY,
+        'Accept': 'application/json'
+    })
+    return session
+
+
+def get_session(credential=None):
+    # One keep-alive session per credential, so every call reuses pooled connections
+    credential = credential or credentials.current()
+    if credential.session is None:
+        with _session_lock:
+            if credential.session is None:
+                credential.session = create_session(api_key=credential.api_key, secret_key=credential.secret_key)
+    return credential.session
+
+
+def close_session():
+    with _session_lock:
+        for credential in credentials.all_credentials():
+            if credential.session is not None:
+                credential.session.close()
+                credential.session = None
+
+
+def request(method, url, **kwargs):
+    kwargs.setdefault('timeout', (CONNECT_TIMEOUT, READ_TIMEOUT))
+    # The key (and so the quota and session) of whatever stack this call is made for
+    credential = credentials.current()
+    priority = rate_limiter.priority(method)
+    if priority == rate_limiter.PRIORITY_MUTATE:
+        # GETs already in flight may have been answered before this call lands
+        coalesce.get_single_flight().invalidate()
+    attempt = 0
+    while True:
+        credential.limiter.acquire(priority)
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            response = get_session(credential).request(method, url, **kwargs)
+            status = response.status_code
+        except Exception as e:
+            credential.observe(error=e)
+            raise
+        finally:
+            metrics.record_request(method, url, status, time.perf_counter() - started)
+        credential.observe(response)
+        credential.limiter.observe(response)
+        # A 429 means the call was not processed, so it is safe to resend even a POST
+        if response.status_code != 429 or attempt >= rate_limiter.RATE_LIMIT_RETRIES:
+            return response
+        attempt += 1
+
+
+def error_status(error):
+    # Status code of a raise_for_status() error from either transport (requests' HTTPError or
+    # stdlib_http's), None for errors that carry no response
+    response = getattr(error, 'response', None)
+    return response.status_code if response is not None else None
+
+
+def get(url, **kwargs):
+    if set(kwargs) <= {'timeout'}:
+        # Plain GETs only: conditional or parameterised ones are not interchangeable
+        return coalesce.get(url, lambda: request('GET', url, **kwargs))
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request('PUT', url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request('DELETE', url, **kwargs)
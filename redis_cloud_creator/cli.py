@@ -0,0 +1,166 @@
+import argparse
+import os
+import sys
+
+# Single entry point (the `redis-cloud` console script, see pyproject.toml):
+#   redis-cloud create [--spec FILE] [--concurrency N]
+#   redis-cloud destroy [--manifest FILE | --name GLOB] [--concurrency N]
+#   redis-cloud status SUBSCRIPTION_ID
+#   redis-cloud list [--name GLOB]
+#   redis-cloud pool {serve,claim,status,release,drain} ...   (see warm_pool.py)
+#   redis-cloud daemon [--port N] [--watch-all] ...            (see status_daemon.py)
+#   redis-cloud queue {provision,teardown,worker,status,retry} ...   (see work_queue.py)
+# Nothing beyond argparse is imported until a subcommand runs, and each one
+# imports only what it needs: status and list never load the provisioning
+# machinery or requests, which is most of a short invocation's start-up time.
+
+
+def cmd_create(args):
+    if args.spec:
+        os.environ['REDIS_CLOUD_SPEC'] = args.spec
+        from . import spec
+        if len(spec.load(args.spec)) > 1:
+            # Several subscriptions: run them concurrently
+            from . import provision_engine
+            argv = [args.spec] + (['--concurrency', str(args.concurrency)] if args.concurrency else [])
+            provision_engine.main_cli(argv)
+            return
+    from . import main
+    main.main()
+
+
+def cmd_destroy(args):
+    from . import destroy
+    argv = ['--concurrency', str(args.concurrency)] if args.concurrency else []
+    if args.manifest:
+        argv += ['--manifest', args.manifest]
+    if args.name:
+        argv += ['--name', args.name]
+    destroy.main(argv)
+
+
+def read_only_client():
+    # One or two GETs don't need a connection pool; see api_client.HTTP_TRANSPORT
+    os.environ.setdefault('REDIS_CLOUD_HTTP_TRANSPORT', 'stdlib')
+    from . import api_client
+    return api_client
+
+
+def fixed_get(api_client, path, description):
+    from . import events
+    response = api_client.get(f'{api_client.API_BASE_URL}/fixed/subscriptions{path}')
+    if response.status_code != 200:
+        events.api_error(description, response)
+        response.raise_for_status()
+    return response.json()
+
+
+def cmd_status(args):
+    import json
+
+    from . import events
+    api_client = read_only_client()
+    try:
+        subscription = fixed_get(api_client, f'/{args.subscription_id}', "Failed to get subscription")
+        databases = fixed_get(api_client, f'/{args.subscription_id}/databases', "Failed to list databases")
+        status = {
+            "subscription_id": subscription.get('id', args.subscription_id),
+            "name": subscription.get('name'),
+            "status": subscription.get('status'),
+            "databases": [{
+                "database_id": database.get('databaseId'),
+                "name": database.get('name'),
+                "status": database.get('status'),
+                "database_url": database.get('publicEndpoint')
+            } for database in databases.get('subscription', {}).get('databases', [])]
+        }
+        events.emit("result", json.dumps(status, indent=4), result=status)
+    except Exception as e:
+        events.emit("error", f"Error: {e}", error=str(e))
+    events.flush()
+
+
+def cmd_list(args):
+    import fnmatch
+
+    from . import events
+    api_client = read_only_client()
+    try:
+        subscriptions = [
+            {"subscription_id": subscription['id'], "name": subscription.get('name'),
+             "status": subscription.get('status')}
+            for subscription in fixed_get(api_client, '', "Failed to list subscriptions").get('subscriptions', [])
+            if fnmatch.fnmatchcase(subscription.get('name', ''), args.name)
+        ]
+        lines = [f"{subscription['subscription_id']:>10}  {subscription['status'] or '':<12}  {subscription['name']}"
+                 for subscription in subscriptions]
+        events.emit("result", "\n".join(lines) or "No subscriptions found.", result=subscriptions)
+    except Exception as e:
+        events.emit("error", f"Error: {e}", error=str(e))
+    events.flush()
+
+
+def cmd_pool(args):
+    from . import warm_pool
+    warm_pool.main_cli(args.rest)
+
+
+def cmd_daemon(args):
+    from . import status_daemon
+    status_daemon.main_cli(args.rest)
+
+
+def cmd_queue(args):
+    from . import work_queue
+    work_queue.main_cli(args.rest)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='redis-cloud', description="Provision and manage Redis Cloud Essentials stacks")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    create = commands.add_parser('create', help="Provision the stack(s) in a spec file (default: main.py's stack)")
+    create.add_argument('--spec', help="Spec file (.json/.toml/.yaml, see spec.py); overrides REDIS_CLOUD_SPEC")
+    create.add_argument('--concurrency', type=int, help="Stacks provisioned at once for multi-stack specs")
+    create.set_defaults(func=cmd_create)
+
+    destroy = commands.add_parser('destroy', help="Tear down stacks")
+    destroy.add_argument('--manifest', help="JSON file with a list of stacks to delete")
+    destroy.add_argument('--name', help="Delete every subscription whose name matches this glob")
+    destroy.add_argument('--concurrency', type=int)
+    destroy.set_defaults(func=cmd_destroy)
+
+    status = commands.add_parser('status', help="Show a subscription and its databases")
+    status.add_argument('subscription_id')
+    status.set_defaults(func=cmd_status)
+
+    list_parser = commands.add_parser('list', help="List subscriptions")
+    list_parser.add_argument('--name', default='*', help="Only subscriptions whose name matches this glob")
+    list_parser.set_defaults(func=cmd_list)
+
+    pool = commands.add_parser('pool', help="Warm pool of ready stacks (serve, claim, status, release, drain)",
+                               add_help=False)
+    pool.set_defaults(func=cmd_pool, passthrough=True)
+
+    daemon = commands.add_parser('daemon', help="Serve subscription/database/task state from one shared poll loop",
+                                 add_help=False)
+    daemon.set_defaults(func=cmd_daemon, passthrough=True)
+
+    queue = commands.add_parser('queue', help="Durable job queue worked off by worker processes "
+                                              "(provision, teardown, worker, status, retry)", add_help=False)
+    queue.set_defaults(func=cmd_queue, passthrough=True)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    # `pool`, `daemon` and `queue` hand everything after them to their module's own parser
+    args, rest = parser.parse_known_args(argv)
+    if rest and not getattr(args, 'passthrough', False):
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+    args.rest = rest
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
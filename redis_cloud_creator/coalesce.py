@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, wait
+
+from . import credentials
+
+# Request coalescing in front of api_client. Identical GETs in flight at the same
+# time (same key, same URL) share one response: concurrent waiters on one
+# subscription, or a step reading a database another step is polling. A mutating
+# call starts a new generation, so a GET issued after it never joins one that may
+# have been answered before it.
+#
+# PUTs to the same resource within REDIS_CLOUD_PUT_MERGE_WINDOW of each other go out
+# as one merged body when their fields don't conflict, costing one task (and one
+# subscription wait) instead of one each; a conflicting PUT waits for the pending
+# one and goes out after it, so the later value still wins.
+
+COALESCE_GETS = os.getenv('REDIS_CLOUD_COALESCE_GETS', '1') == '1'
+PUT_MERGE_WINDOW = float(os.getenv('REDIS_CLOUD_PUT_MERGE_WINDOW', '0.05'))
+
+
+class SingleFlight:
+    def __init__(self):
+        self.shared = 0
+        self.generation = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+
+    def do(self, key, func):
+        with self._lock:
+            key = (self.generation, key)
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class PutMerger:
+    def __init__(self, window=PUT_MERGE_WINDOW, sleep=time.sleep):
+        self.window = window
+        self.merged = 0
+        self._sleep = sleep
+        # key -> {"body", "future", "sealed"}; a sealed batch is on the wire and takes no more fields
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def put(self, key, body, send):
+        # send(merged_body) makes the call; everyone merged into it gets its response
+        while True:
+            with self._lock:
+                batch = self._pending.get(key)
+                if batch is None:
+                    batch = self._pending[key] = {"body": dict(body), "future": Future(), "sealed": False}
+                    break
+                merge = not batch["sealed"] and all(batch["body"].get(field, value) == value
+                                                    for field, value in body.items())
+                if merge:
+                    batch["body"].update(body)
+                    self.merged += 1
+            if merge:
+                return batch["future"].result()
+            wait([batch["future"]])
+
+        if self.window:
+            self._sleep(self.window)
+        with self._lock:
+            batch["sealed"] = True
+        try:
+            response = send(batch["body"])
+        except BaseException as e:
+            batch["future"].set_exception(e)
+            raise
+        else:
+            batch["future"].set_result(response)
+            return response
+        finally:
+            with self._lock:
+                del self._pending[key]
+
+
+_single_flight = SingleFlight()
+_put_merger = PutMerger()
+
+
+def get_single_flight():
+    return _single_flight
+
+
+def get_put_merger():
+    return _put_merger
+
+
+def get(url, fetch):
+    # fetch() is the actual GET; sharing is per API key, since keys see different accounts
+    if not COALESCE_GETS:
+        return fetch()
+    return _single_flight.do((credentials.current().name, url), fetch)
+
+
+def put(url, body, send):
+    # send(url, json=...) is api_client.put
+    return _put_merger.put((credentials.current().name, url), body, lambda merged: send(url, json=merged))
+
+
+def report():
+    return {"shared_gets": _single_flight.shared, "merged_puts": _put_merger.merged}
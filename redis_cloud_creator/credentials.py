@@ -0,0 +1,174 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+
+from . import events, rate_limiter
+
+# API credentials and the key-aware scheduling of stacks across them. Each key
+# has its own session headers, token bucket (the API's quota is per key) and
+# health. A stack is assigned a key when it starts and every call made for it,
+# from any thread, goes out with that key: the choice travels in a context
+# variable, which Dag, provision_engine and the task tracker carry across threads.
+#
+# REDIS_CLOUD_CREDENTIALS names a JSON file with a list of credentials:
+#   [{"name": "ci-1", "api_key_env": "CI1_KEY", "secret_key_env": "CI1_SECRET"},
+#    {"name": "ci-2", "api_key": "...", "secret_key": "...", "rate_limit": 6.5}]
+# Without it, REDIS_CLOUD_API_KEY / REDIS_CLOUD_API_SECRET_KEY form the only one.
+# REDIS_CLOUD_CREDENTIAL picks the one used outside any assignment (main.py, reconcile.py).
+
+CREDENTIALS_PATH = os.getenv('REDIS_CLOUD_CREDENTIALS')
+DEFAULT_CREDENTIAL = os.getenv('REDIS_CLOUD_CREDENTIAL')
+# Consecutive 5xx/connection failures before a key is rested, and for how long
+FAILURE_THRESHOLD = 3
+COOLDOWN = float(os.getenv('REDIS_CLOUD_CREDENTIAL_COOLDOWN', '30'))
+
+
+class Credential:
+    def __init__(self, name, api_key, secret_key, rate_limit=None, clock=time.monotonic):
+        self.name = name
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.limiter = rate_limiter.RateLimiter(rate=rate_limiter.RATE_LIMIT if rate_limit is None else rate_limit)
+        self.session = None
+        self.requests = 0
+        self.errors = 0
+        self.failures = 0
+        self.disabled = None
+        self.cooldown_until = 0
+        self.assigned = 0
+        self.active = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def healthy(self):
+        return self.disabled is None and self._clock() >= self.cooldown_until
+
+    def observe(self, response=None, error=None):
+        # Health bookkeeping for every call made with this key
+        with self._lock:
+            self.requests += 1
+            status = response.status_code if response is not None else None
+            if status in (401, 403):
+                # The key itself is bad (revoked, wrong secret): no new stacks go to it
+                self.disabled = f"HTTP {status}"
+                self.errors += 1
+            elif error is not None or (status is not None and status >= 500):
+                self.errors += 1
+                self.failures += 1
+                if self.failures >= FAILURE_THRESHOLD:
+                    self.cooldown_until = self._clock() + COOLDOWN
+                    self.failures = 0
+            else:
+                self.failures = 0
+
+    def report(self):
+        return {"name": self.name, "requests": self.requests, "throttled": self.limiter.throttled,
+                "errors": self.errors, "stacks": self.assigned, "healthy": self.healthy(), "disabled": self.disabled}
+
+
+def load(path=CREDENTIALS_PATH, environ=os.environ):
+    if not path:
+        from . import api_client
+        return [Credential('default', api_client.API_KEY, api_client.API_SECRET_KEY)]
+    with open(path) as f:
+        entries = json.load(f)
+    credentials = []
+    for i, entry in enumerate(entries):
+        api_key = environ.get(entry['api_key_env']) if 'api_key_env' in entry else entry.get('api_key')
+        secret_key = environ.get(entry['secret_key_env']) if 'secret_key_env' in entry else entry.get('secret_key')
+        if not api_key or not secret_key:
+            raise ValueError(f"{path}: credential {entry.get('name', i)!r} has no API key or secret")
+        credentials.append(Credential(entry.get('name', f"key-{i}"), api_key, secret_key, entry.get('rate_limit')))
+    if not credentials:
+        raise ValueError(f"{path}: no credentials")
+    return credentials
+
+
+_credentials = None
+_credentials_lock = threading.Lock()
+_current = contextvars.ContextVar('credential', default=None)
+
+
+def all_credentials():
+    global _credentials
+    with _credentials_lock:
+        if _credentials is None:
+            _credentials = load()
+        return _credentials
+
+
+def get(name=None):
+    # The named credential, or the default one
+    credentials = all_credentials()
+    name = name or DEFAULT_CREDENTIAL
+    if name is None:
+        return credentials[0]
+    for credential in credentials:
+        if credential.name == name:
+            return credential
+    raise KeyError(f"Unknown credential {name!r}")
+
+
+def current():
+    return _current.get() or get()
+
+
+@contextlib.contextmanager
+def use(credential):
+    # Every API call in this context (and in threads it hands work to) uses credential
+    token = _current.set(credential if isinstance(credential, Credential) or credential is None else get(credential))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def run_in_context(executor, func, *args):
+    # executor.submit() that carries the current credential (and any other context) into the worker
+    return executor.submit(contextvars.copy_context().run, func, *args)
+
+
+class Scheduler:
+    # Spreads stacks over the healthy keys in proportion to their quota
+    def __init__(self, credentials=None):
+        self.credentials = credentials or all_credentials()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            healthy = [credential for credential in self.credentials if credential.healthy()]
+            if not healthy:
+                resting = [credential for credential in self.credentials if credential.disabled is None]
+                if not resting:
+                    raise Exception("Every API credential has been disabled")
+                # All keys are cooling down: take the one back soonest
+                healthy = [min(resting, key=lambda credential: credential.cooldown_until)]
+            credential = min(healthy, key=lambda credential: (
+                (credential.active + 1) / max(credential.limiter.rate or 1, 0.001), credential.assigned))
+            credential.active += 1
+            credential.assigned += 1
+            return credential
+
+    def release(self, credential):
+        with self._lock:
+            credential.active -= 1
+
+
+def report():
+    return [credential.report() for credential in all_credentials()]
+
+
+def print_report():
+    # Per-key usage, once there is more than one key to compare
+    if len(all_credentials()) < 2:
+        return
+    usage = report()
+    lines = ["API credentials:"] + [
+        f"  {entry['name']}: {entry['stacks']} stacks, {entry['requests']} requests, {entry['throttled']} throttled, "
+        f"{entry['errors']} errors" + (f", disabled ({entry['disabled']})" if entry['disabled'] else "")
+        for entry in usage
+    ]
+    events.emit("credentials", "\n".join(lines), credentials=usage)
@@ -0,0 +1,116 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from . import credentials, events, metrics
+
+# Runs named steps as soon as the steps they depend on have finished.
+# Each step function receives a dict with the results of every finished step.
+# With a journal, finished steps are recorded and skipped when a run is resumed.
+# Step transitions go to the event stream tagged with the DAG's name (its stack).
+
+
+class Dag:
+    def __init__(self, max_workers=4, journal=None, name=None):
+        self.max_workers = max_workers
+        self.journal = journal
+        self.name = name
+        self.steps = {}
+        self.results = {}
+        self.timings = {}
+        self.errors = {}
+        self.skipped = []
+        self._lock = threading.Lock()
+
+    def add(self, name, func, deps=()):
+        if name in self.steps:
+            raise ValueError(f"Step {name} is already defined")
+        for dep in deps:
+            if dep not in self.steps:
+                raise ValueError(f"Step {name} depends on unknown step {dep}")
+        self.steps[name] = {"func": func, "deps": list(deps)}
+
+    def _run_step(self, name):
+        started = time.monotonic()
+        try:
+            if self.journal is not None and self.journal.is_completed(name):
+                events.emit("step_resumed", stack=self.name, step=name)
+                return self.journal.result(name)
+            events.emit("step_started", stack=self.name, step=name)
+            with self._lock:
+                results = dict(self.results)
+            try:
+                result = self.steps[name]["func"](results)
+            except Exception as e:
+                events.emit("step_failed", stack=self.name, step=name, error=str(e),
+                            duration=round(time.monotonic() - started, 3))
+                raise
+            if self.journal is not None:
+                self.journal.complete(name, result)
+            events.emit("step_finished", stack=self.name, step=name, duration=round(time.monotonic() - started, 3))
+            return result
+        finally:
+            self.timings[name] = (started, time.monotonic())
+            metrics.record_step(name, self.timings[name][1] - started)
+
+    def run(self):
+        self.started = time.monotonic()
+        remaining = dict(self.steps)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while remaining or running:
+                for name in list(remaining):
+                    deps = remaining[name]["deps"]
+                    if any(dep in self.errors or dep in self.skipped for dep in deps):
+                        # Something upstream failed: this step can never run
+                        del remaining[name]
+                        self.skipped.append(name)
+                        events.emit("step_skipped", stack=self.name, step=name)
+                    elif all(dep in self.results for dep in deps):
+                        del remaining[name]
+                        # Steps keep the caller's credential (credentials.py) on the worker threads
+                        running[credentials.run_in_context(executor, self._run_step, name)] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        result = future.result()
+                        with self._lock:
+                            self.results[name] = result
+                    except Exception as e:
+                        self.errors[name] = e
+        self.finished = time.monotonic()
+        if self.errors:
+            raise next(iter(self.errors.values()))
+        return self.results
+
+    def critical_path(self):
+        # Walk back from the last step to finish, always through the dependency
+        # that finished last: that chain is what bounded the total run time.
+        if not self.timings:
+            return []
+        name = max(self.timings, key=lambda step: self.timings[step][1])
+        path = [name]
+        while True:
+            deps = [dep for dep in self.steps[name]["deps"] if dep in self.timings]
+            if not deps:
+                break
+            name = max(deps, key=lambda dep: self.timings[dep][1])
+            path.append(name)
+        return list(reversed(path))
+
+    def print_report(self):
+        lines = [f"Critical path ({self.finished - self.started:.2f}s total):"]
+        path = []
+        for name in self.critical_path():
+            started, finished = self.timings[name]
+            lines.append(f"  {name:<28} start +{started - self.started:7.2f}s  took {finished - started:7.2f}s")
+            path.append({"step": name, "start": round(started - self.started, 3), "took": round(finished - started, 3)})
+        for name, error in self.errors.items():
+            lines.append(f"  {name:<28} failed: {error}")
+        for name in self.skipped:
+            lines.append(f"  {name:<28} skipped")
+        events.emit("critical_path", "\n".join(lines), stack=self.name,
+                    total=round(self.finished - self.started, 3), path=path)
@@ -0,0 +1,487 @@
+import argparse
+import fnmatch
+import functools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from . import (acl_index, api_client, credentials, dag, events, metrics, polling, resource_wait, state_cache,
+               task_tracker)
+
+API_URL_FIXED_SUBSCRIPTIONS = f'{api_client.API_BASE_URL}/fixed/subscriptions'
+API_URL_ACL_ROLES = f'{api_client.API_BASE_URL}/acl/roles'
+API_URL_ACL_USERS = f'{api_client.API_BASE_URL}/acl/users'
+
+# Get input variables from the environment or default values
+subscription_id = os.getenv('SUBSCRIPTION_ID', '2361978')
+database_id = os.getenv('DATABASE_ID', '12391054')
+user_name = os.getenv('USER_NAME', 'bart-via-api')
+role_name = os.getenv('ROLE_NAME', 'bart-via-api')
+
+# Number of stacks torn down at the same time in bulk mode
+DEFAULT_CONCURRENCY = 8
+
+
+def delete_user(user_id):
+    url = f"{API_URL_ACL_USERS}/{user_id}"
+
+    events.emit("delete_requested", f"Attempting to delete user with ID: {user_id}", resource_id=user_id,
+                kind='user')
+    response = api_client.delete(url)
+    if response.status_code == 202:
+        events.emit("delete_accepted", f"User with ID {user_id} deleted successfully", resource_id=user_id,
+                    kind='user')
+        acl_index.users().remove_id(user_id)
+        response_json = response.json()
+        state_cache.get_cache().hold(response_json['links'][0]['href'])
+        return response_json
+    else:
+        events.api_error("Failed to delete user", response)
+        response.raise_for_status()
+
+
+def delete_role(role_id):
+    url = f"{API_URL_ACL_ROLES}/{role_id}"
+
+    events.emit("delete_requested", f"Attempting to delete role with ID: {role_id}", resource_id=role_id,
+                kind='role')
+    response = api_client.delete(url)
+    if response.status_code == 202:
+        events.emit("delete_accepted", f"Role with ID {role_id} deleted successfully", resource_id=role_id,
+                    kind='role')
+        acl_index.roles().remove_id(role_id)
+        response_json = response.json()
+        state_cache.get_cache().hold(response_json['links'][0]['href'])
+        return response_json
+    else:
+        events.api_error("Failed to delete role", response)
+        if response.status_code == 405:
+            events.log("405 Method Not Allowed: The HTTP method used is not supported for this URL.")
+        response.raise_for_status()
+
+
+def delete_database(subscription_id, database_id):
+    url = f"{API_URL_FIXED_SUBSCRIPTIONS}/{subscription_id}/databases/{database_id}"
+
+    events.emit("delete_requested", f"Attempting to delete database with ID: {database_id}",
+                stack=subscription_id, resource_id=database_id, kind='database')
+    state_cache.get_cache().invalidate_subscription(subscription_id)
+    response = api_client.delete(url)
+    if response.status_code == 202:
+        events.emit("delete_accepted", f"Database with ID {database_id} deleted successfully",
+                    stack=subscription_id, resource_id=database_id, kind='database')
+        return response.json()
+    else:
+        events.api_error("Failed to delete database", response)
+        response.raise_for_status()
+
+
+def delete_subscription(subscription_id):
+    url = f"{API_URL_FIXED_SUBSCRIPTIONS}/{subscription_id}"
+
+    events.emit("delete_requested", f"Attempting to delete subscription with ID: {subscription_id}",
+                stack=subscription_id, resource_id=subscription_id, kind='subscription')
+    state_cache.get_cache().invalidate_subscription(subscription_id)
+    response = api_client.delete(url)
+    if response.status_code == 202:
+        events.emit("delete_accepted", f"Subscription with ID {subscription_id} deleted successfully",
+                    stack=subscription_id, resource_id=subscription_id, kind='subscription')
+        return response.json()
+    else:
+        events.api_error("Failed to delete subscription", response)
+        response.raise_for_status()
+
+
+def check_task_status(task_url):
+    return task_tracker.wait_for_task(task_url)
+
+
+def wait_for_subscription_active(subscription_id):
+    # A subscription that is already gone has nothing left to wait for (a rerun of an interrupted teardown)
+    try:
+        return wait_for_subscription(subscription_id)
+    except Exception as e:
+        if api_client.error_status(e) != 404:
+            raise
+        events.log(f"Subscription with ID {subscription_id} is already gone", stack=subscription_id,
+                   resource_id=subscription_id)
+        return None
+
+
+def wait_for_subscription(subscription_id):
+    return resource_wait.wait_for_subscription_active(subscription_id, stack=subscription_id)
+
+
+def get_user_id_by_name(user_name):
+    # None when there is no such user: an earlier, interrupted teardown already deleted it
+    user = acl_index.users().get(user_name)
+    return None if user is None else user['id']
+
+
+def get_role_id_by_name(role_name):
+    # None when there is no such role (see get_user_id_by_name)
+    role = acl_index.roles().get(role_name)
+    return None if role is None else role['id']
+
+
+def wait_for_role_users_empty(role_name):
+    events.log(f"Checking if role {role_name} still has users...")
+    roles = acl_index.roles()
+
+    poller = polling.Poller('role-users')
+    poller.start()
+    while True:
+        # Revalidates the roles list; an unchanged list comes back as a 304
+        response = roles.refresh()
+        if response.status_code in (200, 304):
+            role = roles.peek(role_name)
+            if role:
+                users = role.get('users', [])
+                if not users:
+                    events.emit("role_users_empty", f"No users found in role {role_name}.", resource_id=role['id'])
+                    poller.done()
+                    return
+                else:
+                    events.emit("role_users_pending",
+                                f"Role {role_name} still has users: {users}. Waiting for users to be removed...",
+                                resource_id=role['id'], users=users)
+                    poller.sleep(response)
+            else:
+                events.log(f"Role {role_name} is already gone")
+                poller.done()
+                return
+        elif response.status_code == 429:
+            poller.sleep(response)
+        else:
+            response.raise_for_status()
+
+
+def list_subscriptions():
+    response = api_client.get(API_URL_FIXED_SUBSCRIPTIONS)
+    if response.status_code == 200:
+        return response.json().get('subscriptions', [])
+    else:
+        events.api_error("Failed to list subscriptions", response)
+        response.raise_for_status()
+
+
+def list_databases(subscription_id):
+    url = f"{API_URL_FIXED_SUBSCRIPTIONS}/{subscription_id}/databases"
+
+    response = api_client.get(url)
+    if response.status_code == 200:
+        return response.json().get('subscription', {}).get('databases', [])
+    else:
+        events.api_error("Failed to list databases", response)
+        response.raise_for_status()
+
+
+def default_stack():
+    return {
+        "subscription_id": subscription_id,
+        "database_ids": [database_id],
+        "users": [user_name],
+        "roles": [role_name]
+    }
+
+
+def load_manifest(path):
+    # A JSON list of stacks; database_id/user_name/role_name are accepted as single-value shorthands
+    with open(path) as f:
+        entries = json.load(f)
+    stacks = []
+    for entry in entries:
+        stacks.append({
+            "subscription_id": entry["subscription_id"],
+            "database_ids": entry.get("database_ids", [entry["database_id"]] if "database_id" in entry else []),
+            "users": entry.get("users", [entry["user_name"]] if "user_name" in entry else []),
+            "roles": entry.get("roles", [entry["role_name"]] if "role_name" in entry else []),
+            # The key that created the stack (provision_engine.py's result); the default one if absent
+            "credential": entry.get("credential")
+        })
+    return stacks
+
+
+def discover_stacks(name_pattern):
+    # Every subscription whose name matches the glob, under every configured key,
+    # with its databases and the ACL roles (and their users) that grant access to them
+    stacks = {}
+    for credential in credentials.all_credentials():
+        with credentials.use(credential):
+            for stack in discover_account_stacks(name_pattern):
+                # Several keys of one account all see its subscriptions; the first one deletes them
+                stacks.setdefault(stack["subscription_id"], dict(stack, credential=credential.name))
+    return list(stacks.values())
+
+
+def role_subscription_ids(role):
+    return {str(database.get('subscriptionId'))
+            for rule in role.get('redisRules', []) for database in rule.get('databases', [])}
+
+
+def discover_account_stacks(name_pattern):
+    roles = acl_index.roles().entries()
+    users = acl_index.users().entries()
+    matched = [subscription['id'] for subscription in list_subscriptions()
+               if fnmatch.fnmatchcase(subscription.get('name', ''), name_pattern)]
+    matched_ids = {str(sid) for sid in matched}
+    # Only roles that grant nothing outside the matched subscriptions go, each with the first
+    # stack it covers, so stacks torn down side by side never both delete one
+    owners = {}
+    for role in roles:
+        subscription_ids = role_subscription_ids(role)
+        if not subscription_ids & matched_ids:
+            continue
+        if subscription_ids <= matched_ids:
+            owner = next(sid for sid in matched if str(sid) in subscription_ids)
+            owners.setdefault(owner, []).append(role['name'])
+        else:
+            events.log(f"Role {role['name']} also grants access outside the matching subscriptions; left in place",
+                       name=role['name'])
+    stacks = []
+    for sid in matched:
+        stack_roles = owners.get(sid, [])
+        stacks.append({
+            "subscription_id": sid,
+            "database_ids": [database['databaseId'] for database in list_databases(sid)],
+            "users": [user['name'] for user in users if user.get('role') in stack_roles],
+            "roles": stack_roles
+        })
+    return stacks
+
+
+def task_started(stack, step, description, task_url):
+    events.emit("task_started", f"{description} task started. Task URL: {task_url}", stack=stack["subscription_id"],
+                step=step, resource_id=task_tracker.task_id_from_url(task_url), task_url=task_url)
+
+
+def task_completed(stack, step, description, task_status):
+    events.emit("task_completed", f"{description} task completed successfully.", stack=stack["subscription_id"],
+                step=step, resource_id=task_status.get('response', {}).get('resourceId'), task=task_status)
+
+
+def step_user_ids(stack, results):
+    # Get user IDs by name
+    user_ids = []
+    for name in stack["users"]:
+        user_id = get_user_id_by_name(name)
+        if user_id is None:
+            events.log(f"User with name {name} not found; already deleted", stack=stack["subscription_id"],
+                       step='user_ids', name=name)
+            continue
+        events.emit("resolved", f"User ID for {name} is {user_id}", stack=stack["subscription_id"],
+                    step='user_ids', resource_id=user_id, name=name)
+        user_ids.append(user_id)
+    return user_ids
+
+
+def step_role_ids(stack, results):
+    # Get role IDs by name
+    role_ids = []
+    for name in stack["roles"]:
+        role_id = get_role_id_by_name(name)
+        if role_id is None:
+            events.log(f"Role with name {name} not found; already deleted", stack=stack["subscription_id"],
+                       step='role_ids', name=name)
+            continue
+        events.emit("resolved", f"Role ID for {name} is {role_id}", stack=stack["subscription_id"],
+                    step='role_ids', resource_id=role_id, name=name)
+        role_ids.append(role_id)
+    return role_ids
+
+
+def step_delete_users(stack, results):
+    for user_id in results['user_ids']:
+        # Deleting user
+        try:
+            user_response = delete_user(user_id)
+        except Exception as e:
+            if api_client.error_status(e) != 404:
+                raise
+            acl_index.users().remove_id(user_id)
+            events.log(f"User with ID {user_id} is already gone", stack=stack["subscription_id"],
+                       step='delete_users', resource_id=user_id)
+            continue
+        task_url = user_response['links'][0]['href']
+        task_started(stack, 'delete_users', "User deletion", task_url)
+
+        # Checking user deletion task status
+        task_status = check_task_status(task_url)
+        task_completed(stack, 'delete_users', "User deletion", task_status)
+
+    # Wait for role users to be empty
+    for name in stack["roles"]:
+        wait_for_role_users_empty(name)
+
+    # Wait for subscription to become active
+    wait_for_subscription_active(stack["subscription_id"])
+
+
+def step_delete_roles(stack, results):
+    for role_id in results['role_ids']:
+        # Deleting role
+        try:
+            role_response = delete_role(role_id)
+        except Exception as e:
+            if api_client.error_status(e) != 404:
+                raise
+            acl_index.roles().remove_id(role_id)
+            events.log(f"Role with ID {role_id} is already gone", stack=stack["subscription_id"],
+                       step='delete_roles', resource_id=role_id)
+            continue
+        task_url = role_response['links'][0]['href']
+        task_started(stack, 'delete_roles', "Role deletion", task_url)
+
+        # Checking role deletion task status
+        task_status = check_task_status(task_url)
+        task_completed(stack, 'delete_roles', "Role deletion", task_status)
+
+    # Wait for subscription to become active
+    wait_for_subscription_active(stack["subscription_id"])
+
+
+def step_database_ids(stack, results):
+    # The subscription can only go once every database under it is gone, named in the stack or not
+    try:
+        databases = list_databases(stack["subscription_id"])
+    except Exception as e:
+        if api_client.error_status(e) != 404:
+            raise
+        # The subscription, and with it every database, is already gone
+        return []
+    database_ids = [str(database['databaseId']) for database in databases]
+    named = [str(database_id) for database_id in stack["database_ids"]]
+    return database_ids + [database_id for database_id in named if database_id not in database_ids]
+
+
+def step_delete_databases(stack, results):
+    subscription_id = stack["subscription_id"]
+
+    # Deleting databases: all deletions are submitted back-to-back and their tasks tracked together
+    def submit(database_id):
+        try:
+            database_response = delete_database(subscription_id, database_id)
+        except Exception as e:
+            if api_client.error_status(e) != 404:
+                raise
+            events.log(f"Database with ID {database_id} is already gone", stack=subscription_id,
+                       step='delete_databases', resource_id=database_id)
+            return None
+        task_url = database_response['links'][0]['href']
+        task_started(stack, 'delete_databases', f"Database {database_id} deletion", task_url)
+        return task_url
+
+    def settle(task_urls):
+        # Checking database deletion task status
+        for database_id, task_url in task_urls.items():
+            task_status = check_task_status(task_url)
+            task_completed(stack, 'delete_databases', f"Database {database_id} deletion", task_status)
+
+        # Wait for subscription to become active, once per batch
+        wait_for_subscription_active(subscription_id)
+
+    task_tracker.submit_batches(results['database_ids'], submit, settle)
+
+
+def step_delete_subscription(stack, results):
+    # Deleting subscription
+    try:
+        subscription_response = delete_subscription(stack["subscription_id"])
+    except Exception as e:
+        if api_client.error_status(e) != 404:
+            raise
+        events.log(f"Subscription with ID {stack['subscription_id']} is already gone", stack=stack["subscription_id"],
+                   step='delete_subscription', resource_id=stack["subscription_id"])
+        return
+    task_url = subscription_response['links'][0]['href']
+    task_started(stack, 'delete_subscription', "Subscription deletion", task_url)
+
+    # Checking subscription deletion task status
+    task_status = check_task_status(task_url)
+    task_completed(stack, 'delete_subscription', "Subscription deletion", task_status)
+
+
+def build_teardown_dag(stack):
+    # The lookups are independent; deletions keep the user -> role -> database -> subscription order
+    steps = [
+        ('user_ids', step_user_ids, []),
+        ('role_ids', step_role_ids, []),
+        ('database_ids', step_database_ids, []),
+        ('delete_users', step_delete_users, ['user_ids']),
+        ('delete_roles', step_delete_roles, ['role_ids', 'delete_users']),
+        ('delete_databases', step_delete_databases, ['database_ids', 'delete_roles']),
+        ('delete_subscription', step_delete_subscription, ['delete_databases']),
+    ]
+    teardown = dag.Dag(name=stack["subscription_id"])
+    for name, func, deps in steps:
+        teardown.add(name, functools.partial(func, stack), deps=deps)
+    return teardown
+
+
+def teardown_stack(stack):
+    teardown = build_teardown_dag(stack)
+    try:
+        # Deleted with the key that created it: other keys may not even see it
+        with credentials.use(stack.get("credential")):
+            teardown.run()
+        return {"subscription_id": stack["subscription_id"], "status": "ok",
+                "elapsed": round(teardown.finished - teardown.started, 3)}
+    except Exception as e:
+        return {"subscription_id": stack["subscription_id"], "status": "failed", "error": str(e),
+                "failed_step": next(iter(teardown.errors), None), "skipped": teardown.skipped}
+
+
+def teardown_many(stacks, concurrency=DEFAULT_CONCURRENCY):
+    # Stacks are independent, so they fan out; each one still tears down in order
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(teardown_stack, stacks))
+
+
+def print_summary(results):
+    succeeded = [result for result in results if result["status"] == "ok"]
+    failed = [result for result in results if result["status"] != "ok"]
+    lines = [f"Teardown summary: {len(succeeded)} succeeded, {len(failed)} failed"]
+    for result in failed:
+        lines.append(f"  subscription {result['subscription_id']} failed at {result['failed_step']}: {result['error']}")
+    lines.append(json.dumps(results, indent=4))
+    events.emit("result", "\n".join(lines), succeeded=len(succeeded), failed=len(failed), results=results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tear down Redis Cloud Essentials stacks")
+    parser.add_argument('--manifest', help="JSON file with a list of stacks to delete")
+    parser.add_argument('--name', help="Delete every subscription whose name matches this glob")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    if args.manifest or args.name:
+        try:
+            stacks = load_manifest(args.manifest) if args.manifest else discover_stacks(args.name)
+        except Exception as e:
+            events.emit("error", f"Error: {e}", error=str(e))
+            events.flush()
+            return
+        events.log(f"Tearing down {len(stacks)} stacks with concurrency {args.concurrency}")
+        print_summary(teardown_many(stacks, args.concurrency))
+        metrics.finish()
+        credentials.print_report()
+        events.flush()
+        return
+
+    teardown = build_teardown_dag(default_stack())
+    try:
+        teardown.run()
+        teardown.print_report()
+        events.log(f"State cache avoided {state_cache.get_cache().avoided_gets} GETs")
+        metrics.finish()
+
+    except Exception as e:
+        teardown.print_report()
+        metrics.finish()
+        events.emit("error", f"Error: {e}", stack=subscription_id, error=str(e),
+                    failed_step=next(iter(teardown.errors), None))
+    events.flush()
+
+
+if __name__ == '__main__':
+    main()
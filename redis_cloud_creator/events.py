@@ -0,0 +1,163 @@
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+# Structured progress stream. Every state transition is one event: a dict with the
+# event type, the stack, step and resource it belongs to, and seconds since start.
+# emit() only enqueues; a single writer thread fans events out to the sinks, so
+# worker threads and the event loop never block on stdout or disk.
+#
+# REDIS_CLOUD_EVENTS=text (default) prints each event's human-readable message, as
+# the scripts always have; REDIS_CLOUD_EVENTS=json prints one JSON line per event.
+# REDIS_CLOUD_EVENTS_FILE additionally appends JSON lines to that file.
+
+EVENTS_FORMAT = os.getenv('REDIS_CLOUD_EVENTS', 'text')
+EVENTS_FILE = os.getenv('REDIS_CLOUD_EVENTS_FILE')
+
+_started = time.monotonic()
+
+
+class TextSink:
+    # Prints the message of events that carry one; everything else is JSON-only detail
+    def write(self, event):
+        if event.get("message") is not None:
+            print(event["message"], file=sys.stdout)
+
+    def close(self):
+        sys.stdout.flush()
+
+
+class JsonSink:
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, event):
+        (self.stream or sys.stdout).write(json.dumps(event, default=str) + "\n")
+
+    def close(self):
+        (self.stream or sys.stdout).flush()
+
+
+class FileSink:
+    def __init__(self, path):
+        self.file = open(path, 'a')
+
+    def write(self, event):
+        self.file.write(json.dumps(event, default=str) + "\n")
+
+    def close(self):
+        self.file.flush()
+
+
+class CallbackSink:
+    # callback(event) runs on the writer thread
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write(self, event):
+        self.callback(event)
+
+    def close(self):
+        pass
+
+
+class EventStream:
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks or [])
+        self.dropped = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add_sink(self, sink):
+        with self._lock:
+            self.sinks.append(sink)
+        return sink
+
+    def remove_sink(self, sink):
+        self.flush()
+        with self._lock:
+            self.sinks.remove(sink)
+        sink.close()
+
+    def emit(self, event, message=None, stack=None, step=None, resource_id=None, **fields):
+        record = {"event": event, "ts": round(time.time(), 3), "elapsed": round(time.monotonic() - _started, 3)}
+        for key, value in (("stack", stack), ("step", step), ("resource_id", resource_id)):
+            if value is not None:
+                record[key] = value
+        record.update(fields)
+        if message is not None:
+            record["message"] = message
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='event-writer', daemon=True)
+                    self._thread.start()
+        self._queue.put(record)
+
+    def flush(self):
+        # Blocks until every event emitted so far has reached the sinks
+        if self._thread is not None:
+            self._queue.join()
+            with self._lock:
+                sinks = list(self.sinks)
+            for sink in sinks:
+                sink.close()
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            with self._lock:
+                sinks = list(self.sinks)
+            for sink in sinks:
+                try:
+                    sink.write(record)
+                except Exception:
+                    # A broken sink must not take the others (or the run) down with it
+                    self.dropped += 1
+            self._queue.task_done()
+
+
+def default_sinks():
+    sinks = [JsonSink() if EVENTS_FORMAT == 'json' else TextSink()]
+    if EVENTS_FILE:
+        sinks.append(FileSink(EVENTS_FILE))
+    return sinks
+
+
+_stream = EventStream(default_sinks())
+atexit.register(_stream.flush)
+
+
+def get_stream():
+    return _stream
+
+
+def emit(event, message=None, **fields):
+    _stream.emit(event, message, **fields)
+
+
+def log(message, **fields):
+    _stream.emit("log", message, **fields)
+
+
+def api_error(description, response, **fields):
+    # An unexpected API response, reported just before the caller raises for it
+    _stream.emit("api_error", f"{description}. Status Code: {response.status_code}, Response: {response.content}",
+                 status_code=response.status_code, url=response.url, **fields)
+
+
+def flush():
+    _stream.flush()
+
+
+def add_sink(sink):
+    return _stream.add_sink(sink)
+
+
+def remove_sink(sink):
+    _stream.remove_sink(sink)
@@ -0,0 +1,87 @@
+import json
+import os
+import threading
+
+from . import events, task_tracker
+
+# Durable record of a provisioning run. Every finished step stores its outputs and
+# every accepted POST/PUT stores its task URL before we start waiting on it, so a
+# restarted run skips finished steps and re-attaches to in-flight tasks instead of
+# creating the resource again. With path=None the journal only lives in memory.
+
+JOURNAL_PATH = os.getenv('REDIS_CLOUD_JOURNAL', '.redis-cloud-journal.json')
+
+
+class Journal:
+    def __init__(self, path=JOURNAL_PATH, spec=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = {"spec": spec, "steps": {}}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            if spec is not None and data.get("spec") != spec:
+                raise Exception(f"Journal {path} belongs to a different spec: {data.get('spec')}. "
+                                f"Remove it to start a new run.")
+            self.data = data
+            events.log(f"Resuming from journal {path}")
+
+    def _step(self, step):
+        return self.data["steps"].setdefault(step, {})
+
+    def _save(self):
+        if not self.path:
+            return
+        # Write-then-rename so a crash never leaves a truncated journal behind
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def is_completed(self, step):
+        with self._lock:
+            return "result" in self.data["steps"].get(step, {})
+
+    def result(self, step):
+        with self._lock:
+            return self.data["steps"][step]["result"]
+
+    def complete(self, step, result):
+        with self._lock:
+            self._step(step)["result"] = result
+            self._save()
+
+    def start_task(self, step, submit, task_name='task'):
+        # submit() issues the mutating call; it is skipped if a task is already on record
+        with self._lock:
+            task_url = self.data["steps"].get(step, {}).get("tasks", {}).get(task_name)
+        if task_url:
+            events.emit("task_reattached", f"Re-attaching to in-flight {step} {task_name}. Task URL: {task_url}",
+                        step=step, resource_id=task_tracker.task_id_from_url(task_url), task_url=task_url)
+            return task_url
+        response = submit()
+        task_url = response['links'][0]['href']
+        with self._lock:
+            self._step(step).setdefault("tasks", {})[task_name] = task_url
+            self._save()
+        return task_url
+
+    def wait_task(self, step, task_url, task_name='task'):
+        try:
+            return task_tracker.wait_for_task(task_url)
+        except task_tracker.TaskFailed:
+            # The API rejected it: the next run has to submit it again
+            self.forget_task(step, task_name)
+            raise
+
+    def forget_task(self, step, task_name='task'):
+        with self._lock:
+            self._step(step).get("tasks", {}).pop(task_name, None)
+            self._save()
+
+    def remove(self):
+        with self._lock:
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,517 @@
+import json
+import os
+
+from . import (acl_index, api_client, coalesce, dag, events, journal, metadata_cache, metrics, resource_wait, spec,
+               state_cache, task_tracker, verify)
+
+API_URL_PAYMENT_METHODS = f'{api_client.API_BASE_URL}/payment-methods'
+API_URL_FIXED_SUBSCRIPTIONS = f'{api_client.API_BASE_URL}/fixed/subscriptions'
+API_URL_FIXED_PLANS = f'{api_client.API_BASE_URL}/fixed/plans'
+API_URL_ACL_ROLES = f'{api_client.API_BASE_URL}/acl/roles'
+API_URL_ACL_USERS = f'{api_client.API_BASE_URL}/acl/users'
+
+# The stack provisioned when no spec file is given (REDIS_CLOUD_SPEC, see spec.py)
+PAYMENT_METHOD_ID = 25346
+PLAN_ID = 21113
+SUBSCRIPTION_NAME = "Essentials - Gabs CF"
+DATABASE_NAME = "gabs-fixed-database-example"
+ROLE_NAME = "bart-via-api"
+USER_NAME = "bart-via-api"
+USER_PASSWORD = "Secret@99"
+
+# Database settings applied on creation (and enforced by reconcile.py)
+DATABASE_SETTINGS = {
+    "protocol": "stack",
+    "dataPersistence": "aof-every-1-second",
+    "dataEvictionPolicy": "allkeys-lru",
+    "replication": False,
+    "enableTls": True,
+    "alerts": [
+        {
+            "name": "datasets-size",
+            "value": 80
+        }
+    ]
+}
+
+SPEC_PATH = os.getenv('REDIS_CLOUD_SPEC')
+# Create databases with the default user already off, saving the separate PUT, its
+# task and the subscription wait after it; 0 restores the create-then-disable sequence
+DISABLE_DEFAULT_USER_ON_CREATE = os.getenv('REDIS_CLOUD_DISABLE_DEFAULT_USER_ON_CREATE', '1') == '1'
+
+
+def default_spec():
+    return {
+        "defaults": {"plan_id": PLAN_ID, "payment_method_id": PAYMENT_METHOD_ID},
+        "subscriptions": [{
+            "name": SUBSCRIPTION_NAME,
+            "databases": [{"name": DATABASE_NAME}],
+            "roles": [{"name": ROLE_NAME}],
+            "users": [{"name": USER_NAME, "role": ROLE_NAME, "password": USER_PASSWORD}]
+        }]
+    }
+
+
+def load_stack(path=SPEC_PATH):
+    # This script provisions a single subscription; provision_engine.py runs specs with many
+    if path:
+        plan = spec.load(path, database_settings=DATABASE_SETTINGS)
+    else:
+        plan = spec.compile_spec(default_spec(), database_settings=DATABASE_SETTINGS)
+    if len(plan) != 1:
+        raise Exception(f"{path} describes {len(plan)} subscriptions; main.py provisions one. "
+                        f"Use provision_engine.py for several.")
+    return plan.stacks[0]
+
+
+# The stack being provisioned; main() reloads it from REDIS_CLOUD_SPEC when set
+run_stack = load_stack(None)
+
+# Records finished steps and in-flight task URLs; main() replaces it with an on-disk journal
+run_journal = journal.Journal(path=None)
+
+
+def emit(event, message=None, **fields):
+    # Every event from this script belongs to the one stack it provisions
+    events.emit(event, message, stack=run_stack["name"], **fields)
+
+
+def task_started(step, description, task_url):
+    emit("task_started", f"{description} task started. Task URL: {task_url}", step=step,
+         resource_id=task_tracker.task_id_from_url(task_url), task_url=task_url)
+
+
+def task_completed(step, message, task_status):
+    emit("task_completed", message, step=step, resource_id=task_status.get('response', {}).get('resourceId'),
+         task=task_status)
+
+
+def subscription_active(step, subscription_id):
+    emit("subscription_active", f"Subscription with ID {subscription_id} is now active.", step=step,
+         resource_id=subscription_id)
+
+
+def fetch_payment_methods():
+    response = api_client.get(API_URL_PAYMENT_METHODS)
+
+    if response.status_code == 200:
+        return response.json()
+    else:
+        response.raise_for_status()
+
+
+def get_payment_methods():
+    # Payment methods rarely change; parallel runs share one fetch through the metadata cache
+    return metadata_cache.get_cache().get_or_fetch('payment-methods', metadata_cache.PAYMENT_METHODS_TTL,
+                                                   fetch_payment_methods)
+
+
+def fetch_plan(plan_id):
+    response = api_client.get(f"{API_URL_FIXED_PLANS}/{plan_id}")
+
+    if response.status_code == 200:
+        return response.json()
+    else:
+        events.api_error(f"Failed to get plan {plan_id}", response)
+        response.raise_for_status()
+
+
+def get_plan(plan_id):
+    # Plans don't change under a subscription; shared through the metadata cache like payment methods
+    return metadata_cache.get_cache().get_or_fetch(f'plan-{plan_id}', metadata_cache.PLANS_TTL,
+                                                   lambda: fetch_plan(plan_id))
+
+
+def check_database_limit(plan_id, database_names):
+    # Fails before anything is created when the plan can't hold every database of the stack
+    limit = get_plan(plan_id).get('maximumDatabases')
+    if limit is not None and len(database_names) > limit:
+        raise Exception(f"Plan {plan_id} allows {limit} database(s) per subscription; "
+                        f"the stack has {len(database_names)}")
+
+
+def create_fixed_subscription(plan_id, payment_method_id, subscription_name=SUBSCRIPTION_NAME):
+    data = {
+        "name": subscription_name,
+        "planId": plan_id,
+        "paymentMethodId": payment_method_id
+    }
+
+    response = api_client.post(API_URL_FIXED_SUBSCRIPTIONS, json=data)
+
+    if response.status_code == 202:
+        return response.json()
+    else:
+        events.api_error("Failed to create subscription", response)
+        response.raise_for_status()
+
+
+def check_task_status(task_url):
+    return task_tracker.wait_for_task(task_url)
+
+
+def wait_for_subscription_active(subscription_id):
+    return resource_wait.wait_for_subscription_active(subscription_id)
+
+
+def wait_for_database_ready(subscription_id, database_id):
+    return resource_wait.wait_for_database_ready(subscription_id, database_id)
+
+
+def create_database(subscription_id, database_name=DATABASE_NAME, settings=DATABASE_SETTINGS):
+    url = f"{API_URL_FIXED_SUBSCRIPTIONS}/{subscription_id}/databases"
+    data = {
+        "name": database_name,
+        **settings,
+        "password": "vamos-desativar-o-user-default-anyway"
+    }
+    if DISABLE_DEFAULT_USER_ON_CREATE:
+        data["enableDefaultUser"] = False
+
+    state_cache.get_cache().invalidate_subscription(subscription_id)
+    response = api_client.post(url, json=data)
+
+    if response.status_code == 202:
+        return response.json()
+    else:
+        events.api_error("Failed to create database", response)
+        response.raise_for_status()
+
+
+def update_database(subscription_id, database_id, data, description="Failed to update database"):
+    # Concurrent updates of one database are merged into a single PUT (see coalesce.py)
+    url = f"{API_URL_FIXED_SUBSCRIPTIONS}/{subscription_id}/databases/{database_id}"
+
+    state_cache.get_cache().invalidate_subscription(subscription_id)
+    response = coalesce.put(url, data, api_client.put)
+
+    if response.status_code == 202:
+        return response.json()
+    else:
+        events.api_error(description, response)
+        response.raise_for_status()
+
+
+def disable_default_user(subscription_id, database_id):
+    data = {
+        "enableDefaultUser": False
+    }
+    return update_database(subscription_id, database_id, data, "Failed to disable default user")
+
+
+def default_user_enabled(subscription_id, database_id):
+    # False once the database reports it off, e.g. when it was created that way
+    return get_database_details(subscription_id, database_id).get('enableDefaultUser', True) is not False
+
+
+def role_rules(subscription_id, database_ids, rule_name=spec.DEFAULT_RULE_NAME):
+    if not isinstance(database_ids, (list, tuple)):
+        database_ids = [database_ids]
+    return [
+        {
+            "ruleName": rule_name,
+            "databases": [
+                {
+                    "subscriptionId": subscription_id,
+                    "databaseId": database_id,
+                    "regions": []
+                }
+                for database_id in database_ids
+            ]
+        }
+    ]
+
+
+def create_role(subscription_id, database_ids, role_name=ROLE_NAME, rule_name=spec.DEFAULT_RULE_NAME):
+    data = {
+        "name": role_name,
+        "redisRules": role_rules(subscription_id, database_ids, rule_name)
+    }
+
+    response = api_client.post(API_URL_ACL_ROLES, json=data)
+
+    if response.status_code == 202:
+        response_json = response.json()
+        state_cache.get_cache().hold(response_json['links'][0]['href'])
+        acl_index.roles().invalidate()
+        return response_json
+    else:
+        events.api_error("Failed to create role", response)
+        response.raise_for_status()
+
+
+def create_user(role_name, user_name=USER_NAME, user_password=USER_PASSWORD):
+    data = {
+        "name": user_name,
+        "role": role_name,
+        "password": user_password
+    }
+
+    response = api_client.post(API_URL_ACL_USERS, json=data)
+
+    if response.status_code == 202:
+        response_json = response.json()
+        state_cache.get_cache().hold(response_json['links'][0]['href'])
+        acl_index.users().invalidate()
+        return response_json
+    else:
+        events.api_error("Failed to create user", response)
+        response.raise_for_status()
+
+
+def get_database_details(subscription_id, database_id):
+    url = f"{API_URL_FIXED_SUBSCRIPTIONS}/{subscription_id}/databases/{database_id}"
+    key = state_cache.database_key(subscription_id, database_id)
+    cached = state_cache.get_cache().get(key)
+    if cached:
+        return cached
+
+    response = api_client.get(url)
+    if response.status_code == 200:
+        database_details = response.json()
+        state_cache.get_cache().put(key, database_details)
+        return database_details
+    else:
+        events.api_error("Failed to get database details", response)
+        response.raise_for_status()
+
+
+def journal_spec():
+    return spec.fingerprint(run_stack)
+
+
+def step_payment_methods(results):
+    # Fetching and printing payment methods
+    payment_methods = get_payment_methods()
+    lines = ["Payment Methods:"] + [
+        f"ID: {method['id']}, Type: {method['type']}, Ends With: {method['creditCardEndsWith']}"
+        for method in payment_methods['paymentMethods']
+    ]
+    emit("payment_methods", "\n".join(lines), step='payment_methods',
+         payment_method_ids=[method['id'] for method in payment_methods['paymentMethods']])
+    return payment_methods
+
+
+def step_subscription(results):
+    # The plan has to hold every database of the stack before a subscription is paid for
+    check_database_limit(run_stack["plan_id"], [database["name"] for database in run_stack["databases"]])
+
+    # Creating fixed subscription
+    task_url = run_journal.start_task('subscription', lambda: create_fixed_subscription(
+        run_stack["plan_id"], run_stack["payment_method_id"], run_stack["name"]))
+    task_started('subscription', "Subscription creation", task_url)
+
+    # Checking subscription creation task status
+    task_status = run_journal.wait_task('subscription', task_url)
+    subscription_id = task_status['response']['resourceId']
+    task_completed('subscription', f"Subscription created successfully with ID: {subscription_id}", task_status)
+
+    # Waiting for subscription to become active
+    wait_for_subscription_active(subscription_id)
+    subscription_active('subscription', subscription_id)
+    return subscription_id
+
+
+def step_database(results):
+    subscription_id = results['subscription']
+    databases = {database["name"]: database for database in run_stack["databases"]}
+
+    # Creating databases: every create is submitted back-to-back, so one subscription
+    # spin-up serves them all and their tasks are tracked together. If the API turns
+    # one away with 409 Conflict, the rest go one at a time once the batch has settled.
+    def submit(name):
+        task_url = run_journal.start_task('database', lambda: create_database(
+            subscription_id, name, databases[name]["settings"]), task_name=name)
+        task_started('database', f"Database {name} creation", task_url)
+        return task_url
+
+    database_ids = {}
+
+    def settle(task_urls):
+        # Checking database creation task status
+        batch_ids = {}
+        for name, task_url in task_urls.items():
+            task_status = run_journal.wait_task('database', task_url, task_name=name)
+            batch_ids[name] = task_status['response']['resourceId']
+            task_completed('database', f"Database {name} creation task completed successfully.", task_status)
+
+        # Waiting for databases to become active
+        for database_id in batch_ids.values():
+            wait_for_database_ready(subscription_id, database_id)
+            emit("database_active", f"Database with ID {database_id} is now active.", step='database',
+                 resource_id=database_id)
+
+        # Waiting for subscription to become active, once per batch
+        wait_for_subscription_active(subscription_id)
+        database_ids.update(batch_ids)
+
+    task_tracker.submit_batches(databases, submit, settle, serial_after_conflict=True)
+    subscription_active('database', subscription_id)
+    return {name: database_ids[name] for name in databases}
+
+
+def step_database_url(results):
+    # Getting database details
+    return {
+        name: get_database_details(results['subscription'], database_id)['publicEndpoint']
+        for name, database_id in results['database'].items()
+    }
+
+
+def step_disable_default_user(results):
+    subscription_id = results['subscription']
+
+    # Disabling default user on every database that still has it
+    databases = {name: database_id for name, database_id in results['database'].items()
+                 if default_user_enabled(subscription_id, database_id)}
+    if not databases:
+        emit("default_user_disabled", "Default user is already disabled on every database.",
+             step='disable_default_user')
+        return
+    task_urls = {}
+    for name, database_id in databases.items():
+        task_urls[name] = run_journal.start_task('disable_default_user', lambda database_id=database_id:
+                                                 disable_default_user(subscription_id, database_id), task_name=name)
+        task_started('disable_default_user', f"Disabling default user of {name}", task_urls[name])
+
+    # Checking disable default user task status
+    for name, task_url in task_urls.items():
+        task_status = run_journal.wait_task('disable_default_user', task_url, task_name=name)
+        task_completed('disable_default_user', f"Default user disabling task of {name} completed successfully.",
+                       task_status)
+
+    # Waiting for subscription to become active
+    wait_for_subscription_active(subscription_id)
+    subscription_active('disable_default_user', subscription_id)
+
+
+def step_role(results):
+    subscription_id = results['subscription']
+
+    # Creating roles: all are submitted first so the tracker waits on their tasks together
+    task_urls = {}
+    for role in run_stack["roles"]:
+        database_ids = [results['database'][name] for name in role["databases"]]
+        task_urls[role["name"]] = run_journal.start_task(
+            'role', lambda role=role, database_ids=database_ids: create_role(
+                subscription_id, database_ids, role["name"], role["rule_name"]), task_name=role["name"])
+        task_started('role', f"Role {role['name']} creation", task_urls[role["name"]])
+
+    # Checking role creation task status
+    for name, task_url in task_urls.items():
+        task_status = run_journal.wait_task('role', task_url, task_name=name)
+        task_completed('role', f"Role {name} creation task completed successfully.", task_status)
+
+    # Waiting for subscription to become active
+    wait_for_subscription_active(subscription_id)
+    subscription_active('role', subscription_id)
+
+
+def step_user(results):
+    subscription_id = results['subscription']
+
+    # Creating users
+    task_urls = {}
+    for user in run_stack["users"]:
+        task_urls[user["name"]] = run_journal.start_task('user', lambda user=user: create_user(
+            user["role"], user["name"], user["password"]), task_name=user["name"])
+        task_started('user', f"User {user['name']} creation", task_urls[user["name"]])
+
+    # Checking user creation task status
+    for name, task_url in task_urls.items():
+        task_status = run_journal.wait_task('user', task_url, task_name=name)
+        task_completed('user', f"User {name} creation task completed successfully.", task_status)
+
+    # Waiting for subscription to become active
+    wait_for_subscription_active(subscription_id)
+    subscription_active('user', subscription_id)
+
+
+def step_verify(results):
+    # Connecting as the new users proves the endpoints, TLS and ACLs actually work
+    verification = verify.verify_stack(run_stack, results['database_url'])
+    for name, result in verification.items():
+        if result["ok"]:
+            emit("database_verified", f"Database {name} verified at {result['endpoint']}.", step='verify',
+                 resource_id=results['database'][name], verification=result)
+        else:
+            emit("database_verify_failed", f"Database {name} failed verification: {result['error']}",
+                 step='verify', resource_id=results['database'][name], verification=result)
+    return verification
+
+
+def build_provisioning_dag():
+    # The payment method id comes from the spec, so listing payment methods doesn't gate anything
+    provisioning = dag.Dag(journal=run_journal, name=run_stack["name"])
+    provisioning.add('payment_methods', step_payment_methods)
+    provisioning.add('subscription', step_subscription)
+    provisioning.add('database', step_database, deps=['subscription'])
+    provisioning.add('database_url', step_database_url, deps=['subscription', 'database'])
+    provisioning.add('disable_default_user', step_disable_default_user, deps=['subscription', 'database'])
+    provisioning.add('role', step_role, deps=['disable_default_user'])
+    provisioning.add('user', step_user, deps=['role'])
+    if verify.VERIFY:
+        provisioning.add('verify', step_verify, deps=['database_url', 'user'])
+    return provisioning
+
+
+def stack_output(results):
+    # The result JSON for a finished provisioning DAG
+    output = {"subscription_id": results['subscription']}
+    if len(run_stack["databases"]) == 1:
+        name = run_stack["databases"][0]["name"]
+        output["database_id"] = results['database'][name]
+        output["database_url"] = results['database_url'][name]
+        if 'verify' in results:
+            output["verification"] = results['verify'][name]
+    else:
+        output["databases"] = [
+            {"name": name, "database_id": database_id, "database_url": results['database_url'][name]}
+            for name, database_id in results['database'].items()
+        ]
+        if 'verify' in results:
+            for database in output["databases"]:
+                database["verification"] = results['verify'][database["name"]]
+    if run_stack["users"]:
+        output["user"] = run_stack["users"][0]["name"]
+        output["password"] = run_stack["users"][0]["password"]
+    if len(run_stack["users"]) > 1:
+        output["users"] = [{"user": user["name"], "password": user["password"]} for user in run_stack["users"]]
+    return output
+
+
+def main():
+    global run_journal, run_stack
+    try:
+        run_stack = load_stack()
+        run_journal = journal.Journal(spec=journal_spec())
+    except Exception as e:
+        emit("error", f"Error: {e}", error=str(e))
+        events.flush()
+        return
+
+    provisioning = build_provisioning_dag()
+    try:
+        results = provisioning.run()
+        provisioning.print_report()
+        # The run is complete; a rerun should provision a new stack
+        run_journal.remove()
+
+        # Output the final JSON object
+        output = stack_output(results)
+
+        events.log(f"State cache avoided {state_cache.get_cache().avoided_gets} GETs")
+        coalesced = coalesce.report()
+        events.log(f"Coalescing shared {coalesced['shared_gets']} GETs and merged {coalesced['merged_puts']} PUTs")
+        metrics.finish()
+        emit("result", json.dumps(output, indent=4), result=output)
+
+    except Exception as e:
+        provisioning.print_report()
+        metrics.finish()
+        emit("error", f"Error: {e}", error=str(e), failed_step=next(iter(provisioning.errors), None))
+    events.flush()
+
+
+if __name__ == '__main__':
+    main()
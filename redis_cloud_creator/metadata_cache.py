@@ -0,0 +1,173 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from . import api_client, credentials, events, sqlite_store
+
+# On-disk cache of slow-changing account metadata (payment methods, plans, ACL user
+# and role listings), shared by every process on the machine through one SQLite file.
+# Entries expire after a TTL and are dropped explicitly by our own mutations.
+# A stale entry is refetched by one process at a time: the others wait on the
+# write lock and then find the fresh copy instead of paying the round trip too.
+# Lookups never wait on that lock. A process stuck behind it for LOCK_TIMEOUT fetches
+# on its own and skips the cache until its fetch is done.
+#
+# Keys are scoped to the API URL and key, so accounts (and mock servers) never mix.
+# REDIS_CLOUD_METADATA_CACHE= (empty) turns the cache off.
+
+METADATA_CACHE_PATH = os.getenv('REDIS_CLOUD_METADATA_CACHE', '.redis-cloud-metadata.sqlite3')
+PAYMENT_METHODS_TTL = float(os.getenv('REDIS_CLOUD_PAYMENT_METHODS_TTL', '3600'))
+PLANS_TTL = float(os.getenv('REDIS_CLOUD_PLANS_TTL', '86400'))
+# Longest a process (or thread) waits for another one's fetch before fetching without the cache
+LOCK_TIMEOUT = 30
+
+
+def account_scope(base_url=None, api_key=None):
+    base_url = base_url or api_client.API_BASE_URL
+    api_key = api_key or credentials.current().api_key
+    return hashlib.sha256(f"{base_url}\n{api_key}".encode()).hexdigest()[:16]
+
+
+class MetadataCache:
+    def __init__(self, path=METADATA_CACHE_PATH, scope=None, clock=time.time):
+        self.path = path
+        self.scope = scope or account_scope()
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        # Set in a thread that is fetching without the lock; its writes would only wait again
+        self._bypass = threading.local()
+        self._store = None
+        if path:
+            try:
+                self._store = sqlite_store.Store(path, timeout=LOCK_TIMEOUT, schema=[
+                    "CREATE TABLE IF NOT EXISTS metadata (scope TEXT, key TEXT, value TEXT, etag TEXT, "
+                    "fetched REAL, PRIMARY KEY (scope, key))"])
+            except sqlite3.Error:
+                # An unwritable location just means no sharing; every call goes to the API
+                self._store = None
+
+    @property
+    def enabled(self):
+        return self._store is not None
+
+    def peek(self, key):
+        # (value, etag, age in seconds) whatever its age, or None
+        if not self.enabled:
+            return None
+        rows = self._store.execute("SELECT value, etag, fetched FROM metadata WHERE scope = ? AND key = ?",
+                                   self.scope, key)
+        if not rows:
+            return None
+        value, etag, fetched = rows[0]
+        return json.loads(value), etag, max(0.0, self._clock() - fetched)
+
+    def get(self, key, ttl):
+        # (value, etag, age) if the entry is younger than ttl, else None
+        entry = self.peek(key)
+        if entry is None or entry[2] > ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key, value, etag=None):
+        if not self.enabled:
+            return
+        self._write("INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?)",
+                    self.scope, key, json.dumps(value), etag, self._clock())
+
+    def touch(self, key):
+        # The server confirmed (304) that the cached value is still current
+        if not self.enabled:
+            return
+        self._write("UPDATE metadata SET fetched = ? WHERE scope = ? AND key = ?", self._clock(), self.scope, key)
+
+    def _write(self, sql, *params):
+        # A copy that can't be stored only costs the next process a fetch
+        if getattr(self._bypass, 'active', False):
+            return
+        try:
+            self._store.update(sql, *params)
+        except sqlite3.OperationalError:
+            pass
+
+    def invalidate(self, *keys):
+        if not self.enabled:
+            return
+        with self._store.transaction() as conn:
+            conn.executemany("DELETE FROM metadata WHERE scope = ? AND key = ?", [(self.scope, key) for key in keys])
+
+    def invalidate_all(self):
+        if not self.enabled:
+            return
+        self._store.update("DELETE FROM metadata WHERE scope = ?", self.scope)
+
+    @contextlib.contextmanager
+    def locked(self):
+        # Critical section around a refetch: one process and thread at a time, lookups are never
+        # blocked (WAL). Past LOCK_TIMEOUT the body runs anyway, without the lock or the cache.
+        if not self.enabled:
+            yield
+            return
+        with contextlib.ExitStack() as stack:
+            try:
+                stack.enter_context(self._store.transaction())
+            except sqlite3.OperationalError as e:
+                events.log(f"Metadata cache {self.path} is busy ({e}); fetching without it")
+                self._bypass.active = True
+                stack.callback(setattr, self._bypass, 'active', False)
+            yield
+
+    def get_or_fetch(self, key, ttl, fetch):
+        # fetch() -> value; runs in at most one process while the entry is stale
+        entry = self.get(key, ttl)
+        if entry is not None:
+            return entry[0]
+        with self.locked():
+            entry = self.peek(key)
+            if entry is not None and entry[2] <= ttl:
+                return entry[0]
+            value = fetch()
+            self.put(key, value)
+            return value
+
+
+# One per account scope, i.e. per API key in use (credentials.py)
+_caches = {}
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    scope = account_scope()
+    with _cache_lock:
+        if scope not in _caches:
+            _caches[scope] = MetadataCache(scope=scope)
+        return _caches[scope]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the shared account metadata cache")
+    parser.add_argument('--clear', action='store_true', help="Drop every entry for the configured account")
+    args = parser.parse_args()
+
+    cache = get_cache()
+    if not cache.enabled:
+        print("Metadata cache is disabled (REDIS_CLOUD_METADATA_CACHE is empty or unwritable)")
+        return
+    if args.clear:
+        cache.invalidate_all()
+        print(f"Cleared metadata cache {cache.path} for account {cache.scope}")
+        return
+    rows = cache._store.execute("SELECT key, fetched FROM metadata WHERE scope = ? ORDER BY key", cache.scope)
+    for key, fetched in rows:
+        print(f"{key:<24} fetched {time.time() - fetched:8.0f}s ago")
+
+
+if __name__ == '__main__':
+    main()
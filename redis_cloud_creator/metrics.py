@@ -0,0 +1,137 @@
+import collections
+import json
+import os
+import re
+import threading
+import time
+
+from . import events
+
+# Process-wide timing counters: every API call, every wait loop and every DAG step.
+# finish() writes a JSON report to REDIS_CLOUD_TIMING_REPORT and, with
+# REDIS_CLOUD_TIMING_SUMMARY=1, prints a short human-readable breakdown.
+
+TIMING_REPORT = os.getenv('REDIS_CLOUD_TIMING_REPORT')
+TIMING_SUMMARY = os.getenv('REDIS_CLOUD_TIMING_SUMMARY', '0') == '1'
+# Latencies kept for the percentiles: the most recent ones, so long-running processes
+# (status daemon, pool serve, queue worker) stay bounded; counts and totals cover every call
+LATENCY_SAMPLES = int(os.getenv('REDIS_CLOUD_TIMING_SAMPLES', '10000'))
+
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+_lock = threading.Lock()
+_started = time.monotonic()
+_latencies_ms = collections.deque(maxlen=LATENCY_SAMPLES)
+_requests = {"count": 0, "seconds": 0.0, "max_ms": None, "by_status": {}, "by_endpoint": {},
+             "histogram": dict.fromkeys([f"<={bucket}ms" for bucket in LATENCY_BUCKETS_MS]
+                                        + [f">{LATENCY_BUCKETS_MS[-1]}ms"], 0)}
+_waits = {}
+_steps = {}
+
+
+def endpoint(method, url):
+    # GET https://.../v1/fixed/subscriptions/123/databases/456 -> GET /fixed/subscriptions/{id}/databases/{id}
+    path = re.sub(r'^https?://[^/]+(/v\d+)?', '', url.split('?', 1)[0])
+    path = re.sub(r'/tasks/[^/]+', '/tasks/{id}', path)
+    path = re.sub(r'/\d+', '/{id}', path)
+    return f"{method} {path}"
+
+
+def histogram_bucket(latency_ms):
+    return next((f"<={bucket}ms" for bucket in LATENCY_BUCKETS_MS if latency_ms <= bucket),
+                f">{LATENCY_BUCKETS_MS[-1]}ms")
+
+
+def record_request(method, url, status, seconds):
+    name = endpoint(method, url)
+    latency_ms = seconds * 1000
+    with _lock:
+        _requests["count"] += 1
+        _requests["seconds"] += seconds
+        if _requests["max_ms"] is None or latency_ms > _requests["max_ms"]:
+            _requests["max_ms"] = latency_ms
+        _requests["by_status"][str(status)] = _requests["by_status"].get(str(status), 0) + 1
+        entry = _requests["by_endpoint"].setdefault(name, {"count": 0, "seconds": 0.0})
+        entry["count"] += 1
+        entry["seconds"] += seconds
+        _requests["histogram"][histogram_bucket(latency_ms)] += 1
+        _latencies_ms.append(latency_ms)
+
+
+def record_wait(kind, seconds, polls, slept):
+    with _lock:
+        wait = _waits.setdefault(kind, {"count": 0, "seconds": 0.0, "polls": 0, "sleep_seconds": 0.0})
+        wait["count"] += 1
+        wait["seconds"] += seconds
+        wait["polls"] += polls
+        wait["sleep_seconds"] += slept
+
+
+def record_step(name, seconds):
+    with _lock:
+        _steps[name] = _steps.get(name, 0.0) + seconds
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def report():
+    with _lock:
+        requests = {
+            "count": _requests["count"],
+            "by_status": dict(_requests["by_status"]),
+            "by_endpoint": {name: {"count": entry["count"], "seconds": round(entry["seconds"], 6)}
+                            for name, entry in _requests["by_endpoint"].items()},
+            "histogram": dict(_requests["histogram"])
+        }
+        http_seconds, max_ms = _requests["seconds"], _requests["max_ms"]
+        latencies_ms = list(_latencies_ms)
+        waits, steps = dict(_waits), dict(_steps)
+    sleep_seconds = sum(wait["sleep_seconds"] for wait in waits.values())
+    return {
+        "wall_seconds": round(time.monotonic() - _started, 3),
+        "http_seconds": round(http_seconds, 3),
+        "sleep_seconds": round(sleep_seconds, 3),
+        "requests": {
+            "count": requests["count"],
+            "by_status": requests["by_status"],
+            "by_endpoint": requests["by_endpoint"],
+            "latency_ms": {
+                "p50": percentile(latencies_ms, 0.5),
+                "p95": percentile(latencies_ms, 0.95),
+                "p99": percentile(latencies_ms, 0.99),
+                "max": max_ms,
+                "samples": len(latencies_ms),
+                "histogram": requests["histogram"]
+            }
+        },
+        "waits": {kind: {key: round(value, 3) for key, value in wait.items()} for kind, wait in waits.items()},
+        "steps": {name: round(seconds, 3) for name, seconds in steps.items()}
+    }
+
+
+def print_summary(data):
+    lines = [f"Timing: {data['wall_seconds']:.2f}s wall, {data['http_seconds']:.2f}s in {data['requests']['count']} "
+             f"API calls, {data['sleep_seconds']:.2f}s sleeping between polls"]
+    latency = data['requests']['latency_ms']
+    if latency['p50'] is not None:
+        lines.append(f"  API latency p50 {latency['p50']:.1f}ms  p95 {latency['p95']:.1f}ms  "
+                     f"p99 {latency['p99']:.1f}ms")
+    for kind, wait in sorted(data['waits'].items(), key=lambda item: -item[1]['seconds']):
+        lines.append(f"  wait {kind:<32} {wait['count']:4.0f}x  {wait['seconds']:8.2f}s  {wait['polls']:5.0f} polls  "
+                     f"{wait['sleep_seconds']:8.2f}s asleep")
+    events.emit("timing", "\n".join(lines), timing=data)
+
+
+def finish():
+    data = report()
+    if TIMING_REPORT:
+        with open(TIMING_REPORT, 'w') as f:
+            json.dump(data, f, indent=4)
+    if TIMING_SUMMARY:
+        print_summary(data)
+    return data
@@ -0,0 +1,201 @@
+import os
+import random
+import threading
+import time
+
+from . import metrics
+
+# Pluggable polling strategies for the task and wait_* loops.
+# Every strategy answers "how long until the next poll?"; server hints
+# (Retry-After, exhausted rate-limit windows) always win over the strategy.
+# Caps are per kind: tasks stop backing off at POLL_TASK_CAP, so a finished task is
+# noticed within about two seconds; resource waits (minutes long) at POLL_CAP.
+# bench_polling.py checks the defaults are no later than the old fixed 10s/5s polls.
+
+POLL_STRATEGY = os.getenv('REDIS_CLOUD_POLL_STRATEGY', 'adaptive')
+POLL_INITIAL = float(os.getenv('REDIS_CLOUD_POLL_INITIAL', '1'))
+POLL_FACTOR = float(os.getenv('REDIS_CLOUD_POLL_FACTOR', '2'))
+POLL_CAP = float(os.getenv('REDIS_CLOUD_POLL_CAP', '8'))
+# Tasks usually finish within seconds, so their polls stop growing much sooner (never above POLL_CAP)
+POLL_TASK_CAP = float(os.getenv('REDIS_CLOUD_POLL_TASK_CAP', '2'))
+POLL_JITTER = float(os.getenv('REDIS_CLOUD_POLL_JITTER', '0.2'))
+
+
+# Kinds that wait on a resource's status; any other kind is a task (task_tracker
+# names them after the command type)
+RESOURCE_KINDS = ('subscription', 'database', 'database-connect', 'role-users')
+
+
+def server_delay(response):
+    # Seconds the server asked us to wait, or None when it gave no hint
+    if response is None:
+        return None
+    headers = response.headers
+    retry_after = headers.get('Retry-After')
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            # HTTP-date form; rare, so the email package is only loaded when it shows up
+            import email.utils
+            parsed = email.utils.parsedate_to_datetime(retry_after)
+            if parsed is not None:
+                return max(0.0, parsed.timestamp() - time.time())
+    if headers.get('X-RateLimit-Remaining') == '0' and headers.get('X-RateLimit-Reset'):
+        try:
+            return max(0.0, float(headers['X-RateLimit-Reset']))
+        except ValueError:
+            return None
+    if response.status_code == 429:
+        return POLL_CAP
+    return None
+
+
+def completion_estimate(started, last_pending, finished):
+    # The resource became ready somewhere between the last not-ready answer and
+    # now; recording the midpoint keeps the adaptive estimate from ratcheting up.
+    return (last_pending + finished) / 2 - started
+
+
+class FixedInterval:
+    def __init__(self, interval=10):
+        self.interval = interval
+
+    def initial_delay(self, kind):
+        return 0
+
+    def next_delay(self, kind, attempt, elapsed):
+        return self.interval
+
+    def record(self, kind, duration):
+        pass
+
+
+class ExponentialBackoff:
+    def __init__(self, initial=POLL_INITIAL, factor=POLL_FACTOR, cap=POLL_CAP, task_cap=POLL_TASK_CAP,
+                 jitter=POLL_JITTER, rng=None):
+        self.initial = initial
+        self.factor = factor
+        self.cap = cap
+        self.task_cap = task_cap
+        self.jitter = jitter
+        self.rng = rng or random.Random()
+
+    def initial_delay(self, kind):
+        return 0
+
+    def cap_for(self, kind):
+        return self.cap if kind in RESOURCE_KINDS else min(self.cap, self.task_cap)
+
+    def next_delay(self, kind, attempt, elapsed):
+        delay = min(self.cap_for(kind), self.initial * self.factor ** attempt)
+        return self._jittered(delay)
+
+    def record(self, kind, duration):
+        pass
+
+    def _jittered(self, delay):
+        if not self.jitter:
+            return delay
+        return max(0.0, delay * self.rng.uniform(1 - self.jitter, 1 + self.jitter))
+
+
+class AdaptiveBackoff(ExponentialBackoff):
+    # Learns a moving average (and mean deviation) of completion time per resource
+    # type and sleeps until just before the typical finish, then backs off exponentially.
+
+    def __init__(self, spread=2, alpha=0.3, **kwargs):
+        super().__init__(**kwargs)
+        self.spread = spread
+        self.alpha = alpha
+        self.expected = {}
+        self.deviation = {}
+        self._lock = threading.Lock()
+
+    def initial_delay(self, kind):
+        with self._lock:
+            expected = self.expected.get(kind)
+            deviation = self.deviation.get(kind, 0)
+        if expected is None:
+            return 0
+        delay = expected - self.spread * deviation
+        if delay < self.initial:
+            # Not worth delaying the first look at something that is usually ready
+            return 0
+        return delay
+
+    def record(self, kind, duration):
+        with self._lock:
+            previous = self.expected.get(kind)
+            if previous is None:
+                self.expected[kind] = duration
+                self.deviation[kind] = duration / 2
+            else:
+                self.expected[kind] = previous + self.alpha * (duration - previous)
+                self.deviation[kind] += self.alpha * (abs(duration - previous) - self.deviation[kind])
+
+
+STRATEGIES = {
+    'fixed': FixedInterval,
+    'exponential': ExponentialBackoff,
+    'adaptive': AdaptiveBackoff
+}
+
+_strategy = None
+
+
+def get_strategy():
+    global _strategy
+    if _strategy is None:
+        _strategy = STRATEGIES[POLL_STRATEGY]()
+    return _strategy
+
+
+def set_strategy(strategy):
+    global _strategy
+    _strategy = strategy
+
+
+class Poller:
+    # Tracks one wait loop: call start() before the first GET, sleep(response)
+    # after every not-ready answer, and done() once the resource is ready.
+
+    def __init__(self, kind, strategy=None, sleep=time.sleep, clock=time.monotonic):
+        self.kind = kind
+        self.strategy = strategy or get_strategy()
+        self._sleep = sleep
+        self._clock = clock
+        self.started = clock()
+        self.last_pending = self.started
+        self.attempt = 0
+        self.slept = 0.0
+
+    def elapsed(self):
+        return self._clock() - self.started
+
+    def first_delay(self):
+        delay = self.strategy.initial_delay(self.kind)
+        self.slept += delay
+        return delay
+
+    def next_delay(self, response=None):
+        delay = self.strategy.next_delay(self.kind, self.attempt, self.elapsed())
+        hint = server_delay(response)
+        if hint is not None:
+            delay = max(delay, hint)
+        self.attempt += 1
+        self.last_pending = self._clock()
+        self.slept += delay
+        return delay
+
+    def start(self):
+        delay = self.first_delay()
+        if delay:
+            self._sleep(delay)
+
+    def sleep(self, response=None):
+        self._sleep(self.next_delay(response))
+
+    def done(self):
+        self.strategy.record(self.kind, completion_estimate(self.started, self.last_pending, self._clock()))
+        metrics.record_wait(self.kind, self.elapsed(), self.attempt + 1, self.slept)
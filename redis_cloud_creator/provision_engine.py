@@ -0,0 +1,232 @@
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import api_client, credentials, events, main, metrics, polling, resource_wait, spec, task_tracker, verify
+
+# Drives many subscription -> database -> role -> user chains concurrently.
+# HTTP calls still go through the shared pooled session; they run on worker threads
+# while all waiting happens on the event loop, so idle chains cost no thread.
+
+DEFAULT_CONCURRENCY = 8
+
+
+def spec_defaults(entry):
+    # The original one-database-per-entry format, compiled into a stack like any spec file
+    role_name = entry.get("role_name", main.ROLE_NAME)
+    data = {
+        "subscriptions": [{
+            "name": entry.get("subscription_name", main.SUBSCRIPTION_NAME),
+            "plan_id": entry.get("plan_id", main.PLAN_ID),
+            "payment_method_id": entry.get("payment_method_id", main.PAYMENT_METHOD_ID),
+            "databases": [{"name": entry["database_name"]}],
+            "roles": [{"name": role_name}],
+            "users": [{"name": entry.get("user_name", main.USER_NAME), "role": role_name,
+                       "password": entry.get("user_password", main.USER_PASSWORD)}]
+        }]
+    }
+    return spec.compile_spec(data, database_settings=main.DATABASE_SETTINGS).stacks[0]
+
+
+def load_stacks(path):
+    # A spec file (see spec.py), or the original JSON list of one-database entries
+    if path.lower().endswith('.json'):
+        with open(path) as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            return [spec_defaults(entry) for entry in data]
+    return spec.load(path, database_settings=main.DATABASE_SETTINGS).stacks
+
+
+class ProvisioningEngine:
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, strategy=None, scheduler=None):
+        self.concurrency = concurrency
+        self.strategy = strategy or polling.get_strategy()
+        self.scheduler = scheduler or credentials.Scheduler()
+        self.tracker = task_tracker.TaskTracker(strategy=self.strategy)
+        self._semaphore = None
+        self._executor = None
+
+    async def _call(self, func, *args):
+        # The worker thread inherits this chain's credential
+        return await asyncio.wrap_future(credentials.run_in_context(self._executor, func, *args))
+
+    async def wait_for_task(self, task_url, kind='task'):
+        return await asyncio.wrap_future(self.tracker.register(task_url, kind=kind))
+
+    async def wait_for_status(self, wait):
+        # resource_wait.wait_for_status, sleeping the chain rather than a worker thread
+        resource = wait.cached()
+        if resource is None and wait.delegated:
+            # The daemon's wait holds a worker thread, at most one per chain
+            resource = await self._call(wait.from_daemon)
+        if resource is not None:
+            return resource
+        delay = wait.first_delay()
+        while True:
+            await asyncio.sleep(delay)
+            resource, delay = wait.handle(await self._call(api_client.get, wait.url))
+            if resource is not None:
+                return resource
+
+    async def wait_for_subscription_active(self, subscription_id):
+        return await self.wait_for_status(resource_wait.subscription_wait(subscription_id, self.strategy))
+
+    async def wait_for_database_ready(self, subscription_id, database_id):
+        return await self.wait_for_status(resource_wait.database_wait(subscription_id, database_id, self.strategy))
+
+    async def run_task(self, func, *args):
+        response = await self._call(func, *args)
+        return await self.wait_for_task(response['links'][0]['href'], func.__name__)
+
+    async def create_databases(self, subscription_id, databases):
+        # Submitted together; any the API turns away with 409 Conflict are created one at a time
+        # once the others have settled, as main.step_database does through task_tracker.submit_batches
+        async def submit(database):
+            try:
+                response = await self._call(main.create_database, subscription_id, database["name"],
+                                            database["settings"])
+            except Exception as e:
+                if api_client.error_status(e) != 409:
+                    raise
+                return e
+            return response['links'][0]['href']
+
+        async def settle(task_urls):
+            task_statuses = await asyncio.gather(*(self.wait_for_task(task_url, 'create_database')
+                                                   for task_url in task_urls.values()))
+            batch_ids = {name: task_status['response']['resourceId']
+                         for name, task_status in zip(task_urls, task_statuses)}
+            await asyncio.gather(*(self.wait_for_database_ready(subscription_id, database_id)
+                                   for database_id in batch_ids.values()))
+            await self.wait_for_subscription_active(subscription_id)
+            return batch_ids
+
+        submitted = await asyncio.gather(*(submit(database) for database in databases))
+        accepted = {database["name"]: task_url for database, task_url in zip(databases, submitted)
+                    if isinstance(task_url, str)}
+        busy = [database for database, task_url in zip(databases, submitted) if not isinstance(task_url, str)]
+        if busy and not accepted:
+            raise submitted[0]
+        database_ids = await settle(accepted)
+        for database in busy:
+            task_url = await submit(database)
+            if not isinstance(task_url, str):
+                raise task_url
+            database_ids.update(await settle({database["name"]: task_url}))
+        return {database["name"]: database_ids[database["name"]] for database in databases}
+
+    async def provision(self, stack):
+        # Same step order as main.main(), with the blocking sleeps replaced by awaits.
+        # Databases, roles and users of one kind are submitted together and awaited as a group.
+        await self._call(main.check_database_limit, stack["plan_id"],
+                         [database["name"] for database in stack["databases"]])
+        task_status = await self.run_task(main.create_fixed_subscription, stack["plan_id"],
+                                          stack["payment_method_id"], stack["name"])
+        subscription_id = task_status['response']['resourceId']
+        await self.wait_for_subscription_active(subscription_id)
+
+        database_ids = await self.create_databases(subscription_id, stack["databases"])
+
+        databases = []
+        default_user_enabled = []
+        for name, database_id in database_ids.items():
+            database_details = await self._call(main.get_database_details, subscription_id, database_id)
+            databases.append({"name": name, "database_id": database_id,
+                              "database_url": database_details['publicEndpoint']})
+            if database_details.get('enableDefaultUser', True) is not False:
+                default_user_enabled.append(database_id)
+
+        # Nothing to do for databases created with the default user off (main.DISABLE_DEFAULT_USER_ON_CREATE)
+        if default_user_enabled:
+            await asyncio.gather(*(self.run_task(main.disable_default_user, subscription_id, database_id)
+                                   for database_id in default_user_enabled))
+            await self.wait_for_subscription_active(subscription_id)
+
+        if stack["roles"]:
+            await asyncio.gather(*(
+                self.run_task(main.create_role, subscription_id, [database_ids[name] for name in role["databases"]],
+                              role["name"], role["rule_name"])
+                for role in stack["roles"]))
+            await self.wait_for_subscription_active(subscription_id)
+
+        if stack["users"]:
+            await asyncio.gather(*(self.run_task(main.create_user, user["role"], user["name"], user["password"])
+                                   for user in stack["users"]))
+            await self.wait_for_subscription_active(subscription_id)
+
+        if verify.VERIFY:
+            verification = await self._call(verify.verify_stack, stack,
+                                            {database["name"]: database["database_url"] for database in databases})
+            for database in databases:
+                database["verification"] = verification[database["name"]]
+
+        return {
+            "subscription_id": subscription_id,
+            "databases": databases,
+            "users": [{"user": user["name"], "password": user["password"]} for user in stack["users"]]
+        }
+
+    async def _run_chain(self, stack):
+        started = time.monotonic()
+        async with self._semaphore:
+            # The key is picked when the chain starts and every call of the chain sticks to it
+            credential = self.scheduler.acquire()
+            events.emit("stack_started", stack=stack["name"], credential=credential.name)
+            try:
+                with credentials.use(credential):
+                    output = await self.provision(stack)
+                result = {"subscription_name": stack["name"], "status": "ok", "output": output}
+            except Exception as e:
+                # A failed chain is reported but never cancels its siblings
+                result = {"subscription_name": stack["name"], "status": "failed", "error": str(e)}
+            finally:
+                self.scheduler.release(credential)
+        result["credential"] = credential.name
+        result["elapsed"] = round(time.monotonic() - started, 3)
+        events.emit("stack_finished", stack=stack["name"], status=result["status"],
+                    error=result.get("error"), duration=result["elapsed"])
+        return result
+
+    async def run(self, stacks):
+        # stacks: a spec.Plan, compiled stacks, or entries in the original one-database format
+        stacks = [stack if "databases" in stack else spec_defaults(stack) for stack in stacks]
+        # concurrency is per key: each one has its own quota
+        self._semaphore = asyncio.Semaphore(self.concurrency * len(self.scheduler.credentials))
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency * len(self.scheduler.credentials))
+        try:
+            return await asyncio.gather(*(self._run_chain(stack) for stack in stacks))
+        finally:
+            self._executor.shutdown(wait=False)
+
+
+def provision_many(stacks, concurrency=DEFAULT_CONCURRENCY, **kwargs):
+    engine = ProvisioningEngine(concurrency=concurrency, **kwargs)
+    return asyncio.run(engine.run(stacks))
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Provision many Essentials databases concurrently")
+    parser.add_argument('specs', help="Spec file (.json/.toml/.yaml, see spec.py), or a JSON list of "
+                                      "one-database entries (each needs database_name)")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="Chains in flight per API key")
+    args = parser.parse_args(argv)
+
+    try:
+        stacks = load_stacks(args.specs)
+    except Exception as e:
+        events.emit("error", f"Error: {e}", error=str(e))
+        events.flush()
+        return
+
+    results = provision_many(stacks, concurrency=args.concurrency)
+    metrics.finish()
+    credentials.print_report()
+    events.emit("result", json.dumps(results, indent=4), results=results)
+    events.flush()
+
+
+if __name__ == '__main__':
+    main_cli()
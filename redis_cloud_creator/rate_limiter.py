@@ -0,0 +1,94 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from . import metrics, polling
+
+# Token bucket in front of every API call; each API key has its own (credentials.py),
+# since the quota is per key. Mutating calls queue ahead of reads, so a burst of
+# status polls never delays a POST/PUT/DELETE. A 429 (or an exhausted X-RateLimit
+# window) pauses every caller of that key for the time the server asked for and
+# halves the refill rate; each successful call then wins a little back.
+# REDIS_CLOUD_RATE_LIMIT=0 turns the bucket off but keeps the 429 pause.
+# The default burst of one paces calls evenly: a fixed-window quota like the
+# API's 400 calls/minute punishes bursts that straddle a window boundary.
+
+RATE_LIMIT = float(os.getenv('REDIS_CLOUD_RATE_LIMIT', '6.5'))
+RATE_BURST = float(os.getenv('REDIS_CLOUD_RATE_BURST', '1'))
+RATE_LIMIT_RETRIES = int(os.getenv('REDIS_CLOUD_RATE_LIMIT_RETRIES', '5'))
+
+PRIORITY_MUTATE = 0
+PRIORITY_READ = 1
+
+
+def priority(method):
+    return PRIORITY_READ if method.upper() in ('GET', 'HEAD') else PRIORITY_MUTATE
+
+
+class RateLimiter:
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_BURST, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.current_rate = rate
+        self.tokens = self.burst
+        self.throttled = 0
+        self._clock = clock
+        self._updated = clock()
+        self._hold_until = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.current_rate)
+        self._updated = now
+
+    def acquire(self, priority=PRIORITY_READ):
+        # Blocks until this caller is first in line and a token is available; returns seconds waited
+        started = self._clock()
+        with self._cond:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    now = self._clock()
+                    self._refill(now)
+                    if now < self._hold_until:
+                        delay = self._hold_until - now
+                    elif self._waiters[0] != ticket:
+                        delay = None
+                    elif not self.rate or self.tokens >= 1:
+                        if self.rate:
+                            self.tokens -= 1
+                        break
+                    else:
+                        delay = (1 - self.tokens) / self.current_rate
+                    self._cond.wait(delay)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+        waited = self._clock() - started
+        if waited > 0.001:
+            metrics.record_wait('rate limit', waited, 1, waited)
+        return waited
+
+    def observe(self, response):
+        # Feed every response back so server hints and 429s steer the bucket
+        delay = polling.server_delay(response)
+        with self._cond:
+            if response.status_code == 429:
+                self.throttled += 1
+                # Calls already in flight when the first 429 arrived count as one signal
+                if self.rate and self._clock() >= self._hold_until:
+                    self.current_rate = max(self.rate / 16, self.current_rate / 2)
+                    self.tokens = 0
+            elif self.rate and self.current_rate < self.rate:
+                self.current_rate = min(self.rate, self.current_rate + self.rate / 20)
+            if delay:
+                self._hold_until = max(self._hold_until, self._clock() + delay)
+                self._cond.notify_all()
+
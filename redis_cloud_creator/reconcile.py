@@ -0,0 +1,221 @@
+import argparse
+import json
+
+from . import acl_index, api_client, events, main, metrics, state_cache, task_tracker
+
+# Create-or-reuse mode for the stack main.py provisions (one database, role and
+# user; REDIS_CLOUD_SPEC applies here too). Existing resources are looked up by
+# name and diffed against the desired spec; only the missing or drifted ones are
+# created or updated, so a converged environment costs a handful of list GETs
+# and no task waits.
+
+# Fields of an existing database that can be brought back in line with a PUT
+UPDATABLE_DATABASE_FIELDS = ["dataPersistence", "dataEvictionPolicy", "replication", "enableTls", "alerts"]
+
+
+def list_subscriptions():
+    response = api_client.get(main.API_URL_FIXED_SUBSCRIPTIONS)
+    if response.status_code == 200:
+        return response.json().get('subscriptions', [])
+    else:
+        events.api_error("Failed to list subscriptions", response)
+        response.raise_for_status()
+
+
+def list_databases(subscription_id):
+    url = f"{main.API_URL_FIXED_SUBSCRIPTIONS}/{subscription_id}/databases"
+
+    response = api_client.get(url)
+    if response.status_code == 200:
+        databases = response.json().get('subscription', {}).get('databases', [])
+        for database in databases:
+            state_cache.get_cache().put(state_cache.database_key(subscription_id, database['databaseId']), database)
+        return databases
+    else:
+        events.api_error("Failed to list databases", response)
+        response.raise_for_status()
+
+
+def update_acl(url, data, index):
+    response = api_client.put(url, json=data)
+    if response.status_code == 202:
+        response_json = response.json()
+        state_cache.get_cache().hold(response_json['links'][0]['href'])
+        index.invalidate()
+        return response_json
+    else:
+        events.api_error(f"Failed to update {url}", response)
+        response.raise_for_status()
+
+
+def target_database():
+    return main.run_stack["databases"][0]
+
+
+def target_role():
+    return main.run_stack["roles"][0]
+
+
+def target_user():
+    return main.run_stack["users"][0]
+
+
+def database_changes(database):
+    desired = dict(target_database()["settings"], enableDefaultUser=False)
+    changes = {}
+    for field in UPDATABLE_DATABASE_FIELDS + ["enableDefaultUser"]:
+        if field in database and database[field] != desired[field]:
+            changes[field] = desired[field]
+    if database.get('protocol', desired['protocol']) != desired['protocol']:
+        events.log(f"Database {database['databaseId']} uses protocol {database['protocol']}, "
+                   f"which can't be changed in place; leaving it as is.", resource_id=database['databaseId'])
+    return changes
+
+
+def rule_targets(rules):
+    return sorted(
+        (rule.get('ruleName'), str(database.get('subscriptionId')), str(database.get('databaseId')))
+        for rule in rules for database in rule.get('databases', [])
+    )
+
+
+def plan(subscription=None, database=None, role=None, user=None, reset_password=False):
+    # The list of mutations needed to converge, given what currently exists
+    actions = []
+    if subscription is None:
+        actions.append(("create", "subscription", main.run_stack["name"]))
+    if database is None:
+        actions.append(("create", "database", target_database()["name"]))
+    else:
+        changes = database_changes(database)
+        if changes:
+            actions.append(("update", "database", changes))
+    if role is None:
+        actions.append(("create", "role", target_role()["name"]))
+    elif subscription is None or database is None or rule_targets(role.get('redisRules', [])) != rule_targets(
+            main.role_rules(subscription['id'], database['databaseId'], target_role()["rule_name"])):
+        actions.append(("update", "role", target_role()["name"]))
+    if user is None:
+        actions.append(("create", "user", target_user()["name"]))
+    elif user.get('role') != target_role()["name"] or reset_password:
+        actions.append(("update", "user", target_user()["name"]))
+    return actions
+
+
+def find_existing():
+    subscription = next((s for s in list_subscriptions() if s.get('name') == main.run_stack["name"]), None)
+    database = None
+    if subscription is not None:
+        state_cache.get_cache().put(state_cache.subscription_key(subscription['id']), subscription)
+        database = next((d for d in list_databases(subscription['id'])
+                         if d.get('name') == target_database()["name"]), None)
+    role = acl_index.roles().get(target_role()["name"])
+    return subscription, database, role, acl_index.users().get(target_user()["name"])
+
+
+def run_task(response, description):
+    task_url = response['links'][0]['href']
+    main.emit("task_started", f"{description} task started. Task URL: {task_url}",
+              resource_id=task_tracker.task_id_from_url(task_url), task_url=task_url)
+    task_status = main.check_task_status(task_url)
+    main.emit("task_completed", f"{description} task completed successfully.",
+              resource_id=task_status.get('response', {}).get('resourceId'), task=task_status)
+    return task_status
+
+
+def reconcile(dry_run=False, reset_password=False):
+    # Passwords can't be read back, so an existing user keeps its password unless reset_password is set
+    subscription, database, role, user = find_existing()
+    actions = plan(subscription, database, role, user, reset_password)
+    if not actions:
+        main.emit("converged", "Environment already converged; nothing to do.")
+    for action in actions:
+        main.emit("planned", f"Planned: {action[0]} {action[1]}: {action[2]}", action=action[0], kind=action[1],
+                  detail=action[2])
+    if dry_run:
+        return actions, None
+
+    if subscription is None:
+        task_status = run_task(main.create_fixed_subscription(main.run_stack["plan_id"],
+                                                              main.run_stack["payment_method_id"],
+                                                              main.run_stack["name"]),
+                               "Subscription creation")
+        subscription_id = task_status['response']['resourceId']
+    else:
+        subscription_id = subscription['id']
+    main.wait_for_subscription_active(subscription_id)
+
+    if database is None:
+        task_status = run_task(main.create_database(subscription_id, target_database()["name"],
+                                                    target_database()["settings"]), "Database creation")
+        database_id = task_status['response']['resourceId']
+        main.wait_for_database_ready(subscription_id, database_id)
+        main.wait_for_subscription_active(subscription_id)
+        # Anything the create didn't already set (the default user, unless created disabled)
+        changes = database_changes(main.get_database_details(subscription_id, database_id))
+    else:
+        database_id = database['databaseId']
+        changes = database_changes(database)
+    if changes:
+        # Settings drift and disabling the default user go out as one PUT
+        run_task(main.update_database(subscription_id, database_id, changes), "Database update")
+        main.wait_for_subscription_active(subscription_id)
+
+    if role is None:
+        run_task(main.create_role(subscription_id, database_id, target_role()["name"], target_role()["rule_name"]),
+                 "Role creation")
+        main.wait_for_subscription_active(subscription_id)
+    elif ("update", "role", target_role()["name"]) in actions:
+        data = {"name": target_role()["name"],
+                "redisRules": main.role_rules(subscription_id, database_id, target_role()["rule_name"])}
+        run_task(update_acl(f"{main.API_URL_ACL_ROLES}/{role['id']}", data, acl_index.roles()), "Role update")
+        main.wait_for_subscription_active(subscription_id)
+
+    if user is None:
+        run_task(main.create_user(target_role()["name"], target_user()["name"], target_user()["password"]),
+                 "User creation")
+        main.wait_for_subscription_active(subscription_id)
+    elif ("update", "user", target_user()["name"]) in actions:
+        data = {"role": target_role()["name"]}
+        if reset_password:
+            data["password"] = target_user()["password"]
+        run_task(update_acl(f"{main.API_URL_ACL_USERS}/{user['id']}", data, acl_index.users()), "User update")
+        main.wait_for_subscription_active(subscription_id)
+
+    database_details = main.get_database_details(subscription_id, database_id)
+    output = {
+        "subscription_id": subscription_id,
+        "database_id": database_id,
+        "database_url": database_details['publicEndpoint'],
+        "user": target_user()["name"],
+        "password": target_user()["password"]
+    }
+    if user is not None and not reset_password:
+        # The spec's password may not be the one this existing user really has
+        output["password"] = None
+        output["note"] = "existing user kept its password; run with --reset-password to set the spec's"
+    return actions, output
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Create or reuse the stack defined in main.py or REDIS_CLOUD_SPEC")
+    parser.add_argument('--dry-run', action='store_true', help="Only print the mutations that would be issued")
+    parser.add_argument('--reset-password', action='store_true',
+                        help="Set the spec's password on an existing user so the printed credentials are valid")
+    args = parser.parse_args()
+
+    try:
+        main.run_stack = main.load_stack()
+        if any(len(main.run_stack[kind]) != 1 for kind in ("databases", "roles", "users")):
+            raise Exception("reconcile.py manages exactly one database, role and user per stack")
+        actions, output = reconcile(dry_run=args.dry_run, reset_password=args.reset_password)
+        metrics.finish()
+        if output is not None:
+            main.emit("result", json.dumps(output, indent=4), result=output)
+    except Exception as e:
+        main.emit("error", f"Error: {e}", error=str(e))
+    events.flush()
+
+
+if __name__ == '__main__':
+    main_cli()
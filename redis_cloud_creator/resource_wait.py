@@ -0,0 +1,106 @@
+import functools
+import time
+
+from . import api_client, events, polling, state_cache, status_daemon
+
+# Waiting for a subscription or database to become active, for main.py, destroy.py
+# and provision_engine.py alike: the state cache may already have seen it active;
+# with REDIS_CLOUD_STATUS_DAEMON set, the daemon's one poll loop answers for every
+# process waiting on it; otherwise (or when the daemon can't help) the resource is
+# polled with the configured strategy, waiting out 429s.
+# StatusWait makes every decision, so wait_for_status() below and provision_engine's
+# asyncio waits only differ in how they sleep.
+
+API_URL_FIXED_SUBSCRIPTIONS = f'{api_client.API_BASE_URL}/fixed/subscriptions'
+
+SUBSCRIPTION_PENDING_STATUSES = ['pending', 'provisioning']
+DATABASE_PENDING_STATUSES = ['pending', 'provisioning', 'draft']
+
+
+class StatusWait:
+    def __init__(self, url, key, kind, pending_statuses, resource_id=None, daemon_wait=None, strategy=None,
+                 **fields):
+        self.url = url
+        self.key = key
+        self.kind = kind
+        self.pending_statuses = pending_statuses
+        self.resource_id = resource_id
+        self.daemon_wait = daemon_wait
+        # Extra event fields, e.g. the stack a teardown reports under
+        self.fields = fields
+        self.poller = polling.Poller(kind, strategy)
+
+    def cached(self):
+        return state_cache.get_cache().get(self.key, 'active')
+
+    @property
+    def delegated(self):
+        return self.daemon_wait is not None and bool(status_daemon.DAEMON_URL)
+
+    def from_daemon(self):
+        # Blocks until the daemon sees it active; None when the caller has to poll itself
+        resource = self.daemon_wait()
+        if resource is not None:
+            state_cache.get_cache().put(self.key, resource)
+        return resource
+
+    def first_delay(self):
+        return self.poller.first_delay()
+
+    def handle(self, response):
+        # (resource, None) once it is active, else (None, seconds until the next poll);
+        # raises when it can't become active
+        if response.status_code == 429:
+            return None, self.poller.next_delay(response)
+        if response.status_code != 200:
+            response.raise_for_status()
+        resource = response.json()
+        state_cache.get_cache().put(self.key, resource)
+        status = resource.get('status')
+        if status == 'active':
+            self.poller.done()
+            return resource, None
+        if status not in self.pending_statuses:
+            raise Exception(f"{self.kind.capitalize()} cannot become active. Current status: {status}")
+        events.emit(f"{self.kind}_status", f"{self.kind.capitalize()} status: {status}. "
+                    f"Waiting for it to become active...", resource_id=self.resource_id, status=status, **self.fields)
+        return None, self.poller.next_delay(response)
+
+
+def wait_for_status(wait):
+    # The resource once it is active, sleeping this thread between polls
+    resource = wait.cached()
+    if resource is None and wait.delegated:
+        resource = wait.from_daemon()
+    if resource is not None:
+        return resource
+    delay = wait.first_delay()
+    while True:
+        if delay:
+            time.sleep(delay)
+        resource, delay = wait.handle(api_client.get(wait.url))
+        if resource is not None:
+            return resource
+
+
+def subscription_wait(subscription_id, strategy=None, **fields):
+    return StatusWait(f"{API_URL_FIXED_SUBSCRIPTIONS}/{subscription_id}",
+                      state_cache.subscription_key(subscription_id), 'subscription', SUBSCRIPTION_PENDING_STATUSES,
+                      subscription_id, functools.partial(status_daemon.wait_for_subscription_active, subscription_id),
+                      strategy, **fields)
+
+
+def database_wait(subscription_id, database_id, strategy=None, **fields):
+    return StatusWait(f"{API_URL_FIXED_SUBSCRIPTIONS}/{subscription_id}/databases/{database_id}",
+                      state_cache.database_key(subscription_id, database_id), 'database', DATABASE_PENDING_STATUSES,
+                      database_id,
+                      functools.partial(status_daemon.wait_for_database_ready, subscription_id, database_id),
+                      strategy, **fields)
+
+
+def wait_for_subscription_active(subscription_id, **fields):
+    return wait_for_status(subscription_wait(subscription_id, **fields))
+
+
+def wait_for_database_ready(subscription_id, database_id, **fields):
+    return wait_for_status(database_wait(subscription_id, database_id, **fields))
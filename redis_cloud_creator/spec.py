@@ -0,0 +1,227 @@
+import json
+import os
+
+# Declarative description of what to provision: N subscriptions, each with M
+# databases, the ACL roles that grant access to them and the users holding
+# those roles. load() reads JSON, TOML or YAML (PyYAML is only needed for YAML),
+# validates the whole file in one pass and compiles it into a Plan: a list of
+# normalized stacks that main.py, provision_engine.py and reconcile.py execute.
+#
+#   defaults:
+#     plan_id: 21113
+#     payment_method_id: 25346
+#     database: {dataPersistence: aof-every-1-second, ...}
+#   subscriptions:
+#     - name: Essentials - Gabs CF
+#       databases:
+#         - name: gabs-fixed-database-example
+#           settings: {dataEvictionPolicy: allkeys-lru}
+#       roles:
+#         - name: bart-via-api
+#           databases: [gabs-fixed-database-example]   # default: every database
+#       users:
+#         - name: bart-via-api
+#           role: bart-via-api
+#           password_env: BART_PASSWORD                 # or password: ...
+
+PROTOCOLS = {'redis', 'memcached', 'stack'}
+DATA_PERSISTENCE = {'none', 'aof-every-1-second', 'aof-every-write', 'snapshot-every-1-hour',
+                    'snapshot-every-6-hours', 'snapshot-every-12-hours'}
+EVICTION_POLICIES = {'allkeys-lru', 'allkeys-lfu', 'allkeys-random', 'volatile-lru', 'volatile-lfu',
+                     'volatile-random', 'volatile-ttl', 'noeviction'}
+DEFAULT_RULE_NAME = "Full-Access"
+
+
+class SpecError(ValueError):
+    # Raised with every problem found, not just the first one
+    def __init__(self, errors, source=None):
+        self.errors = errors
+        self.source = source
+        where = f" in {source}" if source else ""
+        super().__init__(f"{len(errors)} problem(s){where}:\n" + "\n".join(f"  {error}" for error in errors))
+
+
+def read_file(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.json':
+        with open(path) as f:
+            return json.load(f)
+    if extension == '.toml':
+        import tomllib
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    if extension in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise SpecError(["PyYAML is required for YAML specs (pip install pyyaml)"], path)
+        with open(path) as f:
+            # The C loader is an order of magnitude faster on large specs
+            return yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+    raise SpecError([f"unsupported spec format {extension!r}; use .json, .toml, .yaml or .yml"], path)
+
+
+class _Checker:
+    def __init__(self):
+        self.errors = []
+
+    def error(self, path, message):
+        self.errors.append(f"{path}: {message}")
+
+    def mapping(self, value, path):
+        if not isinstance(value, dict):
+            self.error(path, f"expected a mapping, got {type(value).__name__}")
+            return {}
+        return value
+
+    def items(self, value, path):
+        if value is None:
+            return []
+        if not isinstance(value, list):
+            self.error(path, f"expected a list, got {type(value).__name__}")
+            return []
+        return value
+
+    def name(self, entry, path):
+        name = entry.get('name')
+        if not isinstance(name, str) or not name.strip():
+            self.error(f"{path}.name", "a non-empty string is required")
+            return None
+        return name
+
+    def integer(self, value, path):
+        if isinstance(value, bool) or not isinstance(value, int):
+            self.error(path, f"expected an integer, got {value!r}")
+        return value
+
+    def settings(self, settings, path):
+        settings = self.mapping(settings, path)
+        for key, allowed in (('protocol', PROTOCOLS), ('dataPersistence', DATA_PERSISTENCE),
+                             ('dataEvictionPolicy', EVICTION_POLICIES)):
+            if key in settings and settings[key] not in allowed:
+                self.error(f"{path}.{key}", f"{settings[key]!r} is not one of {sorted(allowed)}")
+        for key in ('replication', 'enableTls'):
+            if key in settings and not isinstance(settings[key], bool):
+                self.error(f"{path}.{key}", "expected true or false")
+        for i, alert in enumerate(self.items(settings.get('alerts'), f"{path}.alerts")):
+            alert = self.mapping(alert, f"{path}.alerts[{i}]")
+            if 'name' not in alert or 'value' not in alert:
+                self.error(f"{path}.alerts[{i}]", "alerts need a name and a value")
+        return settings
+
+
+def compile_spec(data, source=None, database_settings=None, environ=os.environ):
+    # Validates data (a parsed spec) and returns its Plan; raises SpecError listing every problem
+    check = _Checker()
+    data = check.mapping(data, "spec")
+    defaults = check.mapping(data.get('defaults', {}), "defaults")
+    default_settings = dict(database_settings or {})
+    default_settings.update(check.settings(defaults.get('database', {}), "defaults.database"))
+
+    stacks = []
+    subscription_names = set()
+    role_names = set()
+    user_names = set()
+    for s, subscription in enumerate(check.items(data.get('subscriptions'), "subscriptions")):
+        path = f"subscriptions[{s}]"
+        subscription = check.mapping(subscription, path)
+        name = check.name(subscription, path)
+        if name is not None and name in subscription_names:
+            check.error(f"{path}.name", f"duplicate subscription {name!r}")
+        subscription_names.add(name)
+        stack = {
+            "name": name,
+            "plan_id": check.integer(subscription.get('plan_id', defaults.get('plan_id')), f"{path}.plan_id"),
+            "payment_method_id": check.integer(subscription.get('payment_method_id',
+                                                                defaults.get('payment_method_id')),
+                                               f"{path}.payment_method_id"),
+            "databases": [],
+            "roles": [],
+            "users": []
+        }
+
+        database_names = set()
+        for d, database in enumerate(check.items(subscription.get('databases'), f"{path}.databases")):
+            database_path = f"{path}.databases[{d}]"
+            database = check.mapping(database, database_path)
+            database_name = check.name(database, database_path)
+            if database_name is not None and database_name in database_names:
+                check.error(f"{database_path}.name", f"duplicate database {database_name!r} in {name!r}")
+            database_names.add(database_name)
+            settings = dict(default_settings)
+            settings.update(check.settings(database.get('settings', {}), f"{database_path}.settings"))
+            stack["databases"].append({"name": database_name, "settings": settings})
+        if not stack["databases"]:
+            check.error(f"{path}.databases", "at least one database is required")
+
+        for r, role in enumerate(check.items(subscription.get('roles'), f"{path}.roles")):
+            role_path = f"{path}.roles[{r}]"
+            role = check.mapping(role, role_path)
+            role_name = check.name(role, role_path)
+            # ACL roles and users are account-wide, so names must be unique across the whole spec
+            if role_name is not None and role_name in role_names:
+                check.error(f"{role_path}.name", f"duplicate role {role_name!r}")
+            role_names.add(role_name)
+            every_database = [database["name"] for database in stack["databases"]]
+            targets = check.items(role.get('databases', every_database), f"{role_path}.databases")
+            for target in targets:
+                if target not in database_names:
+                    check.error(f"{role_path}.databases", f"unknown database {target!r} in {name!r}")
+            stack["roles"].append({"name": role_name, "rule_name": role.get('rule', DEFAULT_RULE_NAME),
+                                   "databases": list(targets)})
+
+        stack_roles = {role["name"] for role in stack["roles"]}
+        for u, user in enumerate(check.items(subscription.get('users'), f"{path}.users")):
+            user_path = f"{path}.users[{u}]"
+            user = check.mapping(user, user_path)
+            user_name = check.name(user, user_path)
+            if user_name is not None and user_name in user_names:
+                check.error(f"{user_path}.name", f"duplicate user {user_name!r}")
+            user_names.add(user_name)
+            if user.get('role') not in stack_roles:
+                check.error(f"{user_path}.role", f"{user.get('role')!r} is not a role of {name!r}")
+            password = user.get('password')
+            if 'password_env' in user:
+                password = environ.get(user['password_env'])
+                if password is None:
+                    check.error(f"{user_path}.password_env", f"{user['password_env']} is not set in the environment")
+            elif not isinstance(password, str) or not password:
+                check.error(f"{user_path}", "password or password_env is required")
+            stack["users"].append({"name": user_name, "role": user.get('role'), "password": password})
+        stacks.append(stack)
+
+    if not stacks and not check.errors:
+        check.error("subscriptions", "at least one subscription is required")
+    if check.errors:
+        raise SpecError(check.errors, source)
+    return Plan(stacks, source)
+
+
+def load(path, **kwargs):
+    return compile_spec(read_file(path), source=path, **kwargs)
+
+
+class Plan:
+    # A validated spec, ready to execute any number of times
+    def __init__(self, stacks, source=None):
+        self.stacks = stacks
+        self.source = source
+
+    def __len__(self):
+        return len(self.stacks)
+
+    def __iter__(self):
+        return iter(self.stacks)
+
+    def counts(self):
+        return {
+            "subscriptions": len(self.stacks),
+            "databases": sum(len(stack["databases"]) for stack in self.stacks),
+            "roles": sum(len(stack["roles"]) for stack in self.stacks),
+            "users": sum(len(stack["users"]) for stack in self.stacks)
+        }
+
+
+def fingerprint(stack):
+    # The stack without secrets: what a journal records to recognise its run
+    return dict(stack, users=[{"name": user["name"], "role": user["role"]} for user in stack["users"]])
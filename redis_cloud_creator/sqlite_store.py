@@ -0,0 +1,57 @@
+import contextlib
+import sqlite3
+import threading
+
+# One SQLite file shared by every process on the machine (metadata_cache.py,
+# warm_pool.py, work_queue.py). Writes go through one connection in autocommit mode,
+# used from any thread under an in-process lock; transaction() takes SQLite's write
+# lock (BEGIN IMMEDIATE) and holds both for its whole body, so a read-then-write inside
+# it is atomic across threads and processes. Reads go through a second connection and
+# see committed rows only, so with WAL they never wait for a transaction in progress.
+# A writer that waits longer than timeout, in this process or another, gets
+# sqlite3.OperationalError ("database is locked").
+
+
+class Store:
+    def __init__(self, path, schema=(), timeout=30, wal=True):
+        self.path = path
+        self.timeout = timeout
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        if wal:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        for statement in schema:
+            self.conn.execute(statement)
+        self._read_lock = threading.Lock()
+        self._reader = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+
+    def execute(self, sql, *params):
+        # Every row of a SELECT, from committed data
+        with self._read_lock:
+            return self._reader.execute(sql, params).fetchall()
+
+    def update(self, sql, *params):
+        # Number of rows changed
+        with self._writing():
+            return self.conn.execute(sql, params).rowcount
+
+    @contextlib.contextmanager
+    def transaction(self):
+        with self._writing():
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    @contextlib.contextmanager
+    def _writing(self):
+        # Another thread's transaction gets the same patience as another process's
+        if not self.lock.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError("database is locked")
+        try:
+            yield
+        finally:
+            self.lock.release()
@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+
+from . import task_tracker
+
+# Last known state of subscriptions and databases, written by GET responses and
+# task completions. Waits are answered from here while the entry is fresh and no
+# mutating call has touched it since.
+#
+# Database and subscription mutations drop the affected entries, so the next wait
+# goes back to the API. So do ACL role/user mutations by default: nothing guarantees
+# the subscription stays active while the account applies them. With
+# REDIS_CLOUD_STATE_CACHE_ACL_SAFE=1 (opt-in, for accounts where ACL changes are
+# known not to touch the subscription) they only hold the cached subscription
+# states until their task completes, and the "active" seen before the call is
+# served again once the task reports done.
+
+STATE_CACHE_TTL = float(os.getenv('REDIS_CLOUD_STATE_CACHE_TTL', '60'))
+ACL_TASKS_KEEP_STATE = os.getenv('REDIS_CLOUD_STATE_CACHE_ACL_SAFE', '0') == '1'
+
+
+def subscription_key(subscription_id):
+    return ('subscription', str(subscription_id))
+
+
+def database_key(subscription_id, database_id):
+    return ('database', str(subscription_id), str(database_id))
+
+
+class StateCache:
+    def __init__(self, ttl=STATE_CACHE_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.avoided_gets = 0
+        self._clock = clock
+        self._entries = {}
+        self._held = {}
+        self._lock = threading.Lock()
+
+    def put(self, key, state):
+        with self._lock:
+            self._entries[key] = {"state": state, "fetched": self._clock(), "held_by": set()}
+
+    def get(self, key, status=None):
+        # Returns the cached state if it is fresh, not held and (optionally) in the given status
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["held_by"]:
+                return None
+            if self._clock() - entry["fetched"] > self.ttl:
+                del self._entries[key]
+                return None
+            if status is not None and entry["state"].get('status') != status:
+                return None
+            self.avoided_gets += 1
+            return entry["state"]
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def invalidate_subscription(self, subscription_id):
+        sid = str(subscription_id)
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == sid]:
+                del self._entries[key]
+
+    def invalidate_all(self):
+        with self._lock:
+            self._entries.clear()
+
+    def hold(self, task_url):
+        # Used by ACL mutations: keep cached subscription states, but don't serve
+        # them until the task behind task_url has completed
+        if not ACL_TASKS_KEEP_STATE:
+            self.invalidate_all()
+            return
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == 'subscription']
+            for key in keys:
+                self._entries[key]["held_by"].add(task_url)
+            self._held[task_url] = keys
+
+    def task_completed(self, task_url, task_status):
+        with self._lock:
+            for key in self._held.pop(task_url, []):
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry["held_by"].discard(task_url)
+
+    def task_failed(self, task_url):
+        # A failed ACL task leaves the account in an unknown state
+        with self._lock:
+            for key in self._held.pop(task_url, []):
+                self._entries.pop(key, None)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = StateCache()
+            task_tracker.add_listener(_on_task_done)
+        return _cache
+
+
+def _on_task_done(task_url, task_status, error):
+    if error is None:
+        _cache.task_completed(task_url, task_status)
+    else:
+        _cache.task_failed(task_url)
@@ -0,0 +1,496 @@
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import api_client, credentials, events, metrics, polling, task_tracker
+
+# Long-running status daemon: one poll loop watches every subscription, database
+# and task that anyone has asked about, and a local HTTP API answers "what is its
+# state" and "wait until it is active" from what that loop saw. However many CI
+# jobs wait on the same resources, upstream sees one listing per account per tick:
+# GET /fixed/subscriptions covers every watched subscription, one
+# GET /fixed/subscriptions/{id}/databases covers that subscription's databases and
+# GET /tasks covers the tasks (anything missing from a listing is fetched on its own).
+#
+#   GET /state                                    every watch and the loop's counters
+#   GET /subscriptions/{id}                       last known state (first query waits for a poll)
+#   GET /subscriptions/{id}/databases/{id}
+#   GET /tasks/{id}
+#   ...?wait=active&timeout=30                    hold until a poll made after the request sees
+#                                                 that status, or a status it can no longer leave
+#   ...?credential=NAME                           the key to watch it with (see credentials.py)
+#
+# A wait is only answered from a poll issued after it arrived, so a caller that has
+# just changed a resource never gets the "active" from before its change.
+# Clients: set REDIS_CLOUD_STATUS_DAEMON=http://127.0.0.1:8790 and every wait goes
+# through the daemon (resource_wait.py's subscription and database waits and
+# task_tracker's task waits), falling back to polling directly if it can't be reached
+# or its own upstream poll fails (connection error, 401/403, 5xx), which then raises as before.
+
+API_URL_FIXED_SUBSCRIPTIONS = f'{api_client.API_BASE_URL}/fixed/subscriptions'
+
+DAEMON_URL = os.getenv('REDIS_CLOUD_STATUS_DAEMON')
+DAEMON_HOST = os.getenv('REDIS_CLOUD_STATUS_DAEMON_HOST', '127.0.0.1')
+DAEMON_PORT = int(os.getenv('REDIS_CLOUD_STATUS_DAEMON_PORT', '8790'))
+# Poll spacing while someone waits or a watched resource is in transition, and otherwise
+STATUS_INTERVAL = float(os.getenv('REDIS_CLOUD_STATUS_INTERVAL', '2'))
+STATUS_IDLE_INTERVAL = float(os.getenv('REDIS_CLOUD_STATUS_IDLE_INTERVAL', '30'))
+# Seconds a watch outlives its last query, and the longest a single wait request is held
+WATCH_TTL = float(os.getenv('REDIS_CLOUD_STATUS_WATCH_TTL', '600'))
+WAIT_HOLD = float(os.getenv('REDIS_CLOUD_STATUS_WAIT_HOLD', '30'))
+
+PENDING_STATUSES = {
+    'subscription': ['pending', 'provisioning'],
+    'database': ['pending', 'provisioning', 'draft'],
+    'task': task_tracker.TASK_PENDING_STATUSES
+}
+
+
+def task_key(task_id):
+    return ('task', str(task_id))
+
+
+class Watch:
+    def __init__(self, key, credential, now):
+        self.key = key
+        self.credential = credential
+        self.state = None
+        self.missing = False
+        self.error = None
+        # Monotonic time the GET behind self.state was issued, and the one behind self.error
+        self.polled = None
+        self.failed = None
+        self.queried = now
+        self.waiters = 0
+        self.discovered = False
+
+    @property
+    def kind(self):
+        return self.key[0]
+
+    def status(self):
+        return None if self.state is None else self.state.get('status')
+
+    def settled(self, status=None):
+        # Nothing more to wait for: gone, in the wanted status, or in one it won't leave by itself
+        if self.missing:
+            return True
+        if self.state is None:
+            return False
+        if status is None:
+            return True
+        return self.status() == status or self.status() not in PENDING_STATUSES[self.kind]
+
+    def in_transition(self):
+        return not self.missing and (self.state is None or self.status() in PENDING_STATUSES[self.kind])
+
+
+class StatusDaemon:
+    def __init__(self, interval=STATUS_INTERVAL, idle_interval=STATUS_IDLE_INTERVAL, watch_ttl=WATCH_TTL,
+                 watch_all=False, clock=time.monotonic):
+        self.interval = interval
+        self.idle_interval = idle_interval
+        self.watch_ttl = watch_ttl
+        self.watch_all = watch_all
+        self.upstream_gets = 0
+        self.queries = 0
+        self.polls = 0
+        self._clock = clock
+        self._watches = {}
+        self._last_poll = None
+        # credential name -> monotonic time before which that key's account is not polled
+        self._hold_until = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="status-daemon", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def query(self, key, wait=None, timeout=WAIT_HOLD, credential=None):
+        # The watch's view of key once it is settled (see Watch.settled) or timeout runs out;
+        # with wait, only a poll issued after this call counts
+        arrived = self._clock()
+        deadline = arrived + timeout
+        with self._cond:
+            self.queries += 1
+            watch = self._watches.get(key)
+            if watch is None:
+                watch = self._watches[key] = Watch(key, credential or credentials.get(), arrived)
+            watch.queried = arrived
+            watch.waiters += 1
+            # Wake the loop: it may owe this watch a poll now
+            self._cond.notify_all()
+            try:
+                while True:
+                    fresh = watch.polled is not None and (wait is None or watch.polled >= arrived)
+                    if fresh and watch.settled(wait):
+                        return self._view(watch, wait)
+                    if watch.error is not None and watch.failed >= arrived:
+                        # Upstream refused or failed the poll made for this query; the client decides
+                        return self._view(watch, wait)
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        return self._view(watch, wait, timed_out=True)
+                    self._cond.wait(remaining)
+            finally:
+                watch.waiters -= 1
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "watches": [self._view(watch) for watch in self._watches.values()],
+                "stats": {"watches": len(self._watches), "queries": self.queries, "polls": self.polls,
+                          "upstream_gets": self.upstream_gets}
+            }
+
+    def _view(self, watch, wait=None, timed_out=False):
+        return {
+            "kind": watch.kind,
+            "id": "/".join(watch.key[1:]),
+            "status": watch.status(),
+            "ready": wait is not None and watch.status() == wait and not timed_out,
+            "settled": watch.settled(wait) and not timed_out,
+            "missing": watch.missing,
+            "error": watch.error,
+            "age": None if watch.polled is None else round(self._clock() - watch.polled, 3),
+            "credential": watch.credential.name,
+            "state": watch.state
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._cond:
+                now = self._clock()
+                self._expire(now)
+                next_poll = self._next_poll(now)
+                if next_poll is None or next_poll > now:
+                    self._cond.wait(None if next_poll is None else next_poll - now)
+                    continue
+                self._last_poll = now
+                groups = {}
+                for watch in self._watches.values():
+                    # Settled watches nobody is waiting on only need the idle cadence
+                    due = watch.waiters or watch.in_transition() or now - watch.polled >= self.idle_interval
+                    if due and self._hold_until.get(watch.credential.name, 0) <= now:
+                        groups.setdefault(watch.credential, []).append(watch)
+                if self.watch_all:
+                    for credential in credentials.all_credentials():
+                        if self._hold_until.get(credential.name, 0) <= now:
+                            groups.setdefault(credential, [])
+                self.polls += 1
+            for credential, watches in groups.items():
+                with credentials.use(credential):
+                    try:
+                        self._poll_account(credential, watches)
+                    except Exception as e:
+                        events.emit("error", f"Error: {e}", error=str(e), credential=credential.name)
+                with self._cond:
+                    self._cond.notify_all()
+
+    def _next_poll(self, now):
+        if not self._watches and not self.watch_all:
+            return None
+        if self._last_poll is None:
+            return now
+        busy = any(watch.waiters or watch.in_transition() for watch in self._watches.values())
+        return self._last_poll + (self.interval if busy else self.idle_interval)
+
+    def _expire(self, now):
+        for key in [key for key, watch in self._watches.items()
+                    if not watch.waiters and not watch.discovered and now - watch.queried > self.watch_ttl]:
+            del self._watches[key]
+
+    def _poll_account(self, credential, watches):
+        # One listing per resource type (and per subscription for databases) covers every watch
+        started = self._clock()
+        remaining = {watch.key: watch for watch in watches}
+
+        subscriptions = [watch for watch in watches if watch.kind == 'subscription']
+        if subscriptions or self.watch_all:
+            listing = self._fetch(API_URL_FIXED_SUBSCRIPTIONS)
+            if listing is not None:
+                found = {str(subscription.get('id')): subscription
+                         for subscription in listing.get('subscriptions', [])}
+                if self.watch_all:
+                    with self._cond:
+                        for sid in found:
+                            key = ('subscription', sid)
+                            if key not in self._watches:
+                                self._watches[key] = Watch(key, credential, started)
+                                self._watches[key].discovered = True
+                                remaining[key] = self._watches[key]
+                        # Deleted since the last listing
+                        for key, watch in list(self._watches.items()):
+                            if watch.discovered and watch.credential is credential and key[1] not in found:
+                                del self._watches[key]
+                                remaining.pop(key, None)
+                for key, watch in list(remaining.items()):
+                    if watch.kind == 'subscription' and key[1] in found:
+                        self._update(remaining.pop(key), found[key[1]], started)
+
+        by_subscription = {}
+        for watch in watches:
+            if watch.kind == 'database':
+                by_subscription.setdefault(watch.key[1], []).append(watch)
+        for sid, databases in by_subscription.items():
+            listing = self._fetch(f"{API_URL_FIXED_SUBSCRIPTIONS}/{sid}/databases")
+            if listing is not None:
+                found = {str(database.get('databaseId')): database
+                         for database in listing.get('subscription', {}).get('databases', [])}
+                for watch in databases:
+                    if watch.key[2] in found:
+                        self._update(remaining.pop(watch.key), found[watch.key[2]], started)
+
+        tasks = [watch for watch in watches if watch.kind == 'task']
+        if len(tasks) >= task_tracker.BATCH_THRESHOLD:
+            listing = self._fetch(task_tracker.API_URL_TASKS)
+            if isinstance(listing, dict):
+                listing = listing.get('tasks', [])
+            found = {str(task.get('taskId')): task for task in listing or []}
+            for watch in tasks:
+                if watch.key[1] in found:
+                    self._update(remaining.pop(watch.key), found[watch.key[1]], started)
+
+        # Whatever the listings didn't answer for is fetched on its own
+        for key, watch in remaining.items():
+            if watch.discovered:
+                continue
+            if watch.kind == 'task':
+                url = f"{task_tracker.API_URL_TASKS}/{key[1]}"
+            else:
+                url = f"{API_URL_FIXED_SUBSCRIPTIONS}/{'/databases/'.join(key[1:])}"
+            state = self._fetch(url, watch)
+            if state is not None:
+                self._update(watch, state, started)
+
+    def _fetch(self, url, watch=None):
+        # The JSON body, or None (with the watch's error/missing flag set) when there is none
+        self.upstream_gets += 1
+        try:
+            response = api_client.get(url)
+        except Exception as e:
+            if watch is not None:
+                self._fail(watch, str(e))
+            return None
+        delay = polling.server_delay(response)
+        if delay:
+            name = credentials.current().name
+            with self._cond:
+                self._hold_until[name] = max(self._hold_until.get(name, 0), self._clock() + delay)
+        if response.status_code == 200:
+            return response.json()
+        if watch is not None:
+            with self._cond:
+                if response.status_code == 404:
+                    watch.missing = True
+                    watch.polled = self._clock()
+                    watch.error = None
+                    self._cond.notify_all()
+                elif response.status_code != 429:
+                    # A 429 is just held off above; anything else is handed to the waiters
+                    self._fail(watch, f"HTTP {response.status_code}")
+        return None
+
+    def _fail(self, watch, error):
+        with self._cond:
+            watch.error = error
+            watch.failed = self._clock()
+            self._cond.notify_all()
+
+    def _update(self, watch, state, polled):
+        with self._cond:
+            previous = watch.status()
+            watch.state = state
+            watch.polled = polled
+            watch.missing = False
+            watch.error = None
+            self._cond.notify_all()
+        if state.get('status') != previous:
+            events.emit(f"{watch.kind}_status", f"{watch.kind.capitalize()} {'/'.join(watch.key[1:])}: "
+                        f"{state.get('status')}", resource_id=watch.key[-1], status=state.get('status'))
+
+
+class StatusHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    routes = [
+        (r'/state', None),
+        (r'/subscriptions/(?P<sid>\d+)', lambda sid: ('subscription', sid)),
+        (r'/subscriptions/(?P<sid>\d+)/databases/(?P<did>\d+)', lambda sid, did: ('database', sid, did)),
+        (r'/tasks/(?P<task_id>[^/]+)', task_key)
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parts = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(parts.query))
+        daemon = self.server.status
+        for pattern, route_key in self.routes:
+            match = re.fullmatch(pattern, parts.path.rstrip('/'))
+            if match:
+                break
+        else:
+            self.send_json(404, {"error": f"No route for {parts.path}"})
+            return
+        if route_key is None:
+            self.send_json(200, daemon.snapshot())
+            return
+        try:
+            credential = credentials.get(params.get('credential'))
+            timeout = min(float(params.get('timeout', WAIT_HOLD)), WAIT_HOLD)
+        except (KeyError, ValueError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        view = daemon.query(route_key(**match.groupdict()), params.get('wait'), timeout, credential)
+        self.send_json(404 if view["missing"] else 200, view)
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StatusServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many CI jobs may open their wait at the same moment
+    request_queue_size = 128
+
+    def __init__(self, address, status=None):
+        super().__init__(address, StatusHandler)
+        self.status = status or StatusDaemon()
+        self.url = f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def shutdown(self):
+        self.status.stop()
+        super().shutdown()
+
+
+def start_status_server(host=DAEMON_HOST, port=DAEMON_PORT, status=None):
+    server = StatusServer((host, port), status)
+    server.status.start()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+# Client side, used by resource_wait.py and task_tracker.py when REDIS_CLOUD_STATUS_DAEMON is set
+
+_local = threading.local()
+_unreachable_reported = False
+
+
+def _session():
+    # Each waiting thread holds its own connection: a long-poll would block a shared one
+    if getattr(_local, 'session', None) is None:
+        from . import stdlib_http
+        _local.session = stdlib_http.Session()
+    return _local.session
+
+
+def query(path, wait=None, timeout=WAIT_HOLD, url=None):
+    params = {"credential": credentials.current().name, "timeout": timeout}
+    if wait is not None:
+        params["wait"] = wait
+    return _session().request('GET', f"{url or DAEMON_URL}{path}?{urllib.parse.urlencode(params)}",
+                              timeout=timeout + api_client.CONNECT_TIMEOUT)
+
+
+def wait_until(kind, path, resource_id, status='active', url=None):
+    # The resource's state once the daemon sees it in status, raising as main.py's own
+    # wait loops do; None when the daemon can't be reached or its upstream poll failed
+    # (bad key, outage), so the caller polls itself and raises that error as it always has
+    global _unreachable_reported
+    started = time.monotonic()
+    rounds = 0
+    last_status = None
+    while True:
+        try:
+            response = query(path, status, url=url)
+        except OSError as e:
+            if not _unreachable_reported:
+                _unreachable_reported = True
+                events.log(f"Status daemon at {url or DAEMON_URL} is unreachable ({e}); polling directly")
+            return None
+        rounds += 1
+        if response.status_code != 200:
+            events.api_error(f"Failed to wait for {kind} {resource_id}", response)
+            response.raise_for_status()
+        view = response.json()
+        if view["error"] is not None:
+            events.log(f"Status daemon could not poll {kind} {resource_id} ({view['error']}); polling directly")
+            return None
+        if view["ready"]:
+            metrics.record_wait(f"{kind} (daemon)", time.monotonic() - started, rounds, 0.0)
+            return view["state"]
+        if view["settled"]:
+            if kind == 'task' and view["status"] == 'processing-error':
+                # Same error as task_tracker's own polling
+                raise task_tracker.TaskFailed(task_tracker.task_error(view["state"]))
+            raise Exception(f"{kind.capitalize()} cannot become {status}. Current status: {view['status']}")
+        if view["status"] != last_status and view["status"] is not None:
+            last_status = view["status"]
+            events.emit(f"{kind}_status", f"{kind.capitalize()} status: {last_status}. "
+                        f"Waiting for it to become {status}...", resource_id=resource_id, status=last_status)
+
+
+def wait_for_subscription_active(subscription_id, url=None):
+    return wait_until('subscription', f"/subscriptions/{subscription_id}", subscription_id, url=url)
+
+
+def wait_for_database_ready(subscription_id, database_id, url=None):
+    return wait_until('database', f"/subscriptions/{subscription_id}/databases/{database_id}", database_id,
+                      url=url)
+
+
+def wait_for_task(task_url, url=None):
+    task_id = task_tracker.task_id_from_url(task_url)
+    return wait_until('task', f"/tasks/{task_id}", task_id, status='processing-completed', url=url)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Watch subscriptions, databases and tasks from one poll loop "
+                                                 "and serve their state to local clients")
+    parser.add_argument('--host', default=DAEMON_HOST)
+    parser.add_argument('--port', type=int, default=DAEMON_PORT)
+    parser.add_argument('--interval', type=float, default=STATUS_INTERVAL,
+                        help="Seconds between polls while something is waited on or in transition")
+    parser.add_argument('--idle-interval', type=float, default=STATUS_IDLE_INTERVAL,
+                        help="Seconds between polls when everything watched is settled")
+    parser.add_argument('--watch-all', action='store_true',
+                        help="Also track every subscription on the account(s), not only those asked about")
+    args = parser.parse_args(argv)
+
+    status = StatusDaemon(interval=args.interval, idle_interval=args.idle_interval, watch_all=args.watch_all)
+    server = start_status_server(args.host, args.port, status)
+    events.log(f"Status daemon listening on {server.url}")
+    events.log(f"Use it with: REDIS_CLOUD_STATUS_DAEMON={server.url}")
+    events.flush()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    server.shutdown()
+    events.flush()
+
+
+if __name__ == '__main__':
+    main_cli()
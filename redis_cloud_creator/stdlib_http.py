@@ -0,0 +1,89 @@
+import http.client
+import json as jsonlib
+import threading
+import urllib.parse
+
+# Minimal stand-in for requests.Session built on http.client, for short read-only
+# invocations (cli.py status/list) where importing requests costs more than the
+# calls themselves. Keeps one keep-alive connection per host and returns objects
+# with the parts of requests.Response that api_client's callers use.
+
+
+class HTTPError(OSError):
+    def __init__(self, message, response=None):
+        super().__init__(message)
+        self.response = response
+
+
+class Response:
+    def __init__(self, url, status_code, headers, content):
+        self.url = url
+        self.status_code = status_code
+        # http.client.HTTPMessage: case-insensitive get(), like requests' headers
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return jsonlib.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            kind = "Client" if self.status_code < 500 else "Server"
+            raise HTTPError(f"{self.status_code} {kind} Error for url: {self.url}", response=self)
+
+
+class Session:
+    def __init__(self):
+        self.headers = {}
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def _connection(self, scheme, netloc, timeout):
+        connection = self._connections.get((scheme, netloc))
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            connection = connection_class(netloc, timeout=timeout)
+            self._connections[(scheme, netloc)] = connection
+        return connection
+
+    def request(self, method, url, json=None, headers=None, timeout=None):
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        if isinstance(timeout, tuple):
+            # (connect, read) as requests takes it; http.client has a single socket timeout
+            timeout = max(timeout)
+        request_headers = dict(self.headers, **(headers or {}))
+        body = None
+        if json is not None:
+            body = jsonlib.dumps(json).encode()
+            request_headers['Content-Type'] = 'application/json'
+        with self._lock:
+            for attempt in range(2):
+                connection = self._connection(parts.scheme, parts.netloc, timeout)
+                try:
+                    connection.request(method, path, body=body, headers=request_headers)
+                    response = connection.getresponse()
+                    content = response.read()
+                    break
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    # The server dropped an idle keep-alive connection; reads are retried once on a fresh one
+                    connection.close()
+                    del self._connections[(parts.scheme, parts.netloc)]
+                    if attempt or method.upper() not in ('GET', 'HEAD'):
+                        raise
+                except BaseException:
+                    # A connection left mid-request (refused, timed out) can't send another one
+                    connection.close()
+                    del self._connections[(parts.scheme, parts.netloc)]
+                    raise
+        return Response(url, response.status, response.headers, content)
+
+    def close(self):
+        with self._lock:
+            for connection in self._connections.values():
+                connection.close()
+            self._connections.clear()
@@ -0,0 +1,305 @@
+import threading
+import time
+from concurrent.futures import Future
+
+from . import api_client, credentials, events, metrics, polling
+
+# One scheduler thread polls every outstanding task URL on a shared cadence.
+# With several tasks in flight it fetches the account task list (GET /tasks)
+# once per tick instead of issuing one GET per task. Poll spacing comes from
+# the polling strategy, learned per commandType, and server hints pause the whole loop.
+# Tasks are polled with the credential that registered them (each key sees only
+# its own account's tasks), so the batched listing is made once per key.
+
+API_URL_TASKS = f'{api_client.API_BASE_URL}/tasks'
+
+BATCH_THRESHOLD = 2
+
+TASK_PENDING_STATUSES = ['received', 'processing', 'processing-in-progress']
+
+
+_listeners = []
+
+
+class TaskFailed(Exception):
+    # The API reported the task as failed (as opposed to us failing to reach it)
+    pass
+
+
+def add_listener(listener):
+    # listener(task_url, task_status, error) is called once for every finished task
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def task_id_from_url(task_url):
+    return task_url.rstrip('/').rsplit('/', 1)[-1]
+
+
+def task_error(task_status):
+    description = task_status.get('response', {}).get('error', {}).get('description', 'No details provided')
+    return f"Task failed with status: {task_status.get('status')}. Error details: {description}"
+
+
+class TaskTracker:
+    def __init__(self, poll_interval=None, batch_threshold=BATCH_THRESHOLD, verbose=True, strategy=None):
+        if strategy is None and poll_interval is not None:
+            strategy = polling.FixedInterval(poll_interval)
+        self.strategy = strategy or polling.get_strategy()
+        self.batch_threshold = batch_threshold
+        self.verbose = verbose
+        self.http_calls = 0
+        self._pending = {}
+        # Tasks handed to the status daemon (status_daemon.py) rather than polled here
+        self._delegated = {}
+        # credential name -> monotonic time before which that key's tasks are not polled
+        self._hold_until = {}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def register(self, task_url, callback=None, kind='task'):
+        # Imported here: the daemon's own module uses this one
+        from . import status_daemon
+
+        with self._cond:
+            entry = self._pending.get(task_url) or self._delegated.get(task_url)
+            if entry is None:
+                now = time.monotonic()
+                entry = {
+                    "future": Future(),
+                    "kind": kind,
+                    "registered_kind": kind,
+                    "started": now,
+                    "last_pending": now,
+                    "attempt": 0,
+                    "slept": self.strategy.initial_delay(kind),
+                    "credential": credentials.current()
+                }
+                entry["next_poll"] = now + entry["slept"]
+                if status_daemon.DAEMON_URL:
+                    # Polled once by the daemon for every process waiting on it (see status_daemon.py)
+                    self._delegated[task_url] = entry
+                    threading.Thread(target=self._wait_daemon, args=(task_url, entry), name="task-daemon-wait",
+                                     daemon=True).start()
+                else:
+                    self._pending[task_url] = entry
+            if callback is not None:
+                entry["future"].add_done_callback(callback)
+            self._start()
+            return entry["future"]
+
+    def _wait_daemon(self, task_url, entry):
+        from . import status_daemon
+
+        task_status, error = None, None
+        try:
+            with credentials.use(entry["credential"]):
+                task_status = status_daemon.wait_for_task(task_url)
+        except Exception as e:
+            error = e
+        with self._cond:
+            self._delegated.pop(task_url)
+            if task_status is None and error is None:
+                # The daemon can't be reached: the task is polled here after all
+                self._pending[task_url] = entry
+                self._start()
+                return
+        self._finish([(entry, task_url, task_status, error)])
+
+    def _start(self):
+        # Called with self._cond held
+        if self._pending and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="task-tracker", daemon=True)
+            self._thread.start()
+        self._cond.notify()
+
+    def wait(self, task_url, timeout=None):
+        return self.register(task_url).result(timeout)
+
+    def pending_count(self):
+        with self._cond:
+            return len(self._pending) + len(self._delegated)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._pending:
+                    self._thread = None
+                    return
+                now = time.monotonic()
+                next_polls = {url: max(self._hold_until.get(entry["credential"].name, 0), entry["next_poll"])
+                              for url, entry in self._pending.items()}
+                next_poll = min(next_polls.values())
+                if next_poll > now:
+                    self._cond.wait(next_poll - now)
+                    continue
+                # Per key: once one of its tasks is due, the batched listing covers them all
+                due_credentials = {self._pending[url]["credential"] for url, when in next_polls.items() if when <= now}
+                groups = {}
+                for url, entry in self._pending.items():
+                    if entry["credential"] in due_credentials:
+                        groups.setdefault(entry["credential"], []).append(url)
+                due = {credential: urls if len(urls) >= self.batch_threshold
+                       else [url for url in urls if next_polls[url] <= now]
+                       for credential, urls in groups.items()}
+            for credential, task_urls in due.items():
+                with credentials.use(credential):
+                    self._poll(task_urls)
+
+    def _poll(self, task_urls):
+        statuses = {}
+        if len(task_urls) >= self.batch_threshold:
+            statuses = self._fetch_task_list(task_urls)
+        for task_url in task_urls:
+            if task_url not in statuses:
+                statuses[task_url] = self._fetch_task(task_url)
+
+        now = time.monotonic()
+        finished = []
+        with self._cond:
+            for task_url, task_status in statuses.items():
+                entry = self._pending.get(task_url)
+                if entry is None:
+                    continue
+                if isinstance(task_status, Exception):
+                    self._pending.pop(task_url)
+                    finished.append((entry, task_url, None, task_status))
+                    continue
+                if task_status is None:
+                    # Rate limited: keep the task and poll again after the hold
+                    self._schedule(entry, now)
+                    continue
+                entry["kind"] = task_status.get('commandType') or entry["kind"]
+                status = task_status.get('status')
+                if status == 'processing-completed':
+                    self._pending.pop(task_url)
+                    duration = polling.completion_estimate(entry["started"], entry["last_pending"], now)
+                    self.strategy.record(entry["kind"], duration)
+                    if entry["registered_kind"] != entry["kind"]:
+                        self.strategy.record(entry["registered_kind"], duration)
+                    metrics.record_wait(f"task {entry['kind']}", now - entry["started"], entry["attempt"] + 1,
+                                        entry["slept"])
+                    finished.append((entry, task_url, task_status, None))
+                elif status in TASK_PENDING_STATUSES:
+                    if status != entry.get("status"):
+                        # Report transitions only, not every poll
+                        entry["status"] = status
+                        events.emit("task_status", f"Task is still processing: {status}" if self.verbose else None,
+                                    resource_id=task_id_from_url(task_url), kind=entry["kind"], status=status)
+                    self._schedule(entry, now)
+                elif status == 'processing-error':
+                    self._pending.pop(task_url)
+                    finished.append((entry, task_url, task_status, TaskFailed(task_error(task_status))))
+                else:
+                    self._pending.pop(task_url)
+                    finished.append((entry, task_url, task_status, TaskFailed(f"Unexpected task status: {status}")))
+
+        self._finish(finished)
+
+    def _finish(self, finished):
+        for entry, task_url, task_status, error in finished:
+            for listener in _listeners:
+                listener(task_url, task_status, error)
+            if error is None:
+                entry["future"].set_result(task_status)
+            else:
+                entry["future"].set_exception(error)
+
+    def _schedule(self, entry, now):
+        delay = self.strategy.next_delay(entry["kind"], entry["attempt"], now - entry["started"])
+        entry["attempt"] += 1
+        entry["slept"] += delay
+        entry["last_pending"] = now
+        entry["next_poll"] = now + delay
+
+    def _hold(self, response):
+        delay = polling.server_delay(response)
+        if delay:
+            name = credentials.current().name
+            with self._cond:
+                self._hold_until[name] = max(self._hold_until.get(name, 0), time.monotonic() + delay)
+
+    def _fetch_task(self, task_url):
+        self.http_calls += 1
+        try:
+            response = api_client.get(task_url)
+            self._hold(response)
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code == 429:
+                return None
+            response.raise_for_status()
+            return Exception(f"Unexpected response status: {response.status_code}")
+        except Exception as e:
+            return e
+
+    def _fetch_task_list(self, task_urls):
+        # Tasks missing from the listing (or a failed listing) fall back to per-task GETs
+        self.http_calls += 1
+        try:
+            response = api_client.get(API_URL_TASKS)
+            self._hold(response)
+            if response.status_code == 429:
+                return {task_url: None for task_url in task_urls}
+            if response.status_code != 200:
+                return {}
+            tasks = response.json()
+        except Exception:
+            return {}
+        if isinstance(tasks, dict):
+            tasks = tasks.get('tasks', [])
+        by_id = {task.get('taskId'): task for task in tasks}
+        statuses = {}
+        for task_url in task_urls:
+            task = by_id.get(task_id_from_url(task_url))
+            if task is not None:
+                statuses[task_url] = task
+        return statuses
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_tracker():
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = TaskTracker()
+        return _tracker
+
+
+def wait_for_task(task_url, timeout=None):
+    return get_tracker().wait(task_url, timeout)
+
+
+def submit_batches(items, submit, settle, serial_after_conflict=False):
+    # Submits every item back to back; submit(item) returns its task URL, or None when there is
+    # nothing to wait for. An item the API turns away with 409 Conflict (the subscription won't
+    # take another change while ours are in flight) goes in the next batch, once
+    # settle({item: task_url}) has waited for this one; with serial_after_conflict, every batch
+    # after a conflict holds a single item. A 409 with nothing of ours in flight is raised.
+    pending = list(items)
+    serial = False
+    while pending:
+        batch = {}
+        deferred = []
+        for index, item in enumerate(pending):
+            if serial and batch:
+                deferred.extend(pending[index:])
+                break
+            try:
+                task_url = submit(item)
+            except Exception as e:
+                if api_client.error_status(e) != 409 or not batch:
+                    raise
+                deferred.append(item)
+                if serial_after_conflict:
+                    serial = True
+                    deferred.extend(pending[index + 1:])
+                    break
+                continue
+            if task_url is not None:
+                batch[item] = task_url
+        settle(batch)
+        pending = deferred
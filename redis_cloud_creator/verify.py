@@ -0,0 +1,199 @@
+import argparse
+import json
+import os
+import socket
+import ssl
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics, polling
+
+# Post-provision check that a database really serves traffic: connect (over TLS
+# when the database has it), AUTH as the created ACL user, PING, then time a
+# small SET/GET probe. "active" in the API only means the control plane is done;
+# the endpoint may still refuse connections for a while, so the handshake is
+# retried until VERIFY_TIMEOUT. Only refused/reset connections and timeouts are
+# retried: bad credentials, certificates or any other TLS error fail at once.
+# Speaks RESP directly over the socket, so no Redis client library is needed.
+#
+# REDIS_CLOUD_VERIFY=1 adds the stage to main.py and provision_engine.py.
+# REDIS_CLOUD_VERIFY_CA points at the CA bundle for the databases' TLS certificates.
+
+VERIFY = os.getenv('REDIS_CLOUD_VERIFY', '0') == '1'
+VERIFY_OPS = int(os.getenv('REDIS_CLOUD_VERIFY_OPS', '100'))
+VERIFY_TIMEOUT = float(os.getenv('REDIS_CLOUD_VERIFY_TIMEOUT', '300'))
+VERIFY_CA = os.getenv('REDIS_CLOUD_VERIFY_CA')
+SOCKET_TIMEOUT = 10
+# What an endpoint that is still starting up looks like; socket.timeout is TimeoutError on 3.10+
+RETRYABLE = (ConnectionRefusedError, ConnectionResetError, TimeoutError, socket.timeout)
+
+
+class RespError(Exception):
+    # An error reply from the server (-WRONGPASS, -NOPERM, ...)
+    pass
+
+
+class RespConnection:
+    def __init__(self, host, port, tls=False, ca_file=None, timeout=SOCKET_TIMEOUT):
+        sock = socket.create_connection((host, port), timeout=timeout)
+        if tls:
+            context = ssl.create_default_context(cafile=ca_file)
+            try:
+                sock = context.wrap_socket(sock, server_hostname=host)
+            except BaseException:
+                sock.close()
+                raise
+        self.sock = sock
+        self.file = sock.makefile('rb')
+
+    def command(self, *args):
+        parts = [str(arg).encode() if not isinstance(arg, bytes) else arg for arg in args]
+        payload = b"*%d\r\n" % len(parts) + b"".join(b"$%d\r\n%s\r\n" % (len(part), part) for part in parts)
+        self.sock.sendall(payload)
+        return self._read()
+
+    def _read(self):
+        line = self.file.readline()
+        if not line.endswith(b"\r\n"):
+            # Accepted and dropped, as a proxy does while the database behind it is not up yet
+            raise ConnectionResetError("connection closed by server")
+        prefix, rest = line[:1], line[1:-2]
+        if prefix == b'+':
+            return rest.decode()
+        if prefix == b'-':
+            raise RespError(rest.decode())
+        if prefix == b':':
+            return int(rest)
+        if prefix == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            return self.file.read(length + 2)[:-2]
+        if prefix == b'*':
+            length = int(rest)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise ConnectionError(f"unexpected reply {line[:40]!r}")
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+def parse_endpoint(endpoint):
+    host, _, port = endpoint.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f"endpoint {endpoint!r} is not host:port")
+    return host, int(port)
+
+
+def handshake(host, port, user, password, tls, ca_file, timeout):
+    # Connect, AUTH and PING, retrying while the endpoint is not accepting connections yet
+    poller = polling.Poller('database-connect')
+    attempts = 0
+    while True:
+        attempts += 1
+        connection = None
+        try:
+            connection = RespConnection(host, port, tls, ca_file)
+            if user:
+                connection.command('AUTH', user, password)
+            pong = connection.command('PING')
+            poller.done()
+            return connection, pong, attempts
+        except RETRYABLE:
+            if connection is not None:
+                connection.close()
+            delay = poller.next_delay()
+            if poller.elapsed() + delay > timeout:
+                raise
+            time.sleep(delay)
+        except (OSError, RespError):
+            if connection is not None:
+                connection.close()
+            raise
+
+
+def latency_summary(seconds):
+    milliseconds = [value * 1000 for value in seconds]
+    return {"ops": len(milliseconds), "p50": round(metrics.percentile(milliseconds, 0.5), 3),
+            "p99": round(metrics.percentile(milliseconds, 0.99), 3)}
+
+
+def verify_database(endpoint, user, password, tls=True, ops=VERIFY_OPS, ca_file=VERIFY_CA, timeout=VERIFY_TIMEOUT):
+    # Never raises: the outcome (and any error) is reported in the returned dict
+    result = {"endpoint": endpoint, "tls": tls, "user": user, "ok": False}
+    started = time.monotonic()
+    try:
+        host, port = parse_endpoint(endpoint)
+        connection, pong, attempts = handshake(host, port, user, password, tls, ca_file, timeout)
+        result.update(connect_attempts=attempts, connect_seconds=round(time.monotonic() - started, 3), ping=pong)
+        try:
+            key = f"redis-cloud-verify:{uuid.uuid4().hex}"
+            writes = []
+            reads = []
+            for i in range(ops):
+                op_started = time.perf_counter()
+                connection.command('SET', key, i)
+                writes.append(time.perf_counter() - op_started)
+                op_started = time.perf_counter()
+                value = connection.command('GET', key)
+                reads.append(time.perf_counter() - op_started)
+                if value != str(i).encode():
+                    raise RespError(f"read back {value!r} after writing {i}")
+            if ops:
+                connection.command('DEL', key)
+                result["latency_ms"] = {"write": latency_summary(writes), "read": latency_summary(reads)}
+        finally:
+            connection.close()
+        result["ok"] = True
+    except (OSError, RespError, ValueError) as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = round(time.monotonic() - started, 3)
+    return result
+
+
+def database_user(stack, database_name):
+    # The first user whose role grants access to the database
+    roles = {role["name"]: role for role in stack["roles"]}
+    for user in stack["users"]:
+        if database_name in roles.get(user["role"], {}).get("databases", []):
+            return user
+    return None
+
+
+def verify_stack(stack, database_urls, **kwargs):
+    # {database name: result} for every database of a provisioned stack, probed in parallel
+    def verify(database):
+        user = database_user(stack, database["name"])
+        if user is None:
+            return {"endpoint": database_urls[database["name"]], "ok": False,
+                    "error": "no user of this stack has access to the database"}
+        return verify_database(database_urls[database["name"]], user["name"], user["password"],
+                               tls=database["settings"].get("enableTls", False), **kwargs)
+
+    with ThreadPoolExecutor(max_workers=max(1, len(stack["databases"]))) as executor:
+        results = list(executor.map(verify, stack["databases"]))
+    return {database["name"]: result for database, result in zip(stack["databases"], results)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that a Redis database accepts connections and time a probe")
+    parser.add_argument('endpoint', help="host:port, as in the database's publicEndpoint")
+    parser.add_argument('--user', help="ACL user to AUTH as (omit for no AUTH)")
+    parser.add_argument('--password', default=os.getenv('REDIS_CLOUD_VERIFY_PASSWORD'))
+    parser.add_argument('--tls', action='store_true')
+    parser.add_argument('--ca-file', default=VERIFY_CA)
+    parser.add_argument('--ops', type=int, default=VERIFY_OPS)
+    parser.add_argument('--timeout', type=float, default=VERIFY_TIMEOUT,
+                        help="Seconds to keep retrying while the endpoint refuses connections")
+    args = parser.parse_args()
+
+    result = verify_database(args.endpoint, args.user, args.password, tls=args.tls, ops=args.ops,
+                             ca_file=args.ca_file, timeout=args.timeout)
+    print(json.dumps(result, indent=4))
+    raise SystemExit(0 if result["ok"] else 1)
+
+
+if __name__ == '__main__':
+    main()
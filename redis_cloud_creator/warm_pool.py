@@ -0,0 +1,314 @@
+import argparse
+import json
+import os
+import secrets
+import threading
+import time
+
+from . import (acl_index, api_client, credentials, destroy, events, main, metrics, provision_engine, spec, sqlite_store,
+               task_tracker)
+
+# Pool of fully provisioned stacks (subscription, database, role, user) built from
+# the main.py / REDIS_CLOUD_SPEC stack, so a test environment gets one in seconds.
+# Members differ only by a "-pool-<token>" suffix on every name. State lives in a
+# SQLite file shared by every process: `serve` keeps POOL_SIZE members ready and
+# retires the ones idle for longer than POOL_MAX_IDLE, while `claim` (any process)
+# atomically takes the oldest ready member, checks its databases are still active,
+# sets a fresh password on its users and hands it out. Claimed stacks are never
+# returned to the pool: `release` tears them down.
+#
+# Passwords are not stored: members are created with a throwaway one and the real
+# one is generated at hand-out.
+
+POOL_PATH = os.getenv('REDIS_CLOUD_POOL_PATH', '.redis-cloud-pool.sqlite3')
+POOL_SIZE = int(os.getenv('REDIS_CLOUD_POOL_SIZE', '2'))
+POOL_MAX_IDLE = float(os.getenv('REDIS_CLOUD_POOL_MAX_IDLE', '14400'))
+POOL_INTERVAL = float(os.getenv('REDIS_CLOUD_POOL_INTERVAL', '10'))
+# A member still 'provisioning' after this long belonged to a refill that died
+POOL_PROVISION_TIMEOUT = float(os.getenv('REDIS_CLOUD_POOL_PROVISION_TIMEOUT', '3600'))
+
+
+class PoolEmpty(Exception):
+    pass
+
+
+def generate_password():
+    # Satisfies the ACL password rules: upper and lower case, a digit and a special character
+    return f"{secrets.token_urlsafe(18)}Aa1@"
+
+
+def member_stack(template, token):
+    # The template stack with every account-wide name made unique to this member
+    suffix = f"-pool-{token}"
+    return dict(
+        template,
+        name=f"{template['name']}{suffix}",
+        databases=[dict(database, name=f"{database['name']}{suffix}") for database in template["databases"]],
+        roles=[dict(role, name=f"{role['name']}{suffix}", databases=[f"{name}{suffix}" for name in role["databases"]])
+               for role in template["roles"]],
+        users=[dict(user, name=f"{user['name']}{suffix}", role=f"{user['role']}{suffix}",
+                    password=generate_password()) for user in template["users"]]
+    )
+
+
+class WarmPool:
+    def __init__(self, path=POOL_PATH, size=POOL_SIZE, max_idle=POOL_MAX_IDLE, template=None, clock=time.time):
+        self.path = path
+        self.size = size
+        self.max_idle = max_idle
+        self.template = template or main.load_stack()
+        self._clock = clock
+        self._store = sqlite_store.Store(path, schema=[
+            "CREATE TABLE IF NOT EXISTS members (name TEXT PRIMARY KEY, state TEXT, stack TEXT, output TEXT, "
+            "created REAL, ready REAL, claimed REAL, owner TEXT, error TEXT)"])
+
+    def counts(self):
+        return dict(self._store.execute("SELECT state, COUNT(*) FROM members GROUP BY state"))
+
+    def members(self, state=None, name=None):
+        column, value = ('name', name) if name else ('state', state)
+        rows = self._store.execute("SELECT name, state, stack, output, created, ready, claimed, owner, error "
+                                   "FROM members " + (f"WHERE {column} = ? " if value else "") + "ORDER BY created",
+                                   *([value] if value else []))
+        return [{"name": row[0], "state": row[1], "stack": json.loads(row[2]),
+                 "output": json.loads(row[3]) if row[3] else None, "created": row[4], "ready": row[5],
+                 "claimed": row[6], "owner": row[7], "error": row[8]} for row in rows]
+
+    def refill(self, concurrency=provision_engine.DEFAULT_CONCURRENCY):
+        # Provisions whatever is missing from size (counting members already on their way)
+        # Under SQLite's write lock, so concurrent refills never reserve the same slots
+        with self._store.transaction() as conn:
+            pending = conn.execute("SELECT COUNT(*) FROM members WHERE state IN ('provisioning', 'ready')"
+                                   ).fetchone()[0]
+            stacks = [member_stack(self.template, secrets.token_hex(4)) for _ in range(self.size - pending)]
+            for stack in stacks:
+                conn.execute("INSERT INTO members (name, state, stack, created) VALUES (?, 'provisioning', ?, ?)",
+                             (stack["name"], json.dumps(spec.fingerprint(stack)), self._clock()))
+        if not stacks:
+            return []
+        events.emit("pool_refill", f"Provisioning {len(stacks)} pool member(s)", count=len(stacks))
+        results = provision_engine.provision_many(stacks, concurrency=concurrency)
+        for stack, result in zip(stacks, results):
+            verified = all(database.get("verification", {}).get("ok", True)
+                           for database in result.get("output", {}).get("databases", []))
+            if result["status"] == "ok" and verified:
+                output = dict(result["output"], credential=result["credential"],
+                              users=[{"user": user["user"]} for user in result["output"]["users"]])
+                self._store.update("UPDATE members SET state = 'ready', output = ?, ready = ? WHERE name = ?",
+                                   json.dumps(output), self._clock(), stack["name"])
+                events.emit("pool_member_ready", f"Pool member {stack['name']} is ready", stack=stack["name"],
+                            duration=result["elapsed"])
+            else:
+                error = result.get("error") or "verification failed"
+                self._store.update("UPDATE members SET state = 'failed', output = ?, error = ? WHERE name = ?",
+                                   json.dumps(result.get("output")), error, stack["name"])
+                events.emit("pool_member_failed", f"Pool member {stack['name']} failed: {error}", stack=stack["name"],
+                            error=error)
+        return results
+
+    def expire(self):
+        # Idle members past max_idle, failed ones and refills that never finished are torn down
+        now = self._clock()
+
+        with self._store.transaction() as conn:
+            rows = conn.execute(
+                "SELECT name FROM members WHERE (state = 'ready' AND ready < ?) OR state = 'failed' "
+                "OR (state = 'provisioning' AND created < ?)",
+                (now - self.max_idle, now - POOL_PROVISION_TIMEOUT)).fetchall()
+            names = [name for (name,) in rows]
+            for name in names:
+                conn.execute("UPDATE members SET state = 'retiring' WHERE name = ?", (name,))
+        if names:
+            events.emit("pool_expire", f"Retiring {len(names)} pool member(s)", members=names)
+            self._teardown(names)
+        return names
+
+    def _teardown(self, names):
+        members = {member["name"]: member for member in self.members('retiring')}
+        stacks = []
+        # name -> ids of the subscriptions torn down for it
+        subscription_ids = {}
+        for name in names:
+            output = members[name]["output"]
+            if output and output.get("subscription_id"):
+                found = [{
+                    "subscription_id": output["subscription_id"],
+                    "database_ids": [database["database_id"] for database in output.get("databases", [])],
+                    "users": [user["name"] for user in members[name]["stack"]["users"]],
+                    "roles": [role["name"] for role in members[name]["stack"]["roles"]],
+                    "credential": output.get("credential")
+                }]
+            else:
+                # The refill failed (or died) before reporting what it created; find it by name
+                found = destroy.discover_stacks(name)
+            subscription_ids[name] = {str(stack["subscription_id"]) for stack in found}
+            stacks.extend(found)
+        results = destroy.teardown_many(stacks) if stacks else []
+        failed = {str(result["subscription_id"]) for result in results if result["status"] != "ok"}
+        now = self._clock()
+        for name in names:
+            if subscription_ids[name] & failed:
+                # Back to 'failed' so the next expire() pass retries the teardown
+                self._store.update("UPDATE members SET state = 'failed' WHERE name = ?", name)
+                continue
+            if not subscription_ids[name] and members[name]["created"] > now - POOL_PROVISION_TIMEOUT:
+                # Nothing found yet, but its create may still be in flight (or not listed yet):
+                # kept and looked for again until no refill could still be creating it
+                self._store.update("UPDATE members SET state = 'failed', error = ? WHERE name = ?",
+                                   "no subscription found to tear down", name)
+                continue
+            self._store.update("DELETE FROM members WHERE name = ?", name)
+        return results
+
+    def claim(self, owner=None):
+        # Hands out the oldest ready member with freshly set passwords; raises PoolEmpty if none is usable
+        started = time.monotonic()
+        while True:
+            # Under SQLite's write lock, so concurrent claims never hand out the same member
+            with self._store.transaction() as conn:
+                row = conn.execute("SELECT name FROM members WHERE state = 'ready' ORDER BY ready LIMIT 1").fetchone()
+                name = row[0] if row else None
+                if name is not None:
+                    conn.execute("UPDATE members SET state = 'claimed', claimed = ?, owner = ? WHERE name = ?",
+                                 (self._clock(), owner, name))
+            if name is None:
+                raise PoolEmpty(f"No ready member in pool {self.path}; is `redis-cloud pool serve` running?")
+            member = self.members(name=name)[0]
+            try:
+                # The member's resources only exist for the key that created them
+                with credentials.use(member["output"].get("credential")):
+                    self._check_active(member)
+                    passwords = self._rotate_passwords(member)
+            except Exception as e:
+                # A member that went bad while idle is retired and the next one tried
+                self._store.update("UPDATE members SET state = 'failed', error = ? WHERE name = ?", str(e), name)
+                events.emit("pool_member_failed", f"Pool member {name} is not usable: {e}", stack=name, error=str(e))
+                continue
+            output = hand_out_output(member["output"], passwords)
+            metrics.record_wait('pool claim', time.monotonic() - started, 1, 0)
+            events.emit("pool_claimed", f"Handed out pool member {name}", stack=name, owner=owner,
+                        duration=round(time.monotonic() - started, 3))
+            return output
+
+    def _check_active(self, member):
+        subscription_id = member["output"]["subscription_id"]
+        for database in member["output"]["databases"]:
+            url = f"{main.API_URL_FIXED_SUBSCRIPTIONS}/{subscription_id}/databases/{database['database_id']}"
+            response = api_client.get(url)
+            if response.status_code != 200:
+                events.api_error(f"Failed to get database {database['database_id']}", response)
+                response.raise_for_status()
+            if response.json().get('status') != 'active':
+                raise Exception(f"database {database['database_id']} is {response.json().get('status')}")
+
+    def _rotate_passwords(self, member):
+        passwords = {}
+        task_urls = {}
+        for user in member["stack"]["users"]:
+            entry = acl_index.users().get(user["name"])
+            if entry is None:
+                raise Exception(f"user {user['name']} not found")
+            passwords[user["name"]] = generate_password()
+            response = api_client.put(f"{main.API_URL_ACL_USERS}/{entry['id']}",
+                                      json={"password": passwords[user["name"]]})
+            if response.status_code != 202:
+                events.api_error(f"Failed to rotate the password of {user['name']}", response)
+                response.raise_for_status()
+            task_urls[user["name"]] = response.json()['links'][0]['href']
+        for name, task_url in task_urls.items():
+            task_tracker.wait_for_task(task_url)
+            events.emit("password_rotated", f"Password of {name} rotated", stack=member["name"], user=name)
+        return passwords
+
+    def release(self, subscription_id):
+        # A handed-out stack is dirty: it is torn down rather than returned to the pool
+        with self._store.transaction() as conn:
+            rows = conn.execute("SELECT name, output FROM members WHERE state = 'claimed'").fetchall()
+            names = [name for name, output in rows
+                     if str(json.loads(output)["subscription_id"]) == str(subscription_id)]
+            for name in names:
+                conn.execute("UPDATE members SET state = 'retiring' WHERE name = ?", (name,))
+        if not names:
+            raise Exception(f"Subscription {subscription_id} is not a claimed member of pool {self.path}")
+        return self._teardown(names)
+
+    def drain(self):
+        # Tears down every unclaimed member, e.g. before switching the template
+        with self._store.transaction() as conn:
+            rows = conn.execute("SELECT name FROM members WHERE state IN ('ready', 'failed')").fetchall()
+            names = [name for (name,) in rows]
+            for name in names:
+                conn.execute("UPDATE members SET state = 'retiring' WHERE name = ?", (name,))
+        return self._teardown(names) if names else []
+
+    def serve(self, interval=POOL_INTERVAL, stop=None):
+        # Background loop: retire stale members, then top the pool back up
+        stop = stop or threading.Event()
+        events.log(f"Keeping {self.size} member(s) ready in {self.path}, max idle {self.max_idle:g}s")
+        while not stop.is_set():
+            try:
+                self.expire()
+                self.refill()
+            except Exception as e:
+                events.emit("error", f"Error: {e}", error=str(e))
+            stop.wait(interval)
+
+
+def hand_out_output(output, passwords):
+    # Same shape as main.py's result
+    result = {"subscription_id": output["subscription_id"]}
+    if len(output["databases"]) == 1:
+        result["database_id"] = output["databases"][0]["database_id"]
+        result["database_url"] = output["databases"][0]["database_url"]
+    else:
+        result["databases"] = output["databases"]
+    users = [{"user": user["user"], "password": passwords[user["user"]]} for user in output["users"]]
+    if users:
+        result.update(users[0])
+    if len(users) > 1:
+        result["users"] = users
+    return result
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Keep pre-provisioned stacks ready and hand them out")
+    parser.add_argument('--pool', default=POOL_PATH, help="Pool state file shared by every process")
+    parser.add_argument('--size', type=int, default=POOL_SIZE)
+    parser.add_argument('--max-idle', type=float, default=POOL_MAX_IDLE, help="Seconds before an idle member is retired")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help="Refill the pool and retire idle members until interrupted")
+    serve.add_argument('--interval', type=float, default=POOL_INTERVAL)
+    commands.add_parser('claim', help="Take a ready stack (prints main.py's result JSON)")
+    commands.add_parser('status', help="Show the pool members")
+    release = commands.add_parser('release', help="Tear down a claimed stack")
+    release.add_argument('subscription_id')
+    commands.add_parser('drain', help="Tear down every unclaimed member")
+    args = parser.parse_args(argv)
+
+    try:
+        pool = WarmPool(path=args.pool, size=args.size, max_idle=args.max_idle)
+        if args.command == 'serve':
+            try:
+                pool.serve(args.interval)
+            except KeyboardInterrupt:
+                pass
+        elif args.command == 'claim':
+            output = pool.claim(owner=os.getenv('REDIS_CLOUD_POOL_OWNER'))
+            events.emit("result", json.dumps(output, indent=4), result=output)
+        elif args.command == 'status':
+            members = [{key: member[key] for key in ("name", "state", "created", "ready", "claimed", "owner", "error")}
+                       for member in pool.members()]
+            events.emit("result", json.dumps({"counts": pool.counts(), "members": members}, indent=4),
+                        result={"counts": pool.counts(), "members": members})
+        elif args.command == 'release':
+            destroy.print_summary(pool.release(args.subscription_id))
+        elif args.command == 'drain':
+            destroy.print_summary(pool.drain())
+    except Exception as e:
+        events.emit("error", f"Error: {e}", error=str(e))
+    metrics.finish()
+    events.flush()
+
+
+if __name__ == '__main__':
+    main_cli()
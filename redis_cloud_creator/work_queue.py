@@ -0,0 +1,350 @@
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from . import credentials, destroy, events, journal, main, metrics, spec, sqlite_store
+
+# Durable queue of provision and teardown jobs in a SQLite file, worked off by any
+# number of worker processes on one host (or several sharing the volume). A worker
+# claims the oldest runnable job under SQLite's write lock and holds it on a lease
+# that a heartbeat thread keeps extending. A worker that dies stops heartbeating;
+# once its lease expires the next claim puts the job back in line, up to
+# QUEUE_MAX_ATTEMPTS attempts.
+#
+# A retried provision job does not provision twice: each job runs main.py's DAG
+# with its own journal next to the queue file (<queue>.journals/<id>.json), so the
+# next attempt skips the finished steps and re-attaches to tasks already submitted.
+# It also keeps the API key of its first attempt, the only one that can see what
+# that attempt created. Enqueueing is idempotent while a job is pending: a
+# subscription name (provision) or subscription id / name glob (teardown) already
+# queued or running is not added again. Once it has finished (done or failed) the
+# same key can be queued anew, e.g. provision, teardown, then provision again.
+#
+# Jobs carry their spec as written (one subscription with the file's defaults). The
+# queue file is shared, so users must name their password with password_env, resolved
+# in the worker's environment; literal passwords are refused at enqueue time and
+# results are stored without passwords.
+# Leases use wall-clock time: hosts sharing a queue need reasonably synced clocks.
+
+QUEUE_PATH = os.getenv('REDIS_CLOUD_QUEUE_PATH', '.redis-cloud-queue.sqlite3')
+QUEUE_LEASE = float(os.getenv('REDIS_CLOUD_QUEUE_LEASE', '60'))
+QUEUE_MAX_ATTEMPTS = int(os.getenv('REDIS_CLOUD_QUEUE_MAX_ATTEMPTS', '3'))
+# Seconds before a job that raised is retried, times its attempt number
+QUEUE_RETRY_DELAY = float(os.getenv('REDIS_CLOUD_QUEUE_RETRY_DELAY', '30'))
+QUEUE_INTERVAL = float(os.getenv('REDIS_CLOUD_QUEUE_INTERVAL', '2'))
+# WAL needs shared memory, which network filesystems don't provide: set 0 when hosts share the file
+QUEUE_WAL = os.getenv('REDIS_CLOUD_QUEUE_WAL', '1') == '1'
+
+# Where main.py's default stack (no spec file) takes its user's password from in the worker
+QUEUE_PASSWORD_ENV = os.getenv('REDIS_CLOUD_QUEUE_PASSWORD_ENV', 'REDIS_CLOUD_USER_PASSWORD')
+
+COLUMNS = ["id", "kind", "key", "payload", "state", "attempts", "max_attempts", "available", "owner",
+           "lease_expires", "credential", "created", "started", "finished", "result", "error"]
+
+
+class LeaseLost(Exception):
+    # Another worker took the job over: this one's result is not recorded
+    pass
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkerEnvironment:
+    # password_env is resolved by the worker, not the process enqueueing the job
+    def get(self, name, default=None):
+        return f"<{name} in the worker>"
+
+
+def provision_payloads(path=None):
+    # One job payload per subscription of the spec (main.py's default stack without one)
+    if path:
+        data = spec.read_file(path)
+    else:
+        data = main.default_spec()
+        for subscription in data["subscriptions"]:
+            subscription["users"] = [dict({key: value for key, value in user.items() if key != "password"},
+                                          password_env=QUEUE_PASSWORD_ENV) for user in subscription["users"]]
+    # Validated as a whole up front, so a bad spec fails here rather than in every worker
+    spec.compile_spec(data, source=path, database_settings=main.DATABASE_SETTINGS, environ=WorkerEnvironment())
+    literal = [f"subscriptions[{s}].users[{u}]: literal password; queued jobs need password_env"
+               for s, subscription in enumerate(data["subscriptions"])
+               for u, user in enumerate(subscription.get("users", [])) if "password" in user]
+    if literal:
+        raise spec.SpecError(literal, path)
+    return [(subscription["name"], {"defaults": data.get("defaults", {}), "subscriptions": [subscription]})
+            for subscription in data["subscriptions"]]
+
+
+def without_passwords(output):
+    output = {key: value for key, value in output.items() if key != "password"}
+    if "users" in output:
+        output["users"] = [{"user": user["user"]} for user in output["users"]]
+    return output
+
+
+class WorkQueue:
+    def __init__(self, path=QUEUE_PATH, lease=QUEUE_LEASE, max_attempts=QUEUE_MAX_ATTEMPTS,
+                 retry_delay=QUEUE_RETRY_DELAY, clock=time.time):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.journal_dir = f"{path}.journals"
+        self._clock = clock
+        self._store = sqlite_store.Store(path, wal=QUEUE_WAL, schema=[
+            "CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY, kind TEXT, key TEXT, payload TEXT, state TEXT, "
+            "attempts INTEGER, max_attempts INTEGER, available REAL, owner TEXT, lease_expires REAL, "
+            "credential TEXT, created REAL, started REAL, finished REAL, result TEXT, error TEXT)",
+            "CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, available)"])
+
+    def enqueue(self, kind, key, payload):
+        # The id of the new job, or of the queued/running one with the same kind and key
+        with self._store.transaction() as conn:
+            row = conn.execute("SELECT id, state FROM jobs WHERE kind = ? AND key = ? "
+                               "AND state IN ('queued', 'running')", (kind, key)).fetchone()
+            if row is not None:
+                events.log(f"{kind.capitalize()} job for {key} is already {row[1]} (job {row[0]})", job=row[0])
+                return row[0]
+            now = self._clock()
+            return conn.execute(
+                "INSERT INTO jobs (kind, key, payload, state, attempts, max_attempts, available, created) "
+                "VALUES (?, ?, ?, 'queued', 0, ?, ?, ?)",
+                (kind, key, json.dumps(payload), self.max_attempts, now, now)).lastrowid
+
+    def jobs(self, state=None, job_id=None):
+        column, value = ('id', job_id) if job_id is not None else ('state', state)
+        rows = self._store.execute(f"SELECT {', '.join(COLUMNS)} FROM jobs "
+                                   + (f"WHERE {column} = ? " if value is not None else "") + "ORDER BY id",
+                                   *([value] if value is not None else []))
+        jobs = [dict(zip(COLUMNS, row)) for row in rows]
+        for job in jobs:
+            for column in ("payload", "result"):
+                job[column] = json.loads(job[column]) if job[column] else None
+        return jobs
+
+    def counts(self):
+        return dict(self._store.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"))
+
+    def claim(self, owner):
+        # The next runnable job, now leased to owner, or None
+        # Under SQLite's write lock, so two workers never claim the same job
+        with self._store.transaction() as conn:
+            now = self._clock()
+            self._requeue_expired(conn, now)
+            row = conn.execute("SELECT id FROM jobs WHERE state = 'queued' AND available <= ? "
+                               "ORDER BY available, id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET state = 'running', owner = ?, lease_expires = ?, "
+                         "attempts = attempts + 1, started = ? WHERE id = ?", (owner, now + self.lease, now, row[0]))
+        return self.jobs(job_id=row[0])[0]
+
+    def _requeue_expired(self, conn, now):
+        # Jobs whose worker stopped heartbeating: back in line, or failed once out of attempts
+        rows = conn.execute("SELECT id, owner, attempts, max_attempts FROM jobs "
+                            "WHERE state = 'running' AND lease_expires < ?", (now,)).fetchall()
+        for job_id, owner, attempts, max_attempts in rows:
+            error = f"lease of {owner} expired"
+            if attempts >= max_attempts:
+                conn.execute("UPDATE jobs SET state = 'failed', owner = NULL, finished = ?, error = ? "
+                             "WHERE id = ?", (now, f"{error} on attempt {attempts}", job_id))
+            else:
+                conn.execute("UPDATE jobs SET state = 'queued', owner = NULL, available = ?, error = ? "
+                             "WHERE id = ?", (now, error, job_id))
+            events.emit("lease_expired", f"Job {job_id}: {error}", job=job_id, owner=owner, attempts=attempts)
+
+    def heartbeat(self, job_id, owner):
+        if not self._store.update("UPDATE jobs SET lease_expires = ? WHERE id = ? AND owner = ? "
+                                  "AND state = 'running'", self._clock() + self.lease, job_id, owner):
+            raise LeaseLost(f"Job {job_id} is no longer leased to {owner}")
+
+    def set_credential(self, job_id, owner, name):
+        self._store.update("UPDATE jobs SET credential = ? WHERE id = ? AND owner = ?", name, job_id, owner)
+
+    def complete(self, job_id, owner, result):
+        if not self._store.update("UPDATE jobs SET state = 'done', owner = NULL, finished = ?, result = ?, "
+                                  "error = NULL WHERE id = ? AND owner = ? AND state = 'running'",
+                                  self._clock(), json.dumps(result), job_id, owner):
+            raise LeaseLost(f"Job {job_id} is no longer leased to {owner}")
+
+    def fail(self, job_id, owner, error):
+        # Back in line after a growing delay while attempts remain; True if it will be retried
+        with self._store.transaction() as conn:
+            row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ? AND owner = ? "
+                               "AND state = 'running'", (job_id, owner)).fetchone()
+            if row is None:
+                return False
+            now = self._clock()
+            if row[0] >= row[1]:
+                conn.execute("UPDATE jobs SET state = 'failed', owner = NULL, finished = ?, error = ? "
+                             "WHERE id = ?", (now, error, job_id))
+                return False
+            conn.execute("UPDATE jobs SET state = 'queued', owner = NULL, available = ?, error = ? "
+                         "WHERE id = ?", (now + self.retry_delay * row[0], error, job_id))
+            return True
+
+    def retry(self, job_id):
+        # Puts a failed job back in line with a fresh set of attempts
+        if not self._store.update("UPDATE jobs SET state = 'queued', attempts = 0, available = ?, finished = NULL "
+                                  "WHERE id = ? AND state = 'failed'", self._clock(), job_id):
+            raise Exception(f"Job {job_id} is not a failed job in {self.path}")
+
+    def journal_path(self, job_id):
+        os.makedirs(self.journal_dir, exist_ok=True)
+        return os.path.join(self.journal_dir, f"{job_id}.json")
+
+    def work(self, owner=None, stop=None, until_empty=False, interval=QUEUE_INTERVAL, scheduler=None):
+        # Claims and runs jobs one at a time until stop is set (or, with until_empty, the queue has nothing
+        # queued or running); scale out by running more workers. Returns the number of jobs run.
+        owner = owner or worker_name()
+        stop = stop or threading.Event()
+        scheduler = scheduler or credentials.Scheduler()
+        ran = 0
+        while not stop.is_set():
+            job = self.claim(owner)
+            if job is None:
+                if until_empty and not self._store.execute("SELECT 1 FROM jobs "
+                                                           "WHERE state IN ('queued', 'running') LIMIT 1"):
+                    break
+                stop.wait(interval)
+                continue
+            self.run_job(job, owner, scheduler)
+            ran += 1
+        return ran
+
+    def run_job(self, job, owner, scheduler):
+        started = time.monotonic()
+        events.emit("job_started", f"Job {job['id']}: {job['kind']} {job['key']} (attempt {job['attempts']})",
+                    job=job['id'], kind=job['kind'], key=job['key'], attempt=job['attempts'], owner=owner)
+        # Retries stay on the key of the first attempt: the resources it created are only visible to it
+        try:
+            credential = credentials.get(job['credential']) if job['credential'] else scheduler.acquire()
+        except Exception as e:
+            self.fail(job['id'], owner, str(e))
+            events.emit("job_failed", f"Job {job['id']}: {e}", job=job['id'], error=str(e))
+            return
+        if not job['credential']:
+            self.set_credential(job['id'], owner, credential.name)
+        beating = threading.Event()
+        lost = []
+
+        def beat():
+            while not beating.wait(self.lease / 3):
+                try:
+                    self.heartbeat(job['id'], owner)
+                except LeaseLost as e:
+                    lost.append(e)
+                    events.emit("lease_lost", str(e), job=job['id'], owner=owner)
+                    return
+                except sqlite3.Error:
+                    # Busy file: the next beat tries again well within the lease
+                    pass
+
+        heart = threading.Thread(target=beat, name=f"heartbeat-{job['id']}", daemon=True)
+        heart.start()
+        try:
+            with credentials.use(credential):
+                result = self.run_provision(job) if job['kind'] == 'provision' else self.run_teardown(job)
+            if lost:
+                raise lost[0]
+            self.complete(job['id'], owner, result)
+            events.emit("job_done", f"Job {job['id']}: {job['kind']} {job['key']} done", job=job['id'],
+                        kind=job['kind'], key=job['key'], duration=round(time.monotonic() - started, 3),
+                        result=result)
+        except LeaseLost as e:
+            events.emit("job_abandoned", f"Job {job['id']}: {e}; leaving it to its new owner", job=job['id'])
+        except Exception as e:
+            retried = self.fail(job['id'], owner, str(e))
+            events.emit("job_failed", f"Job {job['id']}: {job['kind']} {job['key']} failed"
+                        f"{', will be retried' if retried else ''}: {e}", job=job['id'], kind=job['kind'],
+                        key=job['key'], error=str(e), retried=retried)
+        finally:
+            beating.set()
+            if job['credential'] is None:
+                scheduler.release(credential)
+
+    def run_provision(self, job):
+        # main.py's DAG for the job's stack, journaled so a later attempt resumes where this one stopped
+        main.run_stack = spec.compile_spec(job['payload'], database_settings=main.DATABASE_SETTINGS).stacks[0]
+        main.run_journal = journal.Journal(path=self.journal_path(job['id']), spec=main.journal_spec())
+        provisioning = main.build_provisioning_dag()
+        try:
+            results = provisioning.run()
+        finally:
+            provisioning.print_report()
+        output = dict(without_passwords(main.stack_output(results)), credential=credentials.current().name)
+        main.run_journal.remove()
+        return output
+
+    def run_teardown(self, job):
+        payload = job['payload']
+        stacks = destroy.discover_stacks(payload['name']) if 'name' in payload else [payload]
+        results = destroy.teardown_many(stacks) if stacks else []
+        failed = [result for result in results if result["status"] != "ok"]
+        if failed:
+            raise Exception("; ".join(f"subscription {result['subscription_id']} failed at {result['failed_step']}: "
+                                      f"{result['error']}" for result in failed))
+        return results
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Queue provision/teardown jobs and work them off with "
+                                                 "any number of worker processes")
+    parser.add_argument('--queue', default=QUEUE_PATH, help="Queue file shared by every worker")
+    commands = parser.add_subparsers(dest='command', required=True)
+    provision = commands.add_parser('provision', help="Queue one provision job per subscription of a spec")
+    provision.add_argument('--spec', default=main.SPEC_PATH, help="Spec file (default: main.py's stack)")
+    teardown = commands.add_parser('teardown', help="Queue teardown jobs")
+    teardown.add_argument('--manifest', help="JSON file with a list of stacks to delete (one job each)")
+    teardown.add_argument('--name', help="One job deleting every subscription whose name matches this glob")
+    worker = commands.add_parser('worker', help="Claim and run jobs until interrupted")
+    worker.add_argument('--until-empty', action='store_true', help="Exit once nothing is queued or running")
+    worker.add_argument('--interval', type=float, default=QUEUE_INTERVAL, help="Seconds between claims when idle")
+    commands.add_parser('status', help="Show the jobs")
+    retry = commands.add_parser('retry', help="Queue a failed job again")
+    retry.add_argument('job_id', type=int)
+    args = parser.parse_args(argv)
+
+    try:
+        queue = WorkQueue(path=args.queue)
+        if args.command == 'provision':
+            job_ids = [queue.enqueue('provision', name, payload) for name, payload in provision_payloads(args.spec)]
+            events.emit("result", f"Queued provision job(s): {job_ids}", jobs=job_ids)
+        elif args.command == 'teardown':
+            if args.manifest:
+                job_ids = [queue.enqueue('teardown', f"subscription:{stack['subscription_id']}", stack)
+                           for stack in destroy.load_manifest(args.manifest)]
+            elif args.name:
+                job_ids = [queue.enqueue('teardown', f"name:{args.name}", {"name": args.name})]
+            else:
+                raise Exception("teardown needs --manifest or --name")
+            events.emit("result", f"Queued teardown job(s): {job_ids}", jobs=job_ids)
+        elif args.command == 'worker':
+            try:
+                ran = queue.work(until_empty=args.until_empty, interval=args.interval)
+                events.log(f"Worker {worker_name()} ran {ran} job(s)")
+            except KeyboardInterrupt:
+                pass
+            credentials.print_report()
+        elif args.command == 'status':
+            jobs = [{key: job[key] for key in ("id", "kind", "key", "state", "attempts", "owner", "credential",
+                                                "error", "result")} for job in queue.jobs()]
+            events.emit("result", json.dumps({"counts": queue.counts(), "jobs": jobs}, indent=4),
+                        result={"counts": queue.counts(), "jobs": jobs})
+        elif args.command == 'retry':
+            queue.retry(args.job_id)
+            events.emit("result", f"Job {args.job_id} queued again", job=args.job_id)
+    except Exception as e:
+        events.emit("error", f"Error: {e}", error=str(e))
+    metrics.finish()
+    events.flush()
+
+
+if __name__ == '__main__':
+    main_cli()